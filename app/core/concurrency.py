@@ -0,0 +1,23 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# 用于 SQLite / ChromaDB 等同步阻塞操作的有界线程池，避免阻塞事件循环
+_blocking_executor = ThreadPoolExecutor(
+    max_workers=settings.blocking_io_workers,
+    thread_name_prefix="memos-ai-io"
+)
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在有界线程池中执行同步函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    # 复制当前上下文，使线程中记录的耗时能归入发起请求的 trace
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(context.run, func, *args, **kwargs))
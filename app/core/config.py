@@ -1,22 +1,82 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
-from pydantic import Field
+from typing import Literal, Optional
+from pydantic import Field, model_validator
 
 class Settings(BaseSettings):
     openai_api_key: str
     openai_base_url: str = "https://api.openai.com/v1"
     memos_db_path: str = "./memos_prod.db"
     vector_db_path: str = "./vector_db"
-    embedding_model: str
+    memos_db_pool_size: int = Field(4, description="Pooled read-only connections to the Memos database")
+    memos_db_busy_timeout_ms: int = Field(5000, description="How long a read waits for the Memos server's write lock")
+    embedding_backend: Literal["remote", "local"] = Field("remote", description="remote calls EMBEDDING_API_URL; local runs a sentence-transformers model in-process")
+    # 以下三项仅 remote 后端需要
+    embedding_model: str = ""
     llm_model: str = "gpt-3.5-turbo"
-    embedding_api_url: str
-    embedding_api_key: str
+    embedding_api_url: str = ""
+    embedding_api_key: str = ""
+    local_embedding_model: str = Field("BAAI/bge-small-zh-v1.5", description="Model name or path loaded by the local backend")
+    local_embedding_device: str = Field("cpu", description="Device for the local backend, e.g. cpu or cuda")
+    local_embedding_batch_size: int = Field(32, description="Texts per forward pass of the local model")
+    local_embedding_onnx: bool = Field(False, description="Run the local model with ONNX Runtime (sentence-transformers >= 3.2)")
+    embedding_batch_size: int = Field(64, description="Maximum number of texts per embedding request")
+    embedding_batch_max_tokens: int = Field(8000, description="Approximate token budget per embedding request")
+    embedding_concurrency: int = Field(4, description="Number of embedding requests sent in parallel")
+    embedding_max_retries: int = Field(3, description="Retries for a failed embedding batch")
+    embedding_retry_backoff: float = Field(1.0, description="Base delay in seconds for exponential retry backoff")
+    embedding_timeout: float = 60.0
+    embedding_cache_enabled: bool = True
+    embedding_cache_max_entries: int = Field(200000, description="Maximum number of cached document embeddings")
+    embedding_dimensions: int = Field(0, description="Truncate embeddings to this many leading dimensions (Matryoshka) and renormalize; 0 keeps the full vector")
+    embedding_storage_dtype: Literal["float32", "float16", "int8"] = Field("float32", description="Encoding of stored vectors in the embedding cache and the numpy vector backend")
+    vector_backend: Literal["chroma", "numpy"] = Field("chroma", description="chroma uses ChromaDB; numpy keeps a memory-mapped matrix with brute-force or HNSW search")
+    vector_hnsw_threshold: int = Field(20000, description="Live vectors from which the numpy backend searches an HNSW graph (needs hnswlib); 0 always uses brute force")
+    vector_hnsw_ef_search: int = Field(64, description="HNSW search breadth; higher is more accurate and slower")
+    query_embedding_cache_size: int = Field(1024, description="Query embeddings kept in the in-memory LRU; 0 disables it")
     max_search_results: int = 5
-    sync_interval_hours: int = 1
+    sync_interval_hours: float = 1
+    sync_jitter_ratio: float = Field(0.1, description="Random jitter applied to the sync interval, as a fraction of it")
+    sync_on_startup: bool = Field(True, description="Run a background sync as soon as the server starts")
+    full_sync_page_size: int = Field(256, description="Memos read, embedded and written per batch during a full sync")
+    admin_secret: str = Field("", description="Secret for admin endpoints; falls back to memos_webhook_secret when empty")
     proxy: Optional[str] = None
-    retrieval_score_threshold: float = Field(0.7, description="Threshold for filtering search results based on score")
+    metrics_json_logs: bool = Field(False, description="Log one JSON line with stage timings and token usage per request")
+    llm_stream_usage: bool = Field(True, description="Ask the LLM API to report token usage on streamed answers")
+    blocking_io_workers: int = Field(8, description="Thread pool size for blocking SQLite/Chroma calls on the async request path")
+    # Deprecated: hybrid retrieval always runs keyword search, so this threshold is no longer used.
+    retrieval_score_threshold: float = Field(0.7, description="Deprecated, kept so existing .env files still load")
+    chunk_size_tokens: int = Field(512, description="Window size for splitting long memos into indexed chunks")
+    chunk_overlap_tokens: int = Field(64, description="Overlap between consecutive chunks")
+    chunk_max_per_memo: int = Field(2, description="Maximum chunks of one memo returned by a vector search")
+    chunk_search_multiplier: int = Field(3, description="Chunks fetched per requested memo before grouping by memo")
+    context_token_budget: int = Field(3000, description="Maximum tokens of memo context sent to the LLM")
+    context_min_truncate_tokens: int = Field(64, description="Smallest remaining budget worth filling with a truncated memo")
+    hybrid_rrf_k: int = Field(60, description="Rank constant for reciprocal-rank fusion of vector and keyword results")
+    hybrid_candidate_multiplier: int = Field(2, description="Candidates fetched from each retriever per requested result")
     memos_webhook_secret: str = ""
+    sensitive_keywords: str = Field("密码,password,密钥,token", description="Comma-separated keywords; memos containing any of them are never indexed or sent to the LLM")
+    sensitive_tags: str = Field("#密码", description="Comma-separated tags treated as sensitive")
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 512
+    answer_cache_ttl_seconds: float = Field(3600, description="Lifetime of a cached answer")
+    answer_cache_similarity_threshold: float = Field(0.95, description="Minimum cosine similarity between questions to reuse a cached answer")
+    index_queue_batch_size: int = Field(64, description="Maximum webhook events indexed per worker batch")
+    index_queue_poll_interval: float = Field(5.0, description="Seconds the index worker sleeps when the queue is idle")
+    index_queue_retry_backoff: float = Field(2.0, description="Base delay in seconds before retrying a failed batch")
+    index_queue_max_backoff: float = Field(300.0, description="Upper bound for the retry delay")
+    default_answer_mode: Literal["fast", "accurate"] = Field("accurate", description="Answer mode used when a request does not specify one")
+    batch_ask_max_questions: int = Field(100, description="Maximum number of questions accepted by /api/ask/batch")
+    batch_ask_concurrency: int = Field(4, description="Questions of one batch that are answered concurrently")
 
+
+    @model_validator(mode="after")
+    def check_embedding_backend(self):
+        if self.embedding_backend == "remote":
+            missing = [name for name in ("embedding_model", "embedding_api_url", "embedding_api_key")
+                       if not getattr(self, name)]
+            if missing:
+                raise ValueError(f"{', '.join(missing)} must be set when embedding_backend is 'remote'")
+        return self
     
     class Config:
         env_file = ".env"
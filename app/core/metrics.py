@@ -0,0 +1,197 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger("memos_ai.metrics")
+
+# 覆盖从本地 SQLite 查询（毫秒级）到 LLM 流式生成（数十秒）的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """单调递增计数器，按标签值分组"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """累积分桶直方图，输出格式与 Prometheus 客户端库一致"""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签: [各桶计数..., 总和, 总数]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    labels = _format_labels(self.label_names, key, ("le", repr(float(bound))))
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, key, ("le", "+Inf"))
+                lines.append(f"{self.name}_bucket{labels} {state[-1]}")
+                plain = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{plain} {state[-2]}")
+                lines.append(f"{self.name}_count{plain} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[Any] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_duration = registry.register(Histogram(
+    "memos_ai_stage_duration_seconds", "Latency of each request, sync and index stage", ["stage"]
+))
+stage_errors = registry.register(Counter(
+    "memos_ai_stage_errors_total", "Stages that ended with an exception", ["stage"]
+))
+llm_tokens = registry.register(Counter(
+    "memos_ai_llm_tokens_total", "Tokens reported by upstream LLM and embedding APIs", ["operation", "kind"]
+))
+
+
+class RequestTrace:
+    """一次请求（或一次同步）内记录的所有阶段耗时与 token 用量，用于输出结构化日志"""
+    __slots__ = ("name", "started", "attributes", "spans", "usage")
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.started = time.perf_counter()
+        self.attributes = attributes
+        self.spans: List[Dict[str, Any]] = []
+        self.usage: Dict[str, int] = {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace": self.name,
+            **self.attributes,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "spans": self.spans,
+            "usage": self.usage,
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar("memos_ai_trace", default=None)
+
+
+def start_trace(name: str, **attributes: Any) -> RequestTrace:
+    trace = RequestTrace(name, attributes)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: RequestTrace, error: Optional[BaseException] = None):
+    if _current_trace.get() is trace:
+        _current_trace.set(None)
+    if settings.metrics_json_logs:
+        payload = trace.to_dict()
+        if error is not None:
+            payload["error"] = repr(error)
+        logger.info(json.dumps(payload, ensure_ascii=False))
+
+
+def observe(stage: str, seconds: float, error: bool = False):
+    """记录一个阶段的耗时；不适合用 with 包裹的阶段（如首 token 延迟）直接调用"""
+    stage_duration.observe(seconds, stage=stage)
+    if error:
+        stage_errors.inc(stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        entry = {"stage": stage, "ms": round(seconds * 1000, 2)}
+        if error:
+            entry["error"] = True
+        trace.spans.append(entry)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """统计代码块耗时，异常时同时累加错误计数"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        observe(stage, time.perf_counter() - started, error=True)
+        raise
+    observe(stage, time.perf_counter() - started)
+
+
+def record_usage(operation: str, usage: Any):
+    """记录上游返回的 token 用量，兼容 OpenAI SDK 对象和原始 JSON 字典"""
+    if usage is None:
+        return
+    if not isinstance(usage, dict):
+        usage = {key: getattr(usage, key, None) for key in ("prompt_tokens", "completion_tokens", "total_tokens")}
+    trace = _current_trace.get()
+    for kind in ("prompt_tokens", "completion_tokens"):
+        value = usage.get(kind)
+        if value:
+            llm_tokens.inc(value, operation=operation, kind=kind)
+            if trace is not None:
+                key = f"{operation}.{kind}"
+                trace.usage[key] = trace.usage.get(key, 0) + int(value)
@@ -0,0 +1,65 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.concurrency import run_blocking
+
+
+class ComponentStatus:
+    """单个组件的预热状态"""
+    __slots__ = ("name", "ready", "error", "seconds")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.ready = False
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "error": self.error, "seconds": self.seconds}
+
+
+class Readiness:
+    """服务就绪状态
+
+    进程启动后即可响应请求（存活），各组件的预热（打开 ChromaDB、创建 LLM 客户端、
+    连接 Memos 数据库等）在后台线程池中并行执行，全部成功后才视为就绪。
+    预热失败的组件会在首次使用时再次尝试初始化，因此失败不会导致进程退出。
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._steps: List[tuple] = []
+        self._components: Dict[str, ComponentStatus] = {}
+
+    def register(self, name: str, warm_up: Callable[[], Any]):
+        self._steps.append((name, warm_up))
+        self._components[name] = ComponentStatus(name)
+
+    async def _run_step(self, name: str, warm_up: Callable[[], Any]):
+        status = self._components[name]
+        started = time.perf_counter()
+        try:
+            await run_blocking(warm_up)
+            status.ready = True
+            status.error = None
+        except Exception as e:
+            status.error = str(e)
+            print(f"组件 {name} 预热失败: {e}")
+        status.seconds = round(time.perf_counter() - started, 3)
+
+    async def warm_up(self):
+        await asyncio.gather(*(self._run_step(name, warm_up) for name, warm_up in self._steps))
+        if self.ready:
+            print(f"服务已就绪，启动耗时 {time.time() - self.started_at:.2f}s")
+
+    @property
+    def ready(self) -> bool:
+        return all(status.ready for status in self._components.values())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "components": {name: status.to_dict() for name, status in self._components.items()},
+        }
@@ -0,0 +1,40 @@
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken 为可选依赖，未安装时使用估算值
+    tiktoken = None
+
+# CJK 字符通常一个字就是一个 token，其余文本按约 4 个字符一个 token 估算
+_CJK_PATTERN = re.compile(r'[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """在本地粗略估算文本的 token 数量，无需调用远程服务"""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    """统计文本 token 数：安装了 tiktoken 时精确计数，否则退化为 estimate_tokens"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return estimate_tokens(text)
+    try:
+        return len(_get_encoding(model).encode(text, disallowed_special=()))
+    except Exception:
+        # 编码文件需要联网下载，离线环境下同样退化为估算
+        return estimate_tokens(text)
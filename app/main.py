@@ -1,29 +1,90 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Header
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.requests import Request
 from pydantic import BaseModel
-from typing import Optional, Union
+from typing import List, Literal, Optional, Union
+import asyncio
+import json
+import time
 
 from app.services.memos_service import memos_service
+from app.services.memos_db import memos_db
+from app.services.llm_service import llm_service
 from app.services.vector_store import vector_store
+from app.services.answer_cache import answer_cache
+from app.services.keyword_index import keyword_index
+from app.services.index_queue import index_queue, IndexWorker
+from app.services.sync_scheduler import SyncScheduler
+from app.services.sync_service import MemosSync
+from app.services.sensitive_filter import sensitive_filter
+from app.services.memo_metadata import parse_date
 from app.core.config import settings
-
-app = FastAPI(title="Memos AI Assistant", version="1.0.0")
+from app.core.concurrency import run_blocking
+from app.core.metrics import registry, span
+from app.core.readiness import Readiness
+
+# 后台索引 worker，消费 Webhook 写入的持久化队列
+index_worker = IndexWorker(index_queue, vector_store, keyword_index)
+
+# 周期同步调度器，替代容器启动时的一次性同步
+sync_scheduler = SyncScheduler(MemosSync)
+
+# 各服务的重量级资源在首次使用时才创建，启动后在后台统一预热
+readiness = Readiness()
+readiness.register("vector_store", vector_store.warm_up)
+readiness.register("llm", llm_service.warm_up)
+readiness.register("memos_db", memos_db.warm_up)
+readiness.register("keyword_index", keyword_index.warm_up)
+readiness.register("index_queue", index_queue.warm_up)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 预热和首次同步都在后台进行，服务可以立即开始响应请求
+    warm_up_task = asyncio.create_task(readiness.warm_up())
+    index_worker.start()
+    sync_scheduler.start()
+    yield
+    if not warm_up_task.done():
+        warm_up_task.cancel()
+    await sync_scheduler.stop()
+    await index_worker.stop()
+    await llm_service.aclose()
+    await vector_store.aclose()
+
+app = FastAPI(title="Memos AI Assistant", version="1.0.0", lifespan=lifespan)
 
 # Templates
 templates = Jinja2Templates(directory="app/templates")
 
+def check_admin_secret(secret: Optional[str]):
+    expected = settings.admin_secret or settings.memos_webhook_secret
+    if expected and secret != expected:
+        raise HTTPException(status_code=403, detail="Invalid secret")
+
 # --- API Models ---
 
 class QuestionRequest(BaseModel):
     question: str
+    # "fast" 跳过串行的 LLM 决策/校验调用；"accurate" 为完整流程；留空使用配置默认值
+    mode: Optional[Literal["fast", "accurate"]] = None
+
+class BatchQuestion(BaseModel):
+    id: Optional[str] = None
+    question: str
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[BatchQuestion]
+    mode: Optional[Literal["fast", "accurate"]] = None
 
 # Updated models based on actual webhook data
 class MemoData(BaseModel):
     name: str  # e.g., "memos/BH7pGobxnxUHmV4rLd9EgU"
     content: str
     visibility: Union[str, int] # Can be string ("PRIVATE") or int (1)
+    createTime: Optional[str] = None  # RFC3339, e.g. "2024-05-01T08:00:00Z"
+    updateTime: Optional[str] = None
 
 class WebhookPayload(BaseModel):
     activityType: str # e.g., "memos.memo.created"
@@ -38,11 +99,31 @@ async def read_root(request: Request):
 @app.post("/api/ask")
 async def ask_question(request: QuestionRequest):
     try:
-        answer_generator = memos_service.answer_question(request.question)
+        answer_generator = memos_service.answer_question(request.question, mode=request.mode)
         return StreamingResponse(answer_generator, media_type="text/plain")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/ask/batch")
+async def ask_questions(request: BatchQuestionRequest):
+    """批量问答，按完成顺序以 NDJSON 逐行返回，每行通过 id 对应到请求中的问题"""
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(request.questions) > settings.batch_ask_max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"at most {settings.batch_ask_max_questions} questions per batch"
+        )
+    # 未指定 id 的问题使用其在列表中的下标
+    questions = [(item.id if item.id is not None else str(index), item.question)
+                 for index, item in enumerate(request.questions)]
+
+    async def ndjson():
+        async for result in memos_service.answer_questions(questions, mode=request.mode):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
 @app.post("/api/v1/webhook/memos")
 async def handle_memos_webhook(
     payload: WebhookPayload,
@@ -54,38 +135,101 @@ async def handle_memos_webhook(
         raise HTTPException(status_code=403, detail="Invalid secret")
 
     # 2. Process based on activity type
-    try:
-        memo_id_str = payload.memo.name
+    with span("webhook"):
+        try:
+            memo_id_str = payload.memo.name
         
-        if payload.activityType in ["memos.memo.created", "memos.memo.updated"]:
-            # Handle visibility check for both string and int types
-            is_private = False
-            if isinstance(payload.memo.visibility, int):
-                 # Assuming 1 is PRIVATE based on previous logic, adjust if needed
-                 if payload.memo.visibility == 1:
-                     is_private = True
-            elif isinstance(payload.memo.visibility, str):
-                if payload.memo.visibility.upper() == "PRIVATE":
-                    is_private = True
+            if payload.activityType in ["memos.memo.created", "memos.memo.updated"]:
+                # Handle visibility check for both string and int types
+                is_private = False
+                if isinstance(payload.memo.visibility, int):
+                     # Assuming 1 is PRIVATE based on previous logic, adjust if needed
+                     if payload.memo.visibility == 1:
+                         is_private = True
+                elif isinstance(payload.memo.visibility, str):
+                    if payload.memo.visibility.upper() == "PRIVATE":
+                        is_private = True
             
-            if is_private:
-                print(f"Upserting memo '{memo_id_str}'...")
-                # The vector_store expects a list of IDs. We use the string ID directly.
-                vector_store.upsert_documents([payload.memo.content], [memo_id_str])
+                if is_private and sensitive_filter.is_sensitive(payload.memo.content or ""):
+                    # 笔记包含敏感信息，不写入索引；若之前已被索引则移除
+                    print(f"Memo '{memo_id_str}' contains sensitive content, queueing removal...")
+                    await run_blocking(index_queue.enqueue, memo_id_str, "delete")
+                elif is_private:
+                    print(f"Queueing upsert for memo '{memo_id_str}'...")
+                    # 时间戳写入向量 metadata 用于按时间过滤，缺失时以收到 Webhook 的时间代替
+                    now = int(time.time())
+                    created_ts = parse_date(payload.memo.createTime) or now
+                    updated_ts = parse_date(payload.memo.updateTime) or now
+                    await run_blocking(index_queue.enqueue, memo_id_str, "upsert", payload.memo.content,
+                                       created_ts, updated_ts)
+                elif payload.activityType == "memos.memo.updated":
+                    # 笔记不再是私有的，从索引中移除
+                    print(f"Memo '{memo_id_str}' is no longer private, queueing removal...")
+                    await run_blocking(index_queue.enqueue, memo_id_str, "delete")
         
-        elif payload.activityType == "memos.memo.deleted":
-            print(f"Deleting memo '{memo_id_str}'...")
-            vector_store.delete_documents([memo_id_str])
-
-    except Exception as e:
-        print(f"Error processing webhook: {e}")
-        raise HTTPException(status_code=500, detail="Error processing webhook")
-
-    return {"status": "success"}
+            elif payload.activityType == "memos.memo.deleted":
+                print(f"Queueing deletion for memo '{memo_id_str}'...")
+                await run_blocking(index_queue.enqueue, memo_id_str, "delete")
+
+            # 立即返回，由后台 worker 完成向量化和索引写入
+            index_worker.notify()
+
+        except Exception as e:
+            print(f"Error processing webhook: {e}")
+            raise HTTPException(status_code=500, detail="Error processing webhook")
+
+    return {"status": "queued"}
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """返回回答缓存、Embedding 缓存与查询向量缓存的命中统计"""
+    return {
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": vector_store.embedding_cache.stats() if vector_store.embedding_cache else None,
+        "query_embedding_cache": vector_store.query_cache.stats() if vector_store.query_cache else None,
+        "sensitive_filter": sensitive_filter.stats(),
+    }
+
+@app.get("/api/index/vector")
+async def vector_index_stats():
+    """返回向量存储后端与当前集合的规模"""
+    stats = await run_blocking(lambda: vector_store.collection.stats())
+    return {"backend": vector_store.backend.name, **stats}
+
+@app.get("/api/index/queue")
+async def index_queue_stats():
+    """返回索引队列深度、积压延迟和处理统计"""
+    return await run_blocking(index_queue.stats)
+
+@app.get("/api/admin/sync")
+async def sync_status(secret: Optional[str] = None):
+    """返回同步调度器状态：最近一次运行、耗时和处理的笔记数量"""
+    check_admin_secret(secret)
+    return sync_scheduler.status()
+
+@app.post("/api/admin/sync", status_code=202)
+async def trigger_sync(full: bool = False, secret: Optional[str] = None):
+    """手动触发一次同步，已有同步在运行时返回 409"""
+    check_admin_secret(secret)
+    if not sync_scheduler.trigger(full=full):
+        raise HTTPException(status_code=409, detail="A sync is already running")
+    return {"status": "started", "mode": "full" if full else "incremental"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 格式的各阶段延迟直方图、错误计数和 token 用量"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy"}
+    """存活检查：进程能响应即返回 200，同时附带各组件的就绪状态"""
+    return {"status": "healthy", "live": True, **readiness.status()}
+
+@app.get("/api/health/ready")
+async def readiness_check():
+    """就绪检查：所有组件预热完成前返回 503，可用作负载均衡或编排系统的 readiness probe"""
+    status = readiness.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 if __name__ == "__main__":
     import uvicorn
@@ -9,6 +9,7 @@ class Memo(Base):
     __tablename__ = "memo"
     
     id = Column(Integer, primary_key=True)
+    uid = Column(String, unique=True)  # Webhook / API 中的资源名为 "memos/<uid>"
     content = Column(Text, nullable=False)
     created_ts = Column(Integer, nullable=False)
     updated_ts = Column(Integer, nullable=False)
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class CachedAnswer:
+    __slots__ = ("question", "embedding", "mode", "answer", "memo_ids", "volatile", "created_at")
+
+    def __init__(self, question: str, embedding: np.ndarray, mode: str, answer: str,
+                 memo_ids: Iterable[str], volatile: bool):
+        self.question = question
+        self.embedding = embedding
+        self.mode = mode
+        self.answer = answer
+        self.memo_ids = frozenset(memo_ids)
+        # volatile 的回答（无上下文或来自"最新笔记"）在任意笔记变更后都可能过时
+        self.volatile = volatile
+        self.created_at = time.time()
+
+
+class AnswerCache:
+    """以问题向量为键的语义回答缓存，相似度超过阈值即视为同一问题
+
+    - 超过 TTL 的条目失效，超出容量时按 LRU 淘汰
+    - 上下文中任一笔记被更新或删除时，相关回答立即失效
+    - 独立进程的 scripts/sync.py 无法直接通知本进程，因此在查找时检查同步状态文件的修改时间，
+      一旦发现外部同步写入了变更就清空缓存
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float,
+                 sync_state_file: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.sync_state_file = sync_state_file
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self._sync_state_mtime = self._read_sync_state_mtime()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _read_sync_state_mtime(self) -> float:
+        if self.sync_state_file and os.path.exists(self.sync_state_file):
+            return os.path.getmtime(self.sync_state_file)
+        return 0.0
+
+    def _check_external_sync(self):
+        mtime = self._read_sync_state_mtime()
+        if mtime != self._sync_state_mtime:
+            self._sync_state_mtime = mtime
+            if self._entries:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+
+    def lookup(self, embedding: np.ndarray, mode: str) -> Optional[CachedAnswer]:
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self._check_external_sync()
+            expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl_seconds]
+            for key in expired:
+                del self._entries[key]
+
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry.mode == mode]
+            if candidates:
+                matrix = np.stack([entry.embedding for _, entry in candidates])
+                similarities = matrix @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, question: str, embedding: np.ndarray, mode: str, answer: str,
+              memo_ids: Iterable[str], volatile: bool = False):
+        entry = CachedAnswer(question, self._normalize(embedding), mode, answer,
+                             (str(memo_id) for memo_id in memo_ids), volatile)
+        with self._lock:
+            self._entries[self._next_key] = entry
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_memos(self, memo_ids: Optional[List[str]]):
+        """笔记变更回调；memo_ids 为 None 表示整个索引被重建"""
+        with self._lock:
+            if memo_ids is None:
+                stale = list(self._entries)
+            else:
+                changed = {str(memo_id) for memo_id in memo_ids}
+                stale = [key for key, entry in self._entries.items()
+                         if entry.volatile or not entry.memo_ids.isdisjoint(changed)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.answer_cache_max_entries,
+    ttl_seconds=settings.answer_cache_ttl_seconds,
+    similarity_threshold=settings.answer_cache_similarity_threshold,
+    sync_state_file=os.path.join(settings.vector_db_path, "sync_state.txt")
+)
@@ -0,0 +1,61 @@
+from typing import List
+
+from app.core.tokenizer import estimate_tokens
+
+# 优先在这些位置断开，尽量保持段落和句子完整
+_BREAK_MARKS = ["\n\n", "\n", "。", "！", "？", ". ", "! ", "? ", "；", "; ", "，", ", ", " "]
+
+
+def _find_break(text: str, end: int, min_end: int) -> int:
+    for mark in _BREAK_MARKS:
+        pos = text.rfind(mark, min_end, end)
+        if pos != -1:
+            return pos + len(mark)
+    return end
+
+
+def chunk_text(text: str, window_tokens: int, overlap_tokens: int) -> List[str]:
+    """按 token 窗口切分长文本，相邻分块之间保留 overlap_tokens 的重叠
+
+    token 数为本地估算值，按整段文本的平均"字符/token"比例换算成字符窗口，
+    并在窗口后段寻找段落或句子边界作为断点。
+    """
+    if not text:
+        return [text]
+    total_tokens = estimate_tokens(text)
+    if total_tokens <= window_tokens:
+        return [text]
+
+    chars_per_token = len(text) / total_tokens
+    window_chars = max(1, int(window_tokens * chars_per_token))
+    overlap_chars = min(int(overlap_tokens * chars_per_token), window_chars // 2)
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + window_chars)
+        if end < len(text):
+            # 只在窗口后 20% 的范围内找断点，避免分块过小
+            end = _find_break(text, end, start + int(window_chars * 0.8))
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+
+def select_chunks(text: str, terms: List[str], window_tokens: int, overlap_tokens: int, max_chunks: int) -> str:
+    """从长文本中挑出包含检索词最多的分块，用于关键词命中的长笔记"""
+    chunks = chunk_text(text, window_tokens, overlap_tokens)
+    if len(chunks) <= 1:
+        return text
+    lowered_terms = [term.lower() for term in terms if term]
+
+    def hits(chunk: str) -> int:
+        lowered = chunk.lower()
+        return sum(lowered.count(term) for term in lowered_terms)
+
+    ranked = sorted(range(len(chunks)), key=lambda i: hits(chunks[i]), reverse=True)[:max_chunks]
+    return "\n...\n".join(chunks[i] for i in sorted(ranked))
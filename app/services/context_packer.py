@@ -0,0 +1,101 @@
+import hashlib
+import re
+from typing import Any, Dict, List
+
+from app.core.config import settings
+from app.core.tokenizer import count_tokens
+
+TRUNCATION_MARK = "\n...(内容过长，已截断)"
+
+
+class PackedContext:
+    """上下文打包结果及 token 用量统计"""
+    __slots__ = ("text", "memos", "used_tokens", "dropped_tokens", "dropped_memos", "truncated_memos", "duplicate_memos")
+
+    def __init__(self):
+        self.text = ""
+        self.memos: List[Dict[str, Any]] = []
+        self.used_tokens = 0
+        self.dropped_tokens = 0
+        self.dropped_memos = 0
+        self.truncated_memos = 0
+        self.duplicate_memos = 0
+
+    def summary(self) -> str:
+        return (f"used {self.used_tokens} tokens for {len(self.memos)} memos, "
+                f"dropped {self.dropped_tokens} tokens ({self.dropped_memos} memos dropped, "
+                f"{self.truncated_memos} truncated, {self.duplicate_memos} duplicates)")
+
+
+def format_memo(memo: Dict[str, Any], content: str) -> str:
+    return f"笔记 (ID: {memo['id']}, Created: {memo['created_at']}):\n{content}"
+
+
+def _content_key(content: str) -> str:
+    normalized = re.sub(r"\s+", " ", content).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """二分查找能放进 max_tokens 的最长前缀"""
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid], model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def pack_context(memos: List[Dict[str, Any]], budget_tokens: int) -> PackedContext:
+    """按 token 预算组装上下文
+
+    按检索分数排序（无分数时保留原顺序），去除内容重复的笔记，
+    依次放入预算；放不下的笔记在剩余预算足够时截断，否则丢弃。
+    """
+    model = settings.llm_model
+    separator = "\n\n"
+    separator_tokens = count_tokens(separator, model)
+    packed = PackedContext()
+
+    ranked = memos
+    if memos and all("score" in memo for memo in memos):
+        ranked = sorted(memos, key=lambda memo: memo["score"], reverse=True)
+
+    seen = set()
+    parts: List[str] = []
+    remaining = budget_tokens
+    for memo in ranked:
+        key = _content_key(memo["content"])
+        if key in seen:
+            packed.duplicate_memos += 1
+            continue
+        seen.add(key)
+
+        part = format_memo(memo, memo["content"])
+        cost = count_tokens(part, model) + (separator_tokens if parts else 0)
+        if cost <= remaining:
+            parts.append(part)
+            packed.memos.append(memo)
+            remaining -= cost
+            continue
+
+        header_tokens = count_tokens(format_memo(memo, ""), model) + (separator_tokens if parts else 0)
+        available = remaining - header_tokens - count_tokens(TRUNCATION_MARK, model)
+        if available >= settings.context_min_truncate_tokens:
+            content = _truncate_to_tokens(memo["content"], available, model) + TRUNCATION_MARK
+            part = format_memo(memo, content)
+            used = count_tokens(part, model) + (separator_tokens if parts else 0)
+            parts.append(part)
+            packed.memos.append(memo)
+            packed.truncated_memos += 1
+            packed.dropped_tokens += max(0, cost - used)
+            remaining -= used
+        else:
+            packed.dropped_memos += 1
+            packed.dropped_tokens += cost
+
+    packed.text = separator.join(parts)
+    packed.used_tokens = budget_tokens - remaining
+    return packed
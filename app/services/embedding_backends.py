@@ -0,0 +1,260 @@
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+import httpx
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.core.concurrency import run_blocking
+from app.core.metrics import record_usage
+from app.core.tokenizer import estimate_tokens
+
+
+class EmbeddingBackend(ABC):
+    """向量化后端接口
+
+    embed / aembed 接收文本列表，返回形状为 (n, dim) 的 float32 矩阵，顺序与输入一致。
+    model_id 标识生成向量的模型，用作 Embedding 缓存的键，并记录在向量集合上，
+    切换模型后据此触发索引重建。
+    """
+
+    name = ""
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return await run_blocking(self.embed, texts)
+
+    def warm_up(self):
+        """预先完成耗时的初始化（如加载模型），默认无需预热"""
+
+    async def aclose(self):
+        pass
+
+
+class RemoteEmbeddingBackend(EmbeddingBackend):
+    """调用兼容 OpenAI 格式的 /v1/embeddings 接口，分批并发请求并按指数退避重试"""
+
+    name = "remote"
+
+    def __init__(self):
+        self.url = f"{settings.embedding_api_url.rstrip('/')}/v1/embeddings"
+        self.session = self._build_session()
+        self.async_client = self._build_async_client()
+
+    @property
+    def model_id(self) -> str:
+        return settings.embedding_model
+
+    def _build_session(self) -> requests.Session:
+        """创建带连接池的 HTTP 会话，复用 keep-alive 连接"""
+        session = requests.Session()
+        pool_size = max(1, settings.embedding_concurrency)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({
+            'Authorization': f'Bearer {settings.embedding_api_key}',
+            'Content-Type': 'application/json'
+        })
+        return session
+
+    def _build_async_client(self) -> httpx.AsyncClient:
+        """创建供异步请求路径使用的 HTTP 客户端"""
+        pool_size = max(1, settings.embedding_concurrency)
+        return httpx.AsyncClient(
+            headers={
+                'Authorization': f'Bearer {settings.embedding_api_key}',
+                'Content-Type': 'application/json'
+            },
+            timeout=settings.embedding_timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+        )
+
+    def _split_batches(self, texts: List[str]) -> List[Tuple[int, List[str]]]:
+        """按条数和估算 token 数把文本切分成多个批次，返回 (起始下标, 批次) 列表"""
+        batches = []
+        current: List[str] = []
+        current_tokens = 0
+        start = 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if current and (len(current) >= settings.embedding_batch_size or
+                            current_tokens + tokens > settings.embedding_batch_max_tokens):
+                batches.append((start, current))
+                current, current_tokens, start = [], 0, i
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append((start, current))
+        return batches
+
+    @staticmethod
+    def _parse_embeddings(data: dict, expected: int) -> np.ndarray:
+        # 按 index 排序，保证返回顺序与输入一致
+        record_usage("embedding", data.get('usage'))
+        items = sorted(data['data'], key=lambda item: item.get('index', 0))
+        embeddings = np.array([item['embedding'] for item in items], dtype=np.float32)
+        if len(embeddings) != expected:
+            raise ValueError(f"expected {expected} embeddings, got {len(embeddings)}")
+        return embeddings
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """请求单个批次的嵌入向量，失败时按指数退避重试"""
+        payload = {
+            "model": settings.embedding_model,
+            "input": texts
+        }
+        for attempt in range(settings.embedding_max_retries + 1):
+            try:
+                response = self.session.post(self.url, json=payload, timeout=settings.embedding_timeout)
+                response.raise_for_status()
+                return self._parse_embeddings(response.json(), len(texts))
+            except requests.exceptions.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                # 4xx（限流除外）属于请求本身的问题，重试无意义
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt >= settings.embedding_max_retries:
+                    print(f"Error calling embedding API: {e}")
+                    raise
+                delay = settings.embedding_retry_backoff * (2 ** attempt)
+                print(f"Embedding 批次请求失败 ({e})，{delay:.1f}s 后进行第 {attempt + 1} 次重试")
+                time.sleep(delay)
+            except (KeyError, IndexError, ValueError) as e:
+                print(f"Failed to parse API response. Unexpected format: {e}")
+                raise
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """分批并发请求后按原顺序拼接"""
+        batches = self._split_batches(texts)
+        print(f"正在调用 Embedding API: {self.url} ({len(texts)} 条文本, {len(batches)} 个批次)")
+        if len(batches) == 1:
+            return self._embed_batch(batches[0][1])
+
+        workers = max(1, min(settings.embedding_concurrency, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # executor.map 按提交顺序返回结果，拼接后即与输入顺序一致
+            results = list(executor.map(lambda batch: self._embed_batch(batch[1]), batches))
+        return np.vstack(results)
+
+    async def _aembed_batch(self, texts: List[str]) -> np.ndarray:
+        """_embed_batch 的异步版本，基于 httpx.AsyncClient"""
+        payload = {
+            "model": settings.embedding_model,
+            "input": texts
+        }
+        for attempt in range(settings.embedding_max_retries + 1):
+            try:
+                response = await self.async_client.post(self.url, json=payload)
+                response.raise_for_status()
+                return self._parse_embeddings(response.json(), len(texts))
+            except httpx.HTTPError as e:
+                status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+                retryable = status is None or status == 429 or status >= 500
+                if not retryable or attempt >= settings.embedding_max_retries:
+                    print(f"Error calling embedding API: {e}")
+                    raise
+                delay = settings.embedding_retry_backoff * (2 ** attempt)
+                print(f"Embedding 批次请求失败 ({e})，{delay:.1f}s 后进行第 {attempt + 1} 次重试")
+                await asyncio.sleep(delay)
+            except (KeyError, IndexError, ValueError) as e:
+                print(f"Failed to parse API response. Unexpected format: {e}")
+                raise
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """embed 的异步版本，批次之间受 embedding_concurrency 限制并发"""
+        batches = self._split_batches(texts)
+        if len(batches) == 1:
+            return await self._aembed_batch(batches[0][1])
+
+        semaphore = asyncio.Semaphore(max(1, settings.embedding_concurrency))
+
+        async def run(batch: List[str]) -> np.ndarray:
+            async with semaphore:
+                return await self._aembed_batch(batch)
+
+        results = await asyncio.gather(*(run(batch) for _, batch in batches))
+        return np.vstack(results)
+
+    async def aclose(self):
+        await self.async_client.aclose()
+        self.session.close()
+
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """进程内的 sentence-transformers 模型，在 CPU（或指定设备）上批量推理
+
+    模型只加载一次；推理在阻塞线程池中执行并串行化，避免多个请求同时争抢 CPU。
+    需要额外安装 sentence-transformers（可选依赖）。
+    """
+
+    name = "local"
+
+    def __init__(self):
+        self.model_name = settings.local_embedding_model
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._encode_lock = threading.Lock()
+
+    @property
+    def model_id(self) -> str:
+        return f"local:{self.model_name}"
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as e:
+                        raise RuntimeError(
+                            "EMBEDDING_BACKEND=local 需要安装 sentence-transformers: "
+                            "pip install sentence-transformers"
+                        ) from e
+                    started = time.perf_counter()
+                    kwargs = {"device": settings.local_embedding_device}
+                    if settings.local_embedding_onnx:
+                        # sentence-transformers >= 3.2 支持以 ONNX Runtime 推理
+                        kwargs["backend"] = "onnx"
+                    self._model = SentenceTransformer(self.model_name, **kwargs)
+                    print(f"本地 Embedding 模型 {self.model_name} 加载完成，"
+                          f"耗时 {time.perf_counter() - started:.1f}s")
+        return self._model
+
+    def warm_up(self):
+        self.model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        model = self.model
+        with self._encode_lock:
+            embeddings = model.encode(
+                texts,
+                batch_size=settings.local_embedding_batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        # 统一做 L2 归一化，与常见在线 Embedding 服务的输出一致
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+
+def create_embedding_backend() -> EmbeddingBackend:
+    if settings.embedding_backend == "local":
+        return LocalEmbeddingBackend()
+    return RemoteEmbeddingBackend()
@@ -0,0 +1,136 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_compression import decode_row, encode_rows
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """持久化的嵌入向量缓存，以 (embedding_model, sha256(content)) 为键，避免重复调用 Embedding API
+
+    向量按 storage_dtype（float32 / float16 / int8）编码后存储；读取时按字节长度识别格式，
+    修改存储格式后已有的缓存仍然可用。
+    """
+
+    def __init__(self, path: str, max_entries: int, storage_dtype: str = "float32"):
+        self.path = path
+        self.max_entries = max_entries
+        self.storage_dtype = storage_dtype
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # 数据库在首次使用时才打开并建表，导入模块时不触碰磁盘
+        self._db: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            with self._open_lock:
+                if self._db is None:
+                    self._db = self._open()
+        return self._db
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_cache (
+                model TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, hash)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache (last_used)")
+        conn.commit()
+        return conn
+
+    def warm_up(self):
+        """打开缓存数据库并建表"""
+        self._conn
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """批量读取缓存，返回命中的 hash -> 向量"""
+        unique = list(dict.fromkeys(hashes))
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # SQLite 对单条语句的参数数量有限制，分段查询
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, dim, vector FROM embedding_cache WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *chunk]
+                ).fetchall()
+                for h, dim, blob in rows:
+                    found[h] = decode_row(blob, dim)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model, h) for h in found]
+                )
+                self._conn.commit()
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model: str, hashes: List[str], embeddings: np.ndarray) -> np.ndarray:
+        """写入新计算的向量，并在超出容量时按最近使用时间淘汰
+
+        返回按存储格式编码再解码后的向量，即之后命中缓存时读到的值，
+        调用方使用它而不是原始向量，保证同一内容无论是否命中缓存得到的向量都相同。
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if not hashes:
+            return vectors
+        now = time.time()
+        dim = int(vectors.shape[1])
+        blobs = encode_rows(vectors, self.storage_dtype)
+        rows = [(model, h, dim, blob, now) for h, blob in zip(hashes, blobs)]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model, hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+            self._conn.commit()
+        return np.vstack([decode_row(blob, dim) for blob in blobs])
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embedding_cache WHERE rowid IN "
+                "(SELECT rowid FROM embedding_cache ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "storage_dtype": self.storage_dtype,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
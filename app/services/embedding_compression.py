@@ -0,0 +1,76 @@
+from typing import List, Tuple
+
+import numpy as np
+
+# 存储格式：float32 原样存储；float16 半精度；int8 为逐向量对称标量量化，附带一个 float32 缩放系数
+STORAGE_DTYPES = ("float32", "float16", "int8")
+_SCALE_BYTES = 4
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """逐行 L2 归一化，零向量保持不变"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def reduce_dimensions(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    """Matryoshka 截断：保留前 dimensions 维并重新归一化
+
+    适用于以 Matryoshka 方式训练的模型（如 text-embedding-3、bge-m3 等），前若干维已包含主要信息。
+    dimensions 为 0 或不小于原维度时原样返回。
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dimensions <= 0 or vectors.ndim != 2 or vectors.shape[1] <= dimensions:
+        return vectors
+    return normalize_rows(vectors[:, :dimensions])
+
+
+def quantize(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, np.ndarray]:
+    """按存储格式量化，返回 (编码后的矩阵, 每行的缩放系数)；非 int8 格式的缩放系数恒为 1"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.ones(len(vectors), dtype=np.float32)
+    if dtype == "float16":
+        return vectors.astype(np.float16), scales
+    if dtype == "int8":
+        peak = np.abs(vectors).max(axis=1) if vectors.size else scales
+        scales = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return vectors, scales
+
+
+def dequantize(codes: np.ndarray, scales: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "int8":
+        return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+    return np.asarray(codes, dtype=np.float32)
+
+
+def bytes_per_vector(dimensions: int, dtype: str) -> int:
+    if dtype == "float16":
+        return dimensions * 2
+    if dtype == "int8":
+        return dimensions + _SCALE_BYTES
+    return dimensions * 4
+
+
+def encode_rows(vectors: np.ndarray, dtype: str) -> List[bytes]:
+    """把向量编码为按行存储的字节串，int8 格式在编码前附加缩放系数"""
+    codes, scales = quantize(vectors, dtype)
+    if dtype == "int8":
+        return [scale.tobytes() + row.tobytes() for scale, row in zip(scales, codes)]
+    return [row.tobytes() for row in codes]
+
+
+def decode_row(blob: bytes, dimensions: int) -> np.ndarray:
+    """按字节长度识别存储格式并解码，因此修改存储格式后旧数据仍可读取"""
+    size = len(blob)
+    if size == dimensions * 4:
+        return np.frombuffer(blob, dtype=np.float32)
+    if size == dimensions * 2:
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if size == dimensions + _SCALE_BYTES:
+        scale = np.frombuffer(blob[:_SCALE_BYTES], dtype=np.float32)[0]
+        return np.frombuffer(blob[_SCALE_BYTES:], dtype=np.int8).astype(np.float32) * scale
+    raise ValueError(f"cannot decode a {size}-byte vector of dimension {dimensions}")
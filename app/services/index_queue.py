@@ -0,0 +1,271 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.concurrency import run_blocking
+from app.core.metrics import span
+from app.services.memo_metadata import build_metadata
+from app.services.memos_db import MEMO_NAME_PREFIX, memos_db
+
+
+class IndexQueue:
+    """基于 SQLite 的持久化索引任务队列
+
+    每条笔记在队列中最多只有一条记录：重复的更新事件会覆盖旧事件（合并），
+    并通过 version 字段保证处理期间到达的新事件不会被误删。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # 数据库在首次使用时才打开并建表，导入模块时不触碰磁盘
+        self._db: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+        self.processed = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_drain_at: Optional[float] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            with self._open_lock:
+                if self._db is None:
+                    self._db = self._open()
+        return self._db
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS index_queue (
+                memo_id TEXT PRIMARY KEY,
+                action TEXT NOT NULL,
+                content TEXT,
+                created_ts INTEGER,
+                updated_ts INTEGER,
+                version INTEGER NOT NULL DEFAULT 1,
+                enqueued_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_index_queue_due ON index_queue (next_attempt_at)")
+        conn.commit()
+        return conn
+
+    def warm_up(self):
+        """打开队列数据库并建表"""
+        self._conn
+
+    def enqueue(self, memo_id: str, action: str, content: Optional[str] = None,
+                created_ts: Optional[int] = None, updated_ts: Optional[int] = None):
+        """加入队列；同一笔记已有待处理事件时以新事件为准，保留最早的入队时间用于计算延迟"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("""
+                INSERT INTO index_queue (memo_id, action, content, created_ts, updated_ts, enqueued_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(memo_id) DO UPDATE SET
+                    action = excluded.action,
+                    content = excluded.content,
+                    created_ts = excluded.created_ts,
+                    updated_ts = excluded.updated_ts,
+                    version = index_queue.version + 1,
+                    attempts = 0,
+                    next_attempt_at = excluded.next_attempt_at,
+                    last_error = NULL
+            """, (memo_id, action, content, created_ts, updated_ts, now, now))
+            self._conn.commit()
+
+    def claim_batch(self, limit: int) -> List[Dict[str, Any]]:
+        """取出已到重试时间的事件，按入队先后排序"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT memo_id, action, content, created_ts, updated_ts, version, attempts
+                FROM index_queue WHERE next_attempt_at <= ?
+                ORDER BY enqueued_at LIMIT ?
+            """, (time.time(), limit)).fetchall()
+        columns = ("memo_id", "action", "content", "created_ts", "updated_ts", "version", "attempts")
+        return [dict(zip(columns, row)) for row in rows]
+
+    def complete(self, events: List[Dict[str, Any]], skipped: int = 0):
+        """删除处理成功的事件；处理期间又被更新过（version 变化）的事件保留
+
+        skipped 为其中无法对应到笔记、未写入索引的事件数量
+        """
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM index_queue WHERE memo_id = ? AND version = ?",
+                [(event["memo_id"], event["version"]) for event in events]
+            )
+            self._conn.commit()
+            self.processed += len(events)
+            self.skipped += skipped
+            self.last_drain_at = time.time()
+
+    def fail(self, events: List[Dict[str, Any]], error: str):
+        """记录失败并按指数退避安排下一次重试"""
+        now = time.time()
+        rows = []
+        for event in events:
+            delay = min(settings.index_queue_max_backoff,
+                        settings.index_queue_retry_backoff * (2 ** event["attempts"]))
+            rows.append((now + delay, error[:500], event["memo_id"], event["version"]))
+        with self._lock:
+            self._conn.executemany("""
+                UPDATE index_queue SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                WHERE memo_id = ? AND version = ?
+            """, rows)
+            self._conn.commit()
+            self.failures += len(events)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            depth, oldest, ready, retrying = self._conn.execute("""
+                SELECT COUNT(*), MIN(enqueued_at),
+                       SUM(CASE WHEN next_attempt_at <= ? THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END)
+                FROM index_queue
+            """, (now,)).fetchone()
+        return {
+            "depth": depth,
+            "ready": ready or 0,
+            "retrying": retrying or 0,
+            "lag_seconds": now - oldest if oldest else 0.0,
+            "processed": self.processed,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_drain_at": self.last_drain_at,
+        }
+
+
+class IndexWorker:
+    """后台消费索引队列：批量合并向量化请求，失败时由队列负责退避重试"""
+
+    def __init__(self, queue: IndexQueue, vector_store, keyword_index):
+        self.queue = queue
+        self.vector_store = vector_store
+        self.keyword_index = keyword_index
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """有新事件入队时唤醒 worker"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _canonical_ids(self, events: List[Dict[str, Any]]) -> Dict[str, str]:
+        """把事件中的 "memos/<uid>" 资源名换算为数据库 ID，与同步任务写入的 ID 保持一致
+
+        先用一次 IN 查询在 Memos 数据库中查找；已被删除的笔记改为按 metadata 中的 uid 在向量库中查找。
+        无法换算的事件不在结果中。
+        """
+        names = [event["memo_id"] for event in events if event["memo_id"].startswith(MEMO_NAME_PREFIX)]
+        canonical = {event["memo_id"]: event["memo_id"] for event in events
+                     if not event["memo_id"].startswith(MEMO_NAME_PREFIX)}
+        if not names:
+            return canonical
+        canonical.update((name, str(memo_id)) for name, memo_id in memos_db.ids_for_names(names).items())
+        missing = {name[len(MEMO_NAME_PREFIX):]: name for name in names if name not in canonical}
+        for uid, memo_id in self.vector_store.memo_ids_for_uids(list(missing)).items():
+            canonical[missing[uid]] = memo_id
+        return canonical
+
+    def _apply(self, events: List[Dict[str, Any]]) -> List[str]:
+        """写入索引，返回被跳过的事件"""
+        canonical = self._canonical_ids(events)
+        skipped = [event["memo_id"] for event in events if event["memo_id"] not in canonical]
+        if skipped:
+            # 数据库和索引中都找不到：新建笔记尚未可见或从未被索引，交给周期同步处理
+            print(f"索引队列中 {len(skipped)} 条事件无法对应到笔记 ID，已跳过: {skipped[:5]}")
+        uids = {name: name[len(MEMO_NAME_PREFIX):] for name in canonical if name.startswith(MEMO_NAME_PREFIX)}
+        events = [dict(event, uid=uids.get(event["memo_id"]), memo_id=canonical[event["memo_id"]])
+                  for event in events if event["memo_id"] in canonical]
+        deletes = [event["memo_id"] for event in events if event["action"] == "delete"]
+        upserts = [event for event in events if event["action"] == "upsert"]
+        if upserts:
+            # 行状态和可见性以 Memos 数据库为准（Webhook 不携带归档状态）；
+            # 已归档、不再私有或已被删除的笔记改为从索引中移除
+            records = memos_db.get_many(int(event["memo_id"]) for event in upserts if event["memo_id"].isdigit())
+            for event in upserts:
+                record = records.get(int(event["memo_id"])) if event["memo_id"].isdigit() else None
+                event["record"] = record if record is not None and record.row_status == "NORMAL" \
+                    and record.visibility == "PRIVATE" else None
+            deletes.extend(event["memo_id"] for event in upserts if event["record"] is None)
+            upserts = [event for event in upserts if event["record"] is not None]
+        if deletes:
+            self.vector_store.delete_documents(deletes)
+            self.keyword_index.delete(deletes)
+        if upserts:
+            # 多个事件的文档合并为一次 upsert，共享分批并发的 Embedding 请求
+            now = int(time.time())
+            self.vector_store.upsert_documents(
+                [event["content"] for event in upserts],
+                [event["memo_id"] for event in upserts],
+                [build_metadata(event["content"], event["created_ts"] or now, event["updated_ts"] or now,
+                                event["record"].visibility, uid=event["uid"])
+                 for event in upserts]
+            )
+            self.keyword_index.upsert([
+                (event["memo_id"], event["content"], event["created_ts"] or now,
+                 event["updated_ts"] or now, event["record"].row_status, event["record"].visibility)
+                for event in upserts
+            ])
+        return skipped
+
+    async def drain_once(self) -> int:
+        events = await run_blocking(self.queue.claim_batch, settings.index_queue_batch_size)
+        if not events:
+            return 0
+        try:
+            with span("index.apply"):
+                skipped = await run_blocking(self._apply, events)
+        except Exception as e:
+            print(f"索引队列处理失败 ({len(events)} 条)，稍后重试: {e}")
+            await run_blocking(self.queue.fail, events, str(e))
+            return 0
+        await run_blocking(self.queue.complete, events, len(skipped))
+        print(f"索引队列已处理 {len(events)} 条事件")
+        return len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                processed = await self.drain_once()
+            except Exception as e:
+                print(f"索引队列 worker 异常: {e}")
+                processed = 0
+            if processed:
+                continue
+            # 空闲或全部在退避中：等待新事件或轮询间隔到期
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.index_queue_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+index_queue = IndexQueue(os.path.join(settings.vector_db_path, "index_queue.sqlite3"))
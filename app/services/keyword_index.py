@@ -0,0 +1,223 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import span
+from app.services.memo_metadata import SearchFilters, parse_tags
+
+# (memo_id, content, created_ts, updated_ts, row_status, visibility)
+KeywordRecord = Tuple[str, str, int, int, str, str]
+
+# trigram 分词器无法用 MATCH 匹配少于 3 个字符的词，这类词改查按单字和二字组建立的 memo_short 索引
+_MIN_TRIGRAM_LENGTH = 3
+
+_TERM_PATTERN = re.compile(r"[\w\-\.#+]+", re.UNICODE)
+_CJK_RUN_PATTERN = re.compile(r"[一-鿿]+")
+_MAX_QUERY_TERMS = 32
+
+
+def extract_query_terms(query: str) -> List[str]:
+    """在本地从问题中提取检索词，无需调用 LLM
+
+    英文/数字按词切分；连续的中文片段拆成重叠的三字组，与 trigram 索引的粒度保持一致。
+    """
+    terms: List[str] = []
+    for token in _TERM_PATTERN.findall(query):
+        parts = _CJK_RUN_PATTERN.split(token)
+        terms.extend(part for part in parts if len(part) > 1)
+        for run in _CJK_RUN_PATTERN.findall(token):
+            if len(run) <= _MIN_TRIGRAM_LENGTH:
+                terms.append(run)
+            else:
+                terms.extend(run[i:i + _MIN_TRIGRAM_LENGTH] for i in range(len(run) - _MIN_TRIGRAM_LENGTH + 1))
+    return list(dict.fromkeys(terms))[:_MAX_QUERY_TERMS]
+
+
+def short_term_tokens(content: str) -> str:
+    """短词索引的内容：中文片段拆成单字和二字组，其余文本原样交给 unicode61 分词器按词切分"""
+    parts: List[str] = []
+    position = 0
+    for match in _CJK_RUN_PATTERN.finditer(content):
+        parts.append(content[position:match.start()])
+        run = match.group()
+        parts.extend(run)
+        parts.extend(run[i:i + 2] for i in range(len(run) - 1))
+        position = match.end()
+    parts.append(content[position:])
+    return " ".join(part for part in parts if part)
+
+
+class KeywordIndex:
+    """基于 SQLite FTS5 (trigram) 的笔记关键词索引
+
+    作为独立的旁路数据库存放在 vector_db_path 下，由同步脚本和 Webhook 增量维护，
+    检索时按 BM25 排序，避免对 Memos 数据库做 LIKE '%kw%' 全表扫描。
+    记录以笔记 ID 作为 rowid，按笔记更新和删除走主键。trigram 无法匹配的短词
+    （如 "证书"、"部署"）查询 memo_short 表：中文按单字和二字组、其余按词建立的 unicode61 索引。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # 数据库在首次使用时才打开并建表（或迁移），导入模块时不触碰磁盘
+        self._db: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            with self._open_lock:
+                if self._db is None:
+                    self._db = self._open()
+        return self._db
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(memo_fts)")]
+        if "memo_id" in columns:
+            # 旧版本以非索引列保存笔记 ID，删除后由同步流程按空索引补建
+            print("关键词索引格式已更新，将重新建立")
+            conn.execute("DROP TABLE memo_fts")
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS memo_fts USING fts5(
+                content,
+                created_ts UNINDEXED,
+                updated_ts UNINDEXED,
+                row_status UNINDEXED,
+                visibility UNINDEXED,
+                tokenize = 'trigram'
+            )
+        """)
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS memo_short USING fts5(tokens, tokenize = 'unicode61')")
+        conn.commit()
+        return conn
+
+    def warm_up(self):
+        """打开数据库，完成建表和格式迁移"""
+        self._conn
+
+    def _delete_locked(self, rowids: List[int]):
+        for start in range(0, len(rowids), 500):
+            chunk = rowids[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            self._conn.execute(f"DELETE FROM memo_fts WHERE rowid IN ({placeholders})", chunk)
+            self._conn.execute(f"DELETE FROM memo_short WHERE rowid IN ({placeholders})", chunk)
+
+    def upsert(self, records: Iterable[KeywordRecord]):
+        """写入或替换笔记的索引记录"""
+        rows = [(int(memo_id), content, int(created_ts), int(updated_ts), row_status, visibility)
+                for memo_id, content, created_ts, updated_ts, row_status, visibility in records
+                if str(memo_id).isdigit()]
+        if not rows:
+            return
+        with self._lock:
+            self._delete_locked([row[0] for row in rows])
+            self._conn.executemany(
+                "INSERT INTO memo_fts (rowid, content, created_ts, updated_ts, row_status, visibility) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.executemany(
+                "INSERT INTO memo_short (rowid, tokens) VALUES (?, ?)",
+                [(row[0], short_term_tokens(row[1])) for row in rows]
+            )
+            self._conn.commit()
+
+    def delete(self, memo_ids: List[str]):
+        rowids = [int(memo_id) for memo_id in memo_ids if str(memo_id).isdigit()]
+        if not rowids:
+            return
+        with self._lock:
+            self._delete_locked(rowids)
+            self._conn.commit()
+
+    @staticmethod
+    def _quote(term: str) -> str:
+        # 以短语形式传给 MATCH，避免关键词中的运算符被 FTS5 语法解析
+        return '"' + term.replace('"', '""') + '"'
+
+    @staticmethod
+    def _filter_clause(filters: Optional[SearchFilters]) -> Tuple[str, List[Any]]:
+        """把检索过滤条件转换为附加的 SQL 条件和参数"""
+        clause = "row_status = 'NORMAL' AND visibility = 'PRIVATE'"
+        params: List[Any] = []
+        if not filters:
+            return clause, params
+        if filters.created_after is not None:
+            clause += " AND CAST(created_ts AS INTEGER) >= ?"
+            params.append(filters.created_after)
+        if filters.created_before is not None:
+            clause += " AND CAST(created_ts AS INTEGER) <= ?"
+            params.append(filters.created_before)
+        if filters.tags:
+            # LIKE 只做粗筛（#work 也会命中 #workout），结果再按解析出的标签精确过滤
+            clause += " AND (" + " OR ".join("content LIKE ?" for _ in filters.tags) + ")"
+            params.extend(f"%#{tag}%" for tag in filters.tags)
+        return clause, params
+
+    @staticmethod
+    def _hit(row: tuple) -> Dict[str, Any]:
+        rowid, content, created_ts, updated_ts, row_status, visibility, score = row
+        return {
+            "memo_id": str(rowid), "content": content, "score": float(score),
+            "created_ts": int(created_ts), "updated_ts": int(updated_ts),
+            "row_status": row_status, "visibility": visibility,
+        }
+
+    def search(self, keywords: List[str], limit: int = 10,
+               filters: Optional[SearchFilters] = None) -> List[Dict[str, Any]]:
+        """按关键词检索，返回按 BM25 分数降序排列的结果（score 越大越相关）
+
+        filters 可限定创建时间范围和标签（命中任一标签即可）。
+        """
+        terms = [kw.strip() for kw in keywords if kw and kw.strip()]
+        long_terms = [t for t in terms if len(t) >= _MIN_TRIGRAM_LENGTH]
+        short_terms = [t for t in terms if len(t) < _MIN_TRIGRAM_LENGTH]
+        status_filter, filter_params = self._filter_clause(filters)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        fallback: List[Dict[str, Any]] = []
+        with span("keyword.search"), self._lock:
+            if long_terms:
+                rows = self._conn.execute(
+                    f"SELECT rowid, content, created_ts, updated_ts, row_status, visibility, -bm25(memo_fts) AS score "
+                    f"FROM memo_fts WHERE memo_fts MATCH ? AND {status_filter} "
+                    f"ORDER BY rank LIMIT ?",
+                    [" OR ".join(self._quote(t) for t in long_terms), *filter_params, limit]
+                ).fetchall()
+                for row in rows:
+                    results[str(row[0])] = self._hit(row)
+            if short_terms and len(results) < limit:
+                # 短词走 memo_short 索引，按其 BM25 排序，排在 trigram 结果之后
+                rows = self._conn.execute(
+                    f"SELECT memo_fts.rowid, content, created_ts, updated_ts, row_status, visibility, "
+                    f"-bm25(memo_short) AS score "
+                    f"FROM memo_short JOIN memo_fts ON memo_fts.rowid = memo_short.rowid "
+                    f"WHERE memo_short MATCH ? AND {status_filter} ORDER BY score DESC LIMIT ?",
+                    [" OR ".join(self._quote(t) for t in short_terms), *filter_params, limit]
+                ).fetchall()
+                fallback.extend(self._hit(row) for row in rows if str(row[0]) not in results)
+
+        ranked = sorted(results.values(), key=lambda r: r["score"], reverse=True)
+        ranked.extend(sorted(fallback, key=lambda r: r["score"], reverse=True))
+        if filters and filters.tags:
+            wanted = set(filters.tags)
+            ranked = [r for r in ranked if wanted.intersection(parse_tags(r["content"]))]
+        return ranked[:limit]
+
+    def all_ids(self) -> List[str]:
+        with self._lock:
+            return [str(row[0]) for row in self._conn.execute("SELECT rowid FROM memo_fts")]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM memo_fts").fetchone()[0]
+
+
+keyword_index = KeywordIndex(os.path.join(settings.vector_db_path, "keyword_index.sqlite3"))
@@ -1,65 +1,101 @@
 import logging
-from openai import OpenAI
 from app.core.config import settings
-from typing import List, Dict, Any, Iterator
+from app.core.metrics import observe, record_usage, span
+from typing import List, Dict, Any, AsyncIterator
 import httpx
-import re
+import threading
+import time
+from datetime import date
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def filter_sensitive_content(context: str) -> str:
-    """从上下文中过滤敏感信息"""
-    # 将笔记内容按分隔符拆分
-    notes = context.split("---")
-    
-    sensitive_keywords = ["密码", "password", "密钥", "token"]
-    sensitive_tags = ["#密码"]
-    
-    def is_sensitive(note_content: str) -> bool:
-        # 检查关键词
-        if any(keyword in note_content.lower() for keyword in sensitive_keywords):
-            return True
-        # 检查标签
-        if any(re.search(rf'{tag}\b', note_content, re.IGNORECASE) for tag in sensitive_tags):
-            return True
-        return False
-
-    filtered_notes = [note for note in notes if not is_sensitive(note)]
-    
-    num_filtered = len(notes) - len(filtered_notes)
-    if num_filtered > 0:
-        logger.info(f"已从上下文中过滤 {num_filtered} 条敏感笔记")
-        
-    return "---".join(filtered_notes)
+GENERAL_ANSWER_NOTICE = "（注意：以下内容为AI生成的通用回答，不代表个人笔记。）\n\n"
+ANSWER_ERROR_MESSAGE = "抱歉，生成回答时遇到错误。"
 
 
 class LLMService:
     def __init__(self):
+        # openai SDK 导入较慢，客户端在首次使用（或服务启动后的后台预热）时才创建
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._build_client()
+        return self._client
+
+    def _build_client(self):
+        from openai import AsyncOpenAI
+
         # Diagnostic code to check the loaded httpx version and path
         logger.info(f"httpx version: {httpx.__version__}")
         logger.info(f"httpx path: {httpx.__file__}")
 
         # To isolate the persistent TypeError, we simplify the client initialization.
         # The transport argument is temporarily removed to check for conflicts.
-        http_client = httpx.Client(
+        http_client = httpx.AsyncClient(
             proxy=settings.proxy if settings.proxy else None
         )
-        self.client = OpenAI(
+        return AsyncOpenAI(
             api_key=settings.openai_api_key,
             base_url=settings.openai_base_url,
             http_client=http_client
         )
+
+    def warm_up(self):
+        """导入 openai SDK 并创建客户端"""
+        self.client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
     
-    def decide_tool(self, question: str, tools: List[Dict[str, Any]]):
+    async def _complete(self, operation: str, **kwargs):
+        """非流式调用，记录耗时与 token 用量"""
+        with span(f"llm.{operation}"):
+            response = await self.client.chat.completions.create(model=settings.llm_model, **kwargs)
+        record_usage(operation, getattr(response, "usage", None))
+        return response
+
+    async def _stream(self, operation: str, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """流式调用，记录首 token 延迟、整个流的耗时和 token 用量"""
+        extra = {"stream_options": {"include_usage": True}} if settings.llm_stream_usage else {}
+        started = time.perf_counter()
+        first_token = True
+        with span(f"llm.{operation}"):
+            stream = await self.client.chat.completions.create(
+                model=settings.llm_model,
+                messages=messages,
+                stream=True,
+                **extra
+            )
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    # 开启 include_usage 后，最后一个数据块携带整个请求的用量
+                    record_usage(operation, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    if first_token:
+                        observe(f"llm.{operation}.time_to_first_token", time.perf_counter() - started)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
+
+    async def decide_tool(self, question: str, tools: List[Dict[str, Any]]):
         logger.info(f"Deciding tool for question: '{question}'")
         try:
-            response = self.client.chat.completions.create(
-                model=settings.llm_model,
+            response = await self._complete(
+                "decide_tool",
                 messages=[
-                    {"role": "system", "content": "你是一个有用的助手，根据用户的问题决定使用哪个工具。请仅返回工具调用。"},
+                    {"role": "system", "content": (
+                        "你是一个有用的助手，根据用户的问题决定使用哪个工具。请仅返回工具调用。"
+                        f"今天是 {date.today().isoformat()}，问题涉及时间（如“上周”“去年”）或标签时，"
+                        "请换算为 search_memos 的 created_after / created_before / tags 参数。"
+                    )},
                     {"role": "user", "content": question}
                 ],
                 tools=tools,
@@ -70,36 +106,35 @@ class LLMService:
             logger.error(f"Error deciding tool: {e}", exc_info=True)
             return None
 
-    def generate_answer_with_context(self, question: str, context: str) -> Iterator[str]:
+    async def generate_answer_with_context(
+        self, question: str, context: str, judge_relevance: bool = False
+    ) -> AsyncIterator[str]:
         logger.info(f"Generating answer for question '{question}' with provided context.")
         
-        # 在生成答案前过滤上下文
-        filtered_context = filter_sensitive_content(context)
-        
         prompt = f"""请回答用户的问题。
 用户笔记中的上下文：
 ---
-{filtered_context}
+{context}
 ---
 用户的问题：{question}
+"""
+        if judge_relevance:
+            # 将相关性判断并入生成请求，省去单独的校验调用
+            prompt += f"""
+如果上述笔记上下文与问题无关、无法用来回答问题，请忽略这些笔记，直接基于你的通用知识回答，并在回答开头注明：{GENERAL_ANSWER_NOTICE.strip()}
 """
         try:
-            stream = self.client.chat.completions.create(
-                model=settings.llm_model,
-                messages=[
-                    {"role": "system", "content": "你是一个为 Memos 设计的 AI 助手。你的目标是成为一个有用的伙伴，通过你的分析来丰富用户的笔记。在回答时，请将用户笔记中提供的上下文作为你的主要参考，但我们鼓励你在此基础上进行扩展，加入你自己的见解和知识，以提供更全面、更深入的回答。"},
-                    {"role": "user", "content": prompt}
-                ],
-                stream=True
-            )
-            for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            messages = [
+                {"role": "system", "content": "你是一个为 Memos 设计的 AI 助手。你的目标是成为一个有用的伙伴，通过你的分析来丰富用户的笔记。在回答时，请将用户笔记中提供的上下文作为你的主要参考，但我们鼓励你在此基础上进行扩展，加入你自己的见解和知识，以提供更全面、更深入的回答。"},
+                {"role": "user", "content": prompt}
+            ]
+            async for chunk in self._stream("generate_with_context", messages):
+                yield chunk
         except Exception as e:
             logger.error(f"Error generating answer with context: {e}", exc_info=True)
-            yield "抱歉，生成回答时遇到错误。"
+            yield ANSWER_ERROR_MESSAGE
 
-    def validate_context_relevance(self, question: str, context: str) -> bool:
+    async def validate_context_relevance(self, question: str, context: str) -> bool:
         logger.info(f"Validating context relevance for question: '{question}'")
         prompt = f"""
 用户问题: "{question}"
@@ -113,8 +148,8 @@ class LLMService:
 请仅用 "是" 或 "否" 回答。
 """
         try:
-            response = self.client.chat.completions.create(
-                model=settings.llm_model,
+            response = await self._complete(
+                "relevance_check",
                 messages=[
                     {"role": "system", "content": "你是一个相关性检查助手。你唯一的任务是判断提供的上下文是否有助于回答用户的问题。请仅用 '是' 或 '否' 回答。"},
                     {"role": "user", "content": prompt}
@@ -129,25 +164,20 @@ class LLMService:
             logger.error(f"Error validating context relevance: {e}", exc_info=True)
             return False
 
-    def generate_answer_without_context(self, question: str) -> Iterator[str]:
+    async def generate_answer_without_context(self, question: str) -> AsyncIterator[str]:
         logger.info(f"Generating answer for question '{question}' without context.")
         try:
-            stream = self.client.chat.completions.create(
-                model=settings.llm_model,
-                messages=[
-                    {"role": "system", "content": "你是一个乐于助人的助手。请尽你所能回答用户的问题。"},
-                    {"role": "user", "content": question}
-                ],
-                stream=True
-            )
-            for chunk in stream:
-                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            messages = [
+                {"role": "system", "content": "你是一个乐于助人的助手。请尽你所能回答用户的问题。"},
+                {"role": "user", "content": question}
+            ]
+            async for chunk in self._stream("generate_without_context", messages):
+                yield chunk
         except Exception as e:
             logger.error(f"Error generating answer without context: {e}", exc_info=True)
-            yield "抱歉，生成回答时遇到错误。"
+            yield ANSWER_ERROR_MESSAGE
 
-    def extract_keywords(self, question: str, max_keywords: int = 5) -> List[str]:
+    async def extract_keywords(self, question: str, max_keywords: int = 5) -> List[str]:
         """Extracts keywords from a question using the LLM."""
         import json
         logger.info(f"Extracting keywords from question: '{question}'")
@@ -161,8 +191,8 @@ class LLMService:
         问题: "{question}"
         """
         try:
-            response = self.client.chat.completions.create(
-                model=settings.llm_model,
+            response = await self._complete(
+                "extract_keywords",
                 messages=[
                     {"role": "system", "content": "你是关键词提取专家。请仅以 JSON 字符串列表的格式回应。"},
                     {"role": "user", "content": prompt}
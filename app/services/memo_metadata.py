@@ -0,0 +1,93 @@
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# Memos 的标签写法：以 # 开头、不含空白的片段，支持多级标签 (#工作/会议)
+_TAG_PATTERN = re.compile(r"(?:(?<=\s)|^)#([^\s#]+)")
+_TAG_TRAILING_PUNCTUATION = ".,;:!?，。；：！？、)]）】"
+TAG_KEY_PREFIX = "tag:"
+
+
+def parse_tags(content: str) -> List[str]:
+    """从笔记内容中解析标签，统一转为小写并去重"""
+    tags = []
+    for tag in _TAG_PATTERN.findall(content or ""):
+        tag = tag.rstrip(_TAG_TRAILING_PUNCTUATION).lower()
+        if tag:
+            tags.append(tag)
+    return list(dict.fromkeys(tags))
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lstrip("#").lower()
+
+
+def build_metadata(content: str, created_ts: int, updated_ts: int, visibility: str = "PRIVATE",
+                   uid: Optional[str] = None) -> Dict[str, Any]:
+    """生成与向量一起存储的笔记级 metadata
+
+    ChromaDB 的 metadata 只支持标量值，因此每个标签存为一个布尔键 "tag:<name>"，
+    另存一份逗号拼接的 tags 字符串便于展示；uid 用于把 Webhook 中的资源名对应回已索引的笔记。
+    """
+    tags = parse_tags(content)
+    metadata: Dict[str, Any] = {
+        "created_ts": int(created_ts),
+        "updated_ts": int(updated_ts),
+        "visibility": visibility,
+        "tags": ",".join(tags),
+    }
+    if uid:
+        metadata["uid"] = uid
+    for tag in tags:
+        metadata[f"{TAG_KEY_PREFIX}{tag}"] = True
+    return metadata
+
+
+def parse_date(value: Optional[str], end_of_day: bool = False) -> Optional[int]:
+    """把工具参数中的日期 (YYYY-MM-DD 或 ISO 时间) 转成时间戳；只给出日期时可取当天结束"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if end_of_day and len(value.strip()) == 10:
+        parsed = parsed + timedelta(days=1) - timedelta(seconds=1)
+    return int(parsed.timestamp())
+
+
+class SearchFilters:
+    """检索过滤条件，可同时转换为 ChromaDB where 条件和关键词索引的过滤参数"""
+    __slots__ = ("created_after", "created_before", "tags")
+
+    def __init__(self, created_after: Optional[int] = None, created_before: Optional[int] = None,
+                 tags: Optional[List[str]] = None):
+        self.created_after = created_after
+        self.created_before = created_before
+        self.tags = [t for t in (normalize_tag(tag) for tag in tags or []) if t]
+
+    @classmethod
+    def from_tool_arguments(cls, created_after: Optional[str] = None, created_before: Optional[str] = None,
+                            tags: Optional[List[str]] = None) -> Optional["SearchFilters"]:
+        filters = cls(parse_date(created_after), parse_date(created_before, end_of_day=True), tags)
+        return filters if filters else None
+
+    def __bool__(self) -> bool:
+        return self.created_after is not None or self.created_before is not None or bool(self.tags)
+
+    def to_where(self) -> Optional[Dict[str, Any]]:
+        conditions: List[Dict[str, Any]] = []
+        if self.created_after is not None:
+            conditions.append({"created_ts": {"$gte": self.created_after}})
+        if self.created_before is not None:
+            conditions.append({"created_ts": {"$lte": self.created_before}})
+        if self.tags:
+            # 命中任一标签即可
+            tag_conditions = [{f"{TAG_KEY_PREFIX}{tag}": True} for tag in self.tags]
+            conditions.append(tag_conditions[0] if len(tag_conditions) == 1 else {"$or": tag_conditions})
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+    def __repr__(self) -> str:
+        return f"SearchFilters(created_after={self.created_after}, created_before={self.created_before}, tags={self.tags})"
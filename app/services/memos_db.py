@@ -0,0 +1,178 @@
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.pool import QueuePool
+
+from app.core.config import settings
+from app.models.database import Memo
+
+_IN_CHUNK = 500
+
+
+MEMO_NAME_PREFIX = "memos/"
+
+
+class MemoRecord:
+    """只包含索引所需列的轻量笔记记录，替代完整的 ORM 对象
+
+    同步、检索和问答统一使用这一记录类型；对外（索引、缓存、API 返回）统一以
+    str(id) 作为笔记的规范 ID，Webhook 中的 "memos/<uid>" 在写入索引前会换算为它。
+    """
+    __slots__ = ("id", "content", "created_ts", "updated_ts", "row_status", "visibility", "uid")
+
+    def __init__(self, id: int, content: str, created_ts: int, updated_ts: int, row_status: str, visibility: str,
+                 uid: Optional[str] = None):
+        self.id = id
+        self.content = content
+        self.created_ts = created_ts
+        self.updated_ts = updated_ts
+        self.row_status = row_status
+        self.visibility = visibility
+        self.uid = uid
+
+    @property
+    def memo_id(self) -> str:
+        """规范 ID"""
+        return str(self.id)
+
+    def with_content(self, content: str) -> "MemoRecord":
+        """同一笔记的另一份记录，只替换内容（如检索命中的分块）"""
+        return MemoRecord(self.id, content, self.created_ts, self.updated_ts, self.row_status, self.visibility,
+                          self.uid)
+
+    @property
+    def created_datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.created_ts)
+
+    @property
+    def updated_datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.updated_ts)
+
+    def __repr__(self) -> str:
+        return f"MemoRecord(id={self.id!r}, updated_ts={self.updated_ts!r})"
+
+
+_table = Memo.__table__
+_RECORD_COLUMNS = (_table.c.id, _table.c.content, _table.c.created_ts, _table.c.updated_ts,
+                   _table.c.row_status, _table.c.visibility, _table.c.uid)
+_ACTIVE = (_table.c.row_status == "NORMAL", _table.c.visibility == "PRIVATE")
+
+
+class MemosDatabase:
+    """Memos 数据库的只读访问层
+
+    Memos 服务本身也在写这个数据库，因此这里以 URI 只读模式 (mode=ro) 打开，
+    连接上设置 busy_timeout 和 query_only，并通过连接池复用连接；
+    查询只读取需要的列，返回元组或 MemoRecord，不再构造 ORM 实例。
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.engine = create_engine(
+            f"sqlite:///file:{self.path}?mode=ro&uri=true",
+            poolclass=QueuePool,
+            pool_size=settings.memos_db_pool_size,
+            max_overflow=settings.memos_db_pool_size,
+            pool_pre_ping=True,
+            connect_args={"check_same_thread": False, "timeout": settings.memos_db_busy_timeout_ms / 1000},
+        )
+        event.listen(self.engine, "connect", self._configure_connection)
+
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        # Memos 写入时等待锁释放而不是立即报 database is locked
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.memos_db_busy_timeout_ms)}")
+        cursor.execute("PRAGMA query_only = ON")
+        cursor.execute("PRAGMA temp_store = MEMORY")
+        cursor.close()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def warm_up(self):
+        """确认数据库存在并建立一个连接放入连接池"""
+        if not self.exists():
+            raise FileNotFoundError(f"Memos 数据库文件不存在: {self.path}")
+        with self.engine.connect() as conn:
+            conn.execute(select(func.count(_table.c.id)))
+
+    def _records(self, statement) -> List[MemoRecord]:
+        with self.engine.connect() as conn:
+            return [MemoRecord(*row) for row in conn.execute(statement)]
+
+    def get(self, memo_id: int) -> Optional[MemoRecord]:
+        records = self._records(select(*_RECORD_COLUMNS).where(_table.c.id == memo_id))
+        return records[0] if records else None
+
+    def get_many(self, memo_ids: Iterable[int]) -> Dict[int, MemoRecord]:
+        ids = list(dict.fromkeys(memo_ids))
+        found: Dict[int, MemoRecord] = {}
+        for start in range(0, len(ids), _IN_CHUNK):
+            statement = select(*_RECORD_COLUMNS).where(_table.c.id.in_(ids[start:start + _IN_CHUNK]))
+            found.update((record.id, record) for record in self._records(statement))
+        return found
+
+    def ids_for_names(self, names: Iterable[str]) -> Dict[str, int]:
+        """把 "memos/<uid>" 形式的资源名批量换算为数据库 ID，不存在的笔记不在结果中"""
+        uids = {name[len(MEMO_NAME_PREFIX):] if name.startswith(MEMO_NAME_PREFIX) else name: name for name in names}
+        uid_list = list(uids)
+        found: Dict[str, int] = {}
+        with self.engine.connect() as conn:
+            for start in range(0, len(uid_list), _IN_CHUNK):
+                statement = select(_table.c.uid, _table.c.id).where(_table.c.uid.in_(uid_list[start:start + _IN_CHUNK]))
+                found.update((uids[uid], memo_id) for uid, memo_id in conn.execute(statement))
+        return found
+
+    def existing_ids(self, memo_ids: Iterable[int]) -> Set[int]:
+        ids = list(memo_ids)
+        existing: Set[int] = set()
+        with self.engine.connect() as conn:
+            for start in range(0, len(ids), _IN_CHUNK):
+                statement = select(_table.c.id).where(_table.c.id.in_(ids[start:start + _IN_CHUNK]))
+                existing.update(row[0] for row in conn.execute(statement))
+        return existing
+
+    def table_stats(self) -> Dict[str, int]:
+        with self.engine.connect() as conn:
+            row_count, max_id = conn.execute(select(func.count(_table.c.id), func.max(_table.c.id))).one()
+        return {"row_count": row_count or 0, "max_id": max_id or 0}
+
+    def count_after_id(self, memo_id: int) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count(_table.c.id)).where(_table.c.id > memo_id)).scalar() or 0
+
+    def max_updated_ts(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.max(_table.c.updated_ts))).scalar() or 0
+
+    def changed_since(self, updated_ts: int) -> List[MemoRecord]:
+        """updated_ts 不早于给定时间的所有笔记（包括已归档和公开的笔记）"""
+        return self._records(select(*_RECORD_COLUMNS).where(_table.c.updated_ts >= updated_ts))
+
+    def active_memos(self, updated_before: Optional[int] = None) -> List[MemoRecord]:
+        """所有可被索引的笔记（未归档的私有笔记）"""
+        statement = select(*_RECORD_COLUMNS).where(*_ACTIVE)
+        if updated_before is not None:
+            statement = statement.where(_table.c.updated_ts <= updated_before)
+        return self._records(statement)
+
+    def iter_active_pages(self, after_id: int, page_size: int) -> Iterator[List[MemoRecord]]:
+        """按主键分页读取可索引的笔记，每页单独借用连接，不会长时间持有读事务"""
+        while True:
+            page = self._records(
+                select(*_RECORD_COLUMNS).where(*_ACTIVE, _table.c.id > after_id)
+                .order_by(_table.c.id).limit(page_size)
+            )
+            if not page:
+                return
+            yield page
+            after_id = page[-1].id
+
+    def latest(self, limit: int) -> List[MemoRecord]:
+        return self._records(select(*_RECORD_COLUMNS).order_by(_table.c.created_ts.desc()).limit(limit))
+
+
+memos_db = MemosDatabase(settings.memos_db_path)
@@ -1,219 +1,451 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from app.models.database import Memo
+from app.services.memos_db import memos_db, MemoRecord
 from app.services.vector_store import vector_store
-from app.services.llm_service import llm_service
+from app.services.llm_service import llm_service, GENERAL_ANSWER_NOTICE, ANSWER_ERROR_MESSAGE
+from app.services.answer_cache import answer_cache
+from app.services.keyword_index import keyword_index, extract_query_terms
+from app.services.retrieval import reciprocal_rank_fusion
+from app.services.chunking import select_chunks
+from app.services.context_packer import pack_context
+from app.services.sensitive_filter import sensitive_filter
+from app.services.memo_metadata import SearchFilters
 from app.core.config import settings
-from typing import List, Dict, Any, Iterator
-import os
+from app.core.concurrency import run_blocking
+from app.core.metrics import finish_trace, observe, span, start_trace
+from app.services.query_router import route_question
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+import asyncio
+import json
+import time
+import numpy as np
+
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_latest_memos",
+            "description": "Get the most recent memos by creation time.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "limit": {
+                        "type": "integer",
+                        "description": "The number of recent memos to retrieve.",
+                    },
+                },
+                "required": ["limit"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_memos",
+            "description": "Search for memos based on a semantic query, optionally restricted by creation date and tags.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "The semantic query to search for.",
+                    },
+                     "limit": {
+                        "type": "integer",
+                        "description": "The maximum number of memos to return.",
+                    },
+                    "created_after": {
+                        "type": "string",
+                        "description": "Only return memos created on or after this date (YYYY-MM-DD).",
+                    },
+                    "created_before": {
+                        "type": "string",
+                        "description": "Only return memos created on or before this date (YYYY-MM-DD).",
+                    },
+                    "tags": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Only return memos with any of these tags, without the leading '#'.",
+                    },
+                },
+                "required": ["query", "limit"],
+            },
+        },
+    },
+]
 
 class MemosService:
     def __init__(self):
-        db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'memos_prod.db'))
-        self.engine = create_engine(f"sqlite:///{db_path}")
-        self.SessionLocal = sessionmaker(bind=self.engine)
+        self.db = memos_db
+        if settings.answer_cache_enabled:
+            vector_store.add_change_listener(answer_cache.invalidate_memos)
     
-    def get_memo_by_id(self, memo_id: int) -> Memo:
-        with self.SessionLocal() as session:
-            return session.query(Memo).filter(Memo.id == memo_id).first()
+    def get_memo_by_id(self, memo_id: int) -> Optional[MemoRecord]:
+        return self.db.get(memo_id)
 
-    def get_memo_by_name(self, memo_name: str) -> Memo:
-        with self.SessionLocal() as session:
-            return session.query(Memo).filter(Memo.name == memo_name).first()
+    def get_all_active_memos(self) -> List[MemoRecord]:
+        return self.db.active_memos()
     
-    def get_all_active_memos(self) -> List[Memo]:
-        with self.SessionLocal() as session:
-            return session.query(Memo).filter(
-                Memo.row_status == "NORMAL",
-                Memo.visibility == "PRIVATE"
-            ).all()
-    
-    def search_memos(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
-        from sqlalchemy import or_
+    async def _keyword_candidates(
+        self, query: str, limit: int, use_llm_keywords: bool, filters: Optional[SearchFilters] = None
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        if use_llm_keywords:
+            keywords = await llm_service.extract_keywords(query)
+        else:
+            keywords = []
+        if not keywords:
+            keywords = extract_query_terms(query)
 
-        retrieved_memos = {}
+        print(f"Using keywords for traditional search: {keywords}")
+        if not keywords:
+            return keywords, []
+        # 使用 FTS5 旁路索引做 BM25 排序的关键词检索，不再扫描 Memos 数据库
+        return keywords, await run_blocking(keyword_index.search, keywords, limit, filters)
+
+    async def search_memos(
+        self,
+        query: str,
+        limit: int = 5,
+        semantic_results: Optional[List[Tuple[str, str, float]]] = None,
+        use_llm_keywords: bool = True,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None,
+        tags: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """混合检索：向量检索与关键词检索并行执行，再用倒数排名融合 (RRF) 合并排序
+
+        created_after / created_before (YYYY-MM-DD) 和 tags 会下推到两路检索内部过滤，
+        而不是在取回 top-k 之后再筛选，避免过滤后结果过少。
+        """
+        candidate_limit = limit * settings.hybrid_candidate_multiplier
+        filters = SearchFilters.from_tool_arguments(created_after, created_before, tags)
+        if filters:
+            print(f"Applying search filters: {filters}")
+
+        async def semantic_candidates() -> List[Tuple[str, str, float]]:
+            if semantic_results is not None and not filters:
+                print(f"Reusing speculative semantic search results for: '{query}'")
+                return semantic_results
+            print(f"Performing semantic search for: '{query}'")
+            return await vector_store.asearch(query, k=candidate_limit, where=filters.to_where() if filters else None)
+
+        semantic_search_results, (keywords, keyword_search_results) = await asyncio.gather(
+            semantic_candidates(),
+            self._keyword_candidates(query, candidate_limit, use_llm_keywords, filters)
+        )
+        print(f"Found {len(semantic_search_results)} memos via semantic search, "
+              f"{len(keyword_search_results)} via keyword search.")
+
+        # 旧版本 Webhook 以 "memos/<uid>" 写入的记录在索引重建前仍可能被命中，它们与数据库 ID 的记录重复，直接忽略
+        keyword_search_results = [hit for hit in keyword_search_results if hit["memo_id"].isdigit()]
+        semantic_search_results = [hit for hit in semantic_search_results if hit[0].isdigit()]
+
+        retrieved_memos: Dict[str, Dict[str, Any]] = {}
+        for hit in keyword_search_results:
+            # 关键词索引带有真实的时间戳、状态和可见性；只保留长笔记中命中关键词最多的分块
+            memo = MemoRecord(
+                int(hit["memo_id"]),
+                select_chunks(
+                    hit["content"], keywords, settings.chunk_size_tokens,
+                    settings.chunk_overlap_tokens, settings.chunk_max_per_memo
+                ),
+                hit["created_ts"], hit["updated_ts"], hit["row_status"], hit["visibility"]
+            )
+            retrieved_memos[memo.memo_id] = {"memo": memo, "semantic_distance": None, "keyword_score": hit["score"]}
+
+        # 只有向量检索命中的笔记用一次 IN 查询批量补全时间戳；数据库中已不存在的笔记直接丢弃
+        semantic_only = [int(memo_id) for memo_id, _, _ in semantic_search_results if memo_id not in retrieved_memos]
+        records = await run_blocking(self.db.get_many, semantic_only) if semantic_only else {}
+        for memo_id, content, distance in semantic_search_results:
+            entry = retrieved_memos.get(memo_id)
+            if entry is not None:
+                # 内容保留向量检索命中的分块，避免整篇长笔记进入上下文
+                if entry["semantic_distance"] is None:
+                    entry["memo"] = entry["memo"].with_content(content)
+                    entry["semantic_distance"] = distance
+                continue
+            record = records.get(int(memo_id))
+            if record is not None:
+                retrieved_memos[memo_id] = {
+                    "memo": record.with_content(content), "semantic_distance": distance, "keyword_score": None
+                }
+
+        fused_scores = reciprocal_rank_fusion({
+            "semantic": [memo_id for memo_id, _, _ in semantic_search_results],
+            "keyword": [hit["memo_id"] for hit in keyword_search_results],
+        }, k=settings.hybrid_rrf_k)
 
-        # --- Phase 1: Semantic Search (Vector) ---
-        print(f"Phase 1: Performing semantic search for: '{query}'")
-        # vector_store.search now returns (name, content, score)
-        semantic_search_results = vector_store.search(query, k=limit)
-        
-        top_score = 0
-        if semantic_search_results:
-            from collections import namedtuple
-            from datetime import datetime
-
-            top_score = semantic_search_results[0][2] # Score is the 3rd element
-            print(f"Top semantic search score: {top_score}")
-            # Add all semantic results to the candidate pool
-            for memo_name, content, score in semantic_search_results:
-                if memo_name not in retrieved_memos:
-                    # Create a dummy memo object to avoid a DB call, as we already have the content.
-                    # This makes semantic results compatible with the rest of the function.
-                    DummyMemo = namedtuple('DummyMemo', ['id', 'content', 'created_datetime', 'updated_datetime'])
-                    memo = DummyMemo(
-                        id=memo_name, 
-                        content=content, 
-                        created_datetime=datetime.now(), # Placeholder timestamp
-                        updated_datetime=datetime.now()  # Placeholder timestamp
-                    )
-                    retrieved_memos[memo_name] = {
-                        "memo": memo,
-                        "score": score,
-                        "source": "semantic"
-                    }
-
-        # --- Phase 2: Traditional Keyword Search (if needed) ---
-        if top_score < settings.retrieval_score_threshold:
-            print(f"Phase 2: Top score is below threshold. Triggering traditional keyword search.")
-            
-            keywords = llm_service.extract_keywords(query)
-            if not keywords and len(query.split()) <= 3:
-                keywords = [query]
-            
-            print(f"Using keywords for traditional search: {keywords}")
-
-            if keywords:
-                with self.SessionLocal() as session:
-                    # Build a list of LIKE conditions
-                    like_conditions = [Memo.content.like(f"%{keyword}%") for keyword in keywords]
-                    # Query for memos that match any of the keywords
-                    keyword_search_results = session.query(Memo).filter(or_(*like_conditions)).limit(limit * 2).all()
-                    
-                    print(f"Found {len(keyword_search_results)} memos via traditional search.")
-                    
-                    # Add keyword results to the candidate pool
-                    for memo in keyword_search_results:
-                        if memo.id not in retrieved_memos:
-                             retrieved_memos[memo.id] = {
-                                "memo": memo,
-                                "score": 0, # Traditional search has no comparable score
-                                "source": "keyword"
-                            }
-        
-        # --- Phase 3: Format final results ---
         final_results = []
         for memo_id, data in retrieved_memos.items():
             memo = data["memo"]
+            in_semantic = data["semantic_distance"] is not None
+            in_keyword = data.get("keyword_score") is not None
             final_results.append({
-                "id": memo.id,
+                "id": memo.memo_id,
                 "content": memo.content,
-                "score": data["score"],
-                "source": data["source"],
+                "score": fused_scores.get(memo_id, 0.0),
+                "source": "hybrid" if in_semantic and in_keyword else ("semantic" if in_semantic else "keyword"),
+                # 各路检索的原始分数：向量距离越小越相似，BM25 分数越大越相关
+                "semantic_distance": data["semantic_distance"],
+                "keyword_score": data.get("keyword_score"),
                 "created_at": memo.created_datetime.isoformat(),
                 "updated_at": memo.updated_datetime.isoformat()
             })
 
-        # Simple sort to bring keyword matches to the top if they exist
-        final_results.sort(key=lambda x: x['source'] == 'keyword', reverse=True)
-        
+        final_results.sort(key=lambda x: x["score"], reverse=True)
         return final_results[:limit]
     
-    def get_latest_memos(self, limit: int = 5) -> List[Dict[str, Any]]:
-        with self.SessionLocal() as session:
-            # 移除 row_status 和 visibility 过滤器，以确保能获取到最新的笔记
-            latest_memos = session.query(Memo).order_by(Memo.created_ts.desc()).limit(limit).all()
-            
-            return [{
-                "id": memo.id,
-                "content": memo.content,
-                "created_at": memo.created_datetime.isoformat(),
-                "updated_at": memo.updated_datetime.isoformat()
-            } for memo in latest_memos]
-
-    def answer_question(self, question: str) -> Iterator[str]:
-        import json
-
-        tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "get_latest_memos",
-                    "description": "Get the most recent memos by creation time.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "limit": {
-                                "type": "integer",
-                                "description": "The number of recent memos to retrieve.",
-                            },
-                        },
-                        "required": ["limit"],
-                    },
-                },
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "search_memos",
-                    "description": "Search for memos based on a semantic query.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "The semantic query to search for.",
-                            },
-                             "limit": {
-                                "type": "integer",
-                                "description": "The maximum number of memos to return.",
-                            },
-                        },
-                        "required": ["query", "limit"],
-                    },
-                },
-            },
-        ]
+    async def get_latest_memos(self, limit: int = 5) -> List[Dict[str, Any]]:
+        return await run_blocking(self._get_latest_memos, limit)
 
-        # Step 1: Let the LLM decide which tool to use
-        tool_choice_message = llm_service.decide_tool(question, tools)
+    def _get_latest_memos(self, limit: int) -> List[Dict[str, Any]]:
+        # 移除 row_status 和 visibility 过滤器，以确保能获取到最新的笔记
+        latest_memos = self.db.latest(limit)
+        
+        return [{
+            "id": memo.memo_id,
+            "content": memo.content,
+            "source": "latest",
+            "created_at": memo.created_datetime.isoformat(),
+            "updated_at": memo.updated_datetime.isoformat()
+        } for memo in latest_memos]
+
+    async def _semantic_candidates(
+        self, question: str, question_embedding: Optional[np.ndarray],
+        semantic_results: Optional[List[Tuple[str, str, float]]]
+    ) -> List[Tuple[str, str, float]]:
+        if semantic_results is not None:
+            # 批量问答时已经通过一次 ChromaDB 查询得到结果
+            return semantic_results
+        return await vector_store.asearch(
+            question, k=settings.max_search_results * settings.hybrid_candidate_multiplier,
+            query_embedding=question_embedding
+        )
+
+    async def _retrieve_fast(
+        self, question: str, question_embedding: Optional[np.ndarray] = None,
+        semantic_results: Optional[List[Tuple[str, str, float]]] = None
+    ) -> List[Dict[str, Any]]:
+        """快速模式：本地规则路由 + 直接检索，不调用 LLM 决策工具或提取关键词"""
+        route = route_question(question, default_limit=settings.max_search_results)
+        if route and route["name"] == "get_latest_memos":
+            print(f"Fast mode: routed locally to get_latest_memos({route['arguments']})")
+            return await self.get_latest_memos(**route["arguments"])
+        limit = settings.max_search_results
+        semantic_results = await self._semantic_candidates(question, question_embedding, semantic_results)
+        return await self.search_memos(question, limit=limit, semantic_results=semantic_results, use_llm_keywords=False)
+
+    async def _retrieve_accurate(
+        self, question: str, question_embedding: Optional[np.ndarray] = None,
+        semantic_results: Optional[List[Tuple[str, str, float]]] = None
+    ) -> List[Dict[str, Any]]:
+        """准确模式：由 LLM 决定工具，同时并行发起一次投机性的语义检索"""
+        limit = settings.max_search_results
+        # 大部分问题最终都会以原问题做语义检索，与工具决策并行执行可以省掉一次串行往返
+        speculative = asyncio.create_task(
+            self._semantic_candidates(question, question_embedding, semantic_results)
+        )
+        try:
+            # Step 1: Let the LLM decide which tool to use
+            tool_choice_message = await llm_service.decide_tool(question, TOOLS)
+
+            if not tool_choice_message or not tool_choice_message.tool_calls:
+                # Fallback to a standard RAG if the model doesn't choose a tool
+                return await self.search_memos(question, limit=limit, semantic_results=await speculative)
 
-        if not tool_choice_message or not tool_choice_message.tool_calls:
-            # Fallback to a standard RAG if the model doesn't choose a tool
-            retrieved_memos = self.search_memos(question, limit=settings.max_search_results)
-        else:
             # Step 2: Execute the chosen tool
             tool_call = tool_choice_message.tool_calls[0]
             function_name = tool_call.function.name
             function_args = json.loads(tool_call.function.arguments)
 
             if function_name == "get_latest_memos":
-                retrieved_memos = self.get_latest_memos(**function_args)
+                return await self.get_latest_memos(**function_args)
             elif function_name == "search_memos":
-                retrieved_memos = self.search_memos(**function_args)
+                requested_limit = function_args.get("limit", limit)
+                has_filters = any(function_args.get(key) for key in ("created_after", "created_before", "tags"))
+                if function_args.get("query") == question and requested_limit <= limit and not has_filters:
+                    # 模型沿用了原问题，直接复用投机检索的结果
+                    semantic_results = (await speculative)[:requested_limit * settings.hybrid_candidate_multiplier]
+                    return await self.search_memos(**function_args, semantic_results=semantic_results)
+                return await self.search_memos(**function_args)
             else:
                 # Fallback if the model hallucinates a function name
-                retrieved_memos = self.search_memos(question, limit=settings.max_search_results)
+                return await self.search_memos(question, limit=limit, semantic_results=await speculative)
+        finally:
+            if not speculative.done():
+                speculative.cancel()
+            elif not speculative.cancelled():
+                # 标记异常已读取，避免未使用的投机任务在失败时输出告警
+                speculative.exception()
+
+    async def answer_question(self, question: str, mode: Optional[str] = None) -> AsyncIterator[str]:
+        """回答问题。mode 为 "fast" 时跳过串行的 LLM 决策/校验调用，"accurate" 保留完整流程"""
+        mode = mode or settings.default_answer_mode
+        trace = start_trace("ask", mode=mode)
+        started = time.perf_counter()
+        first_token = True
+        error: Optional[BaseException] = None
+        try:
+            async for chunk in self._answer_question(question, mode):
+                if first_token:
+                    observe("ask.time_to_first_token", time.perf_counter() - started)
+                    first_token = False
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            observe("ask.total", time.perf_counter() - started, error=error is not None)
+            finish_trace(trace, error)
+
+    async def _answer_question(self, question: str, mode: str) -> AsyncIterator[str]:
+        question_embedding = None
+        if settings.answer_cache_enabled:
+            with span("ask.embed_question"):
+                question_embedding = await vector_store.aembed_query(question)
+            cached = answer_cache.lookup(question_embedding, mode)
+            if cached is not None:
+                print(f"Answer cache hit for '{question}' (cached question: '{cached.question}')")
+                # 按块回放缓存的回答，保持与实时生成一致的流式输出
+                chunk_size = 64
+                for start in range(0, len(cached.answer), chunk_size):
+                    yield cached.answer[start:start + chunk_size]
+                return
+
+        with span(f"ask.retrieve.{mode}"):
+            if mode == "fast":
+                retrieved_memos = await self._retrieve_fast(question, question_embedding)
+            else:
+                retrieved_memos = await self._retrieve_accurate(question, question_embedding)
+
+        answer_parts: List[str] = []
+        async for chunk in self._generate_answer(question, retrieved_memos, mode):
+            answer_parts.append(chunk)
+            yield chunk
+
+        if question_embedding is not None:
+            self._store_answer(question, question_embedding, mode, "".join(answer_parts), retrieved_memos)
+
+    def _store_answer(
+        self, question: str, question_embedding: np.ndarray, mode: str,
+        answer: str, retrieved_memos: List[Dict[str, Any]]
+    ):
+        if not answer or ANSWER_ERROR_MESSAGE in answer:
+            return
+        # 通用回答和"最新笔记"类回答会因任意笔记变更而过时
+        volatile = (
+            not retrieved_memos
+            or answer.startswith(GENERAL_ANSWER_NOTICE.strip())
+            or any(memo.get("source") == "latest" for memo in retrieved_memos)
+        )
+        answer_cache.store(
+            question, question_embedding, mode, answer,
+            memo_ids=[memo["id"] for memo in retrieved_memos],
+            volatile=volatile
+        )
+
+    async def answer_questions(
+        self, questions: List[Tuple[str, str]], mode: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """批量回答问题，按完成顺序逐条返回 {"id", "question", "answer", ...}
+
+        所有问题的向量通过一次 Embedding 请求获取，语义检索合并为一次 ChromaDB 查询，
+        之后各问题的检索与生成在 batch_ask_concurrency 限制下并发执行。
+        """
+        mode = mode or settings.default_answer_mode
+        trace = start_trace("ask_batch", mode=mode, questions=len(questions))
+        started = time.perf_counter()
+        try:
+            with span("ask_batch.embed_questions"):
+                embeddings = await vector_store.aembed_queries([question for _, question in questions])
+
+            pending: List[int] = []
+            for index, (question_id, question) in enumerate(questions):
+                cached = answer_cache.lookup(embeddings[index:index + 1], mode) if settings.answer_cache_enabled else None
+                if cached is None:
+                    pending.append(index)
+                else:
+                    yield {"id": question_id, "question": question, "answer": cached.answer, "cached": True}
+
+            with span("ask_batch.vector_query"):
+                semantic_batches = await vector_store.asearch_many(
+                    embeddings[pending], k=settings.max_search_results * settings.hybrid_candidate_multiplier
+                ) if pending else []
+
+            semaphore = asyncio.Semaphore(max(1, settings.batch_ask_concurrency))
+
+            async def answer_one(index: int, semantic_results: List[Tuple[str, str, float]]) -> Dict[str, Any]:
+                question_id, question = questions[index]
+                question_embedding = embeddings[index:index + 1]
+                async with semaphore:
+                    try:
+                        if mode == "fast":
+                            retrieved_memos = await self._retrieve_fast(question, question_embedding, semantic_results)
+                        else:
+                            retrieved_memos = await self._retrieve_accurate(question, question_embedding, semantic_results)
+                        answer = "".join([chunk async for chunk in self._generate_answer(question, retrieved_memos, mode)])
+                    except Exception as e:
+                        print(f"Batch question '{question_id}' failed: {e}")
+                        return {"id": question_id, "question": question, "error": str(e)}
+                if settings.answer_cache_enabled:
+                    self._store_answer(question, question_embedding, mode, answer, retrieved_memos)
+                return {
+                    "id": question_id,
+                    "question": question,
+                    "answer": answer,
+                    "memo_ids": [memo["id"] for memo in retrieved_memos],
+                    "cached": False,
+                }
+
+            tasks = [asyncio.create_task(answer_one(index, semantic_results))
+                     for index, semantic_results in zip(pending, semantic_batches)]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield await finished
+            finally:
+                for task in tasks:
+                    task.cancel()
+        finally:
+            observe("ask_batch.total", time.perf_counter() - started)
+            finish_trace(trace)
+
+    async def _generate_answer(
+        self, question: str, retrieved_memos: List[Dict[str, Any]], mode: str
+    ) -> AsyncIterator[str]:
+        # 逐条过滤敏感笔记（例如直接读取数据库的最新笔记），再组装上下文
+        retrieved_memos = sensitive_filter.filter(retrieved_memos, lambda memo: memo["content"], "已从上下文中")
 
         # Step 3: Generate the final answer based on the tool's output
         if not retrieved_memos:
             # If no memos are found, use the LLM's general knowledge
-            def llm_fallback_response():
-                yield "（注意：以下内容为AI生成的通用回答，不代表个人笔记。）\n\n"
-                for chunk in llm_service.generate_answer_without_context(question):
-                    yield chunk
-            return llm_fallback_response()
+            yield GENERAL_ANSWER_NOTICE
+            async for chunk in llm_service.generate_answer_without_context(question):
+                yield chunk
+            return
 
-        context = "\n\n".join([
-            f"笔记 (ID: {memo['id']}, Created: {memo['created_at']}):\n{memo['content']}"
-            for memo in retrieved_memos
-        ])
+        packed = pack_context(retrieved_memos, settings.context_token_budget)
+        context = packed.text
+        print(f"Context packed: {packed.summary()}")
 
         # Add a log to print the context for debugging
         print("--- CONTEXT FOR LLM ---")
         print(context)
         print("-----------------------")
 
+        if mode == "fast":
+            # 快速模式下不单独校验相关性，交由生成阶段的提示词判断
+            async for chunk in llm_service.generate_answer_with_context(question, context, judge_relevance=True):
+                yield chunk
+            return
+
         # Step 4: Validate context relevance before generating the final answer
-        is_relevant = llm_service.validate_context_relevance(question, context)
+        is_relevant = await llm_service.validate_context_relevance(question, context)
         if not is_relevant:
             # If context is not relevant, use the LLM's general knowledge
-            def llm_fallback_response():
-                yield "（注意：以下内容为AI生成的通用回答，不代表个人笔记。）\n\n"
-                for chunk in llm_service.generate_answer_without_context(question):
-                    yield chunk
-            return llm_fallback_response()
+            yield GENERAL_ANSWER_NOTICE
+            async for chunk in llm_service.generate_answer_without_context(question):
+                yield chunk
+            return
 
-        return llm_service.generate_answer_with_context(question, context)
+        async for chunk in llm_service.generate_answer_with_context(question, context):
+            yield chunk
 
 memos_service = MemosService()
\ No newline at end of file
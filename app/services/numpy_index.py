@@ -0,0 +1,635 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_compression import dequantize, quantize
+from app.services.vector_backends import VectorBackend, VectorCollection
+
+_NUMPY_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+_MAX_BATCH_SIZE = 4096
+# 暴力检索时每次解码的行数，限制临时内存占用
+_SCAN_ROWS = 16384
+# 已删除的行超过总行数的比例（且不少于下限）时自动整理
+_COMPACT_DEAD_RATIO = 0.3
+_COMPACT_MIN_DEAD = 1024
+_HNSW_M = 16
+_HNSW_EF_CONSTRUCTION = 200
+# HNSW 图新增的节点超过该比例时写回磁盘，重启后只需补齐之后新增的行
+_HNSW_SAVE_RATIO = 0.1
+_MISSING = object()
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value > operand,
+    "$gte": lambda value, operand: value >= operand,
+    "$lt": lambda value, operand: value < operand,
+    "$lte": lambda value, operand: value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def _field_predicate(key: str, op: str, operand: Any) -> Callable[[Optional[dict]], bool]:
+    compare = _COMPARATORS.get(op)
+    if compare is None:
+        raise ValueError(f"unsupported where operator: {op}")
+    if op in ("$in", "$nin"):
+        operand = set(operand)
+
+    def predicate(metadata: Optional[dict]) -> bool:
+        value = metadata.get(key, _MISSING) if metadata else _MISSING
+        if value is _MISSING:
+            return False
+        try:
+            return compare(value, operand)
+        except TypeError:
+            return False
+    return predicate
+
+
+def compile_where(where: Optional[dict]) -> Callable[[Optional[dict]], bool]:
+    """把 ChromaDB 风格的 where 条件编译为 metadata 判断函数，扫描大量记录时避免逐条解析条件"""
+    if not where:
+        return lambda metadata: True
+    predicates: List[Callable[[Optional[dict]], bool]] = []
+    for key, condition in where.items():
+        if key == "$and":
+            parts = [compile_where(part) for part in condition]
+            predicates.append(lambda metadata, parts=parts: all(part(metadata) for part in parts))
+        elif key == "$or":
+            parts = [compile_where(part) for part in condition]
+            predicates.append(lambda metadata, parts=parts: any(part(metadata) for part in parts))
+        elif isinstance(condition, dict):
+            predicates.extend(_field_predicate(key, op, operand) for op, operand in condition.items())
+        else:
+            predicates.append(_field_predicate(key, "$eq", condition))
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda metadata: all(predicate(metadata) for predicate in predicates)
+
+
+def _import_hnswlib():
+    try:
+        import hnswlib
+        return hnswlib
+    except ImportError:
+        return None
+
+
+def _write_at(path: str, offset: int, array: np.ndarray):
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.seek(offset)
+        np.ascontiguousarray(array).tofile(f)
+
+
+def _squared_norms(vectors: np.ndarray) -> np.ndarray:
+    return np.einsum("ij,ij->i", vectors, vectors).astype(np.float32)
+
+
+class _Snapshot:
+    """一次读取所用的索引状态；写入会替换数组而不是原地修改，读取无需持有锁"""
+    __slots__ = ("ids", "metadatas", "live", "codes", "scales", "sq_norms", "dtype")
+
+    def __init__(self, collection: "NumpyCollection"):
+        self.ids = collection._ids
+        self.metadatas = collection._metadatas
+        self.live = collection._live
+        self.codes = collection._codes
+        self.scales = collection._scales
+        self.sq_norms = collection._sq_norms
+        self.dtype = collection._dtype
+
+
+class NumpyCollection(VectorCollection):
+    """基于 NumPy 内存映射矩阵的向量集合
+
+    向量按行追加到 vectors.<generation>.bin（int8 格式另有 scales.<generation>.bin），
+    以 np.memmap 只读映射；ID、原文和 metadata 存放在同目录的 SQLite 中，行号即矩阵下标。
+    更新写入新行并把旧行标记为删除，删除只打标记；已删除的行较多时整理 (compact)
+    为新一代文件，并在同一个 SQLite 事务中切换代数。
+
+    检索对候选行做向量化的暴力计算；存活向量数达到 vector_hnsw_threshold 且安装了 hnswlib 时
+    改用 HNSW 图（图中保存一份 float32 副本）。过滤后候选较少时仍走暴力检索，结果精确。
+    距离为平方 L2，与 ChromaDB 默认的 l2 空间一致。
+    """
+
+    def __init__(self, path: str, name: str, metadata: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        # 手动管理事务：写入以 BEGIN IMMEDIATE 开始，多个进程（服务与同步脚本）的写入互斥
+        self._conn = sqlite3.connect(
+            os.path.join(path, "index.sqlite3"), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                document TEXT,
+                metadata TEXT,
+                live INTEGER NOT NULL DEFAULT 1
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS rows_live_id ON rows (id) WHERE live = 1")
+        if metadata is not None:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO info (key, value) VALUES ('metadata', ?)", (json.dumps(metadata),)
+            )
+        self._hnsw = None
+        self._hnsw_saved = 0
+        self._hnsw_missing_reported = False
+        self._load()
+
+    # ---- 状态加载 ----
+
+    def _load(self):
+        """从 SQLite 和向量文件重新加载全部状态"""
+        # 重新加载前保存现有的 HNSW 图，之后只需补齐新增的行
+        self._save_hnsw()
+        info = dict(self._conn.execute("SELECT key, value FROM info").fetchall())
+        self._metadata = json.loads(info["metadata"]) if "metadata" in info else None
+        self._dim = int(info.get("dim", 0))
+        self._dtype = info.get("dtype", settings.embedding_storage_dtype)
+        self._generation = int(info.get("generation", 0))
+
+        rows = self._conn.execute("SELECT row, id, metadata, live FROM rows ORDER BY row").fetchall()
+        self._ids = [record_id for _, record_id, _, _ in rows]
+        # 已删除行的 metadata 不再需要，不占用内存
+        self._metadatas = [json.loads(metadata) if live and metadata else None for _, _, metadata, live in rows]
+        self._live = np.array([bool(live) for _, _, _, live in rows], dtype=bool)
+        self._id_rows = {record_id: row for row, record_id, _, live in rows if live}
+        self._open_vectors(len(rows))
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        if self._codes is not None:
+            self._sq_norms = np.concatenate([
+                _squared_norms(self._decode(np.arange(start, min(start + _SCAN_ROWS, len(rows)))))
+                for start in range(0, len(rows), _SCAN_ROWS)
+            ])
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._remove_stale_files()
+        self._hnsw = None
+        self._ensure_hnsw()
+
+    def _refresh(self):
+        """其他进程（如手动同步脚本）提交了写入时重新加载"""
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._load()
+
+    def _file(self, kind: str, generation: Optional[int] = None) -> str:
+        return os.path.join(self.path, f"{kind}.{self._generation if generation is None else generation}.bin")
+
+    def _open_vectors(self, rows: int):
+        if rows == 0 or self._dim == 0:
+            self._codes = self._scales = None
+            return
+        self._codes = np.memmap(self._file("vectors"), dtype=_NUMPY_DTYPES[self._dtype], mode="r",
+                                shape=(rows, self._dim))
+        self._scales = None
+        if self._dtype == "int8":
+            self._scales = np.memmap(self._file("scales"), dtype=np.float32, mode="r", shape=(rows,))
+
+    def _remove_stale_files(self):
+        """删除整理前的旧一代文件；其他进程仍映射着的文件在其关闭后才会真正释放"""
+        for filename in os.listdir(self.path):
+            parts = filename.split(".")
+            if len(parts) == 3 and parts[2] == "bin" and parts[1] != str(self._generation):
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except OSError:
+                    pass
+
+    def _decode(self, rows: np.ndarray, snapshot: Optional[_Snapshot] = None) -> np.ndarray:
+        snapshot = snapshot or _Snapshot(self)
+        # 连续的行直接切片，float32 时不产生拷贝
+        if len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            selector = slice(int(rows[0]), int(rows[-1]) + 1)
+        else:
+            selector = rows
+        scales = None if snapshot.scales is None else snapshot.scales[selector]
+        return dequantize(snapshot.codes[selector], scales, snapshot.dtype)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                # 内存中的状态可能已部分更新，按数据库重新加载
+                self._load()
+                raise
+            # 自身提交不会改变 data_version，这里记录以免下次误判为其他进程的写入
+            self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # ---- HNSW ----
+
+    def _live_count(self) -> int:
+        return int(np.count_nonzero(self._live))
+
+    def _ensure_hnsw(self):
+        """存活向量数达到阈值时建立（或从磁盘加载）HNSW 图，并补齐尚未加入的行"""
+        if self._hnsw is None:
+            threshold = settings.vector_hnsw_threshold
+            if threshold <= 0 or self._live_count() < threshold:
+                return
+            hnswlib = _import_hnswlib()
+            if hnswlib is None:
+                if not self._hnsw_missing_reported:
+                    print(f"向量集合 {self.name} 已有 {self._live_count()} 条记录，"
+                          f"安装 hnswlib 后可改用 HNSW 检索: pip install hnswlib")
+                    self._hnsw_missing_reported = True
+                return
+            self._hnsw = self._open_hnsw(hnswlib)
+
+        total = len(self._ids)
+        start = self._hnsw.get_current_count()
+        if start < total:
+            if total > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(max(total, self._hnsw.get_max_elements() * 2))
+            # 标签即行号：按顺序加入全部行（包括已删除的），再标记删除
+            for offset in range(start, total, _SCAN_ROWS):
+                rows = np.arange(offset, min(offset + _SCAN_ROWS, total))
+                self._hnsw.add_items(self._decode(rows), rows)
+            self._mark_hnsw_deleted(np.flatnonzero(~self._live[start:]) + start)
+            if total - self._hnsw_saved > max(_COMPACT_MIN_DEAD, self._hnsw_saved * _HNSW_SAVE_RATIO):
+                self._save_hnsw()
+
+    def _open_hnsw(self, hnswlib):
+        total = len(self._ids)
+        index = hnswlib.Index(space="l2", dim=self._dim)
+        path = self._file("hnsw")
+        if os.path.exists(path):
+            try:
+                index.load_index(path, max_elements=max(total, 1024))
+                if index.get_current_count() <= total:
+                    self._hnsw_saved = index.get_current_count()
+                    # 保存之后删除的行需要重新标记
+                    self._mark_hnsw_deleted(np.flatnonzero(~self._live[:self._hnsw_saved]), index)
+                    return index
+            except RuntimeError as e:
+                print(f"HNSW 索引文件无法加载，重新构建: {e}")
+            index = hnswlib.Index(space="l2", dim=self._dim)
+        print(f"正在为向量集合 {self.name} 构建 HNSW 索引 ({self._live_count()} 条记录)...")
+        index.init_index(max_elements=max(total * 2, 1024), ef_construction=_HNSW_EF_CONSTRUCTION, M=_HNSW_M)
+        self._hnsw_saved = 0
+        return index
+
+    def _mark_hnsw_deleted(self, rows: np.ndarray, index=None):
+        index = self._hnsw if index is None else index
+        for row in rows:
+            try:
+                index.mark_deleted(int(row))
+            except RuntimeError:
+                # 已经标记过
+                pass
+
+    def _save_hnsw(self):
+        if self._hnsw is None or self._hnsw.get_current_count() == self._hnsw_saved:
+            return
+        tmp_path = self._file("hnsw") + ".tmp"
+        self._hnsw.save_index(tmp_path)
+        os.replace(tmp_path, self._file("hnsw"))
+        self._hnsw_saved = self._hnsw.get_current_count()
+
+    # ---- 写入 ----
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError(f"expected {len(ids)} embeddings, got array of shape {vectors.shape}")
+        if len(set(ids)) != len(ids):
+            raise ValueError("duplicate ids in a single upsert")
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+
+        with self._lock:
+            with self._transaction():
+                if self._dim == 0:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                        [("dim", str(vectors.shape[1])), ("dtype", settings.embedding_storage_dtype)]
+                    )
+                    self._dim, self._dtype = vectors.shape[1], settings.embedding_storage_dtype
+                elif vectors.shape[1] != self._dim:
+                    raise ValueError(f"embedding dimension {vectors.shape[1]} does not match "
+                                     f"collection dimension {self._dim}")
+                start = len(self._ids)
+                codes, scales = quantize(vectors, self._dtype)
+                # 先追加向量再提交行记录：中途失败时多出的字节不会被引用，下次写入直接覆盖
+                _write_at(self._file("vectors"), start * codes.shape[1] * codes.itemsize, codes)
+                if self._dtype == "int8":
+                    _write_at(self._file("scales"), start * 4, scales)
+                replaced = [self._id_rows[record_id] for record_id in ids if record_id in self._id_rows]
+                self._mark_rows_deleted(replaced)
+                self._conn.executemany(
+                    "INSERT INTO rows (row, id, document, metadata, live) VALUES (?, ?, ?, ?, 1)",
+                    [
+                        (start + i, record_id, document, json.dumps(metadata) if metadata is not None else None)
+                        for i, (record_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+                    ]
+                )
+
+            self._ids = self._ids + list(ids)
+            self._metadatas = self._metadatas + list(metadatas)
+            live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            live[replaced] = False
+            for row in replaced:
+                self._metadatas[row] = None
+            self._live = live
+            self._id_rows.update((record_id, start + i) for i, record_id in enumerate(ids))
+            self._sq_norms = np.concatenate([self._sq_norms, _squared_norms(dequantize(codes, scales, self._dtype))])
+            self._open_vectors(len(self._ids))
+            if self._hnsw is not None:
+                self._mark_hnsw_deleted(np.asarray(replaced, dtype=np.int64))
+            self._ensure_hnsw()
+        self._maybe_compact()
+
+    def _mark_rows_deleted(self, rows: List[int]):
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500]
+            self._conn.execute(
+                f"UPDATE rows SET live = 0, document = NULL WHERE row IN ({','.join('?' * len(chunk))})", chunk
+            )
+
+    def delete(self, ids=None, where=None):
+        if ids is None and where is None:
+            raise ValueError("delete requires ids or where")
+        with self._lock:
+            with self._transaction():
+                rows = self._select_rows(ids, where)
+                self._mark_rows_deleted(rows)
+            if not rows:
+                return
+            live = self._live.copy()
+            live[rows] = False
+            self._live = live
+            for row in rows:
+                self._id_rows.pop(self._ids[row], None)
+                self._metadatas[row] = None
+            if self._hnsw is not None:
+                self._mark_hnsw_deleted(np.asarray(rows, dtype=np.int64))
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        dead = len(self._live) - self._live_count()
+        if dead >= _COMPACT_MIN_DEAD and dead > len(self._live) * _COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def compact(self) -> Dict[str, int]:
+        """把存活的行重写为新一代文件并重新编号，回收已删除行的空间
+
+        存储格式与 embedding_storage_dtype 不一致时顺带转换。
+        """
+        dtype = settings.embedding_storage_dtype
+        with self._lock:
+            with self._transaction():
+                live_rows = np.flatnonzero(self._live)
+                reclaimed = len(self._live) - len(live_rows)
+                if reclaimed == 0 and dtype == self._dtype:
+                    return {"reclaimed": 0}
+                generation = self._generation + 1
+                for offset in range(0, len(live_rows), _SCAN_ROWS):
+                    rows = live_rows[offset:offset + _SCAN_ROWS]
+                    if dtype == self._dtype:
+                        codes = np.asarray(self._codes[rows])
+                        scales = None if self._scales is None else np.asarray(self._scales[rows])
+                    else:
+                        codes, scales = quantize(self._decode(rows), dtype)
+                    _write_at(self._file("vectors", generation), offset * self._dim * codes.itemsize, codes)
+                    if dtype == "int8":
+                        _write_at(self._file("scales", generation), offset * 4, scales)
+                records = self._conn.execute(
+                    "SELECT id, document, metadata FROM rows WHERE live = 1 ORDER BY row"
+                ).fetchall()
+                self._conn.execute("DELETE FROM rows")
+                self._conn.executemany(
+                    "INSERT INTO rows (row, id, document, metadata, live) VALUES (?, ?, ?, ?, 1)",
+                    [(row, *record) for row, record in enumerate(records)]
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                    [("generation", str(generation)), ("dtype", dtype)]
+                )
+            self._load()
+        print(f"向量集合 {self.name} 整理完成，回收 {reclaimed} 行")
+        return {"reclaimed": reclaimed}
+
+    # ---- 读取 ----
+
+    def _snapshot(self) -> _Snapshot:
+        with self._lock:
+            self._refresh()
+            return _Snapshot(self)
+
+    def _select_rows(self, ids: Optional[List[str]], where: Optional[dict]) -> List[int]:
+        if ids is not None:
+            rows = list(dict.fromkeys(self._id_rows[record_id] for record_id in ids if record_id in self._id_rows))
+        else:
+            rows = np.flatnonzero(self._live).tolist()
+        if where:
+            predicate = compile_where(where)
+            rows = [row for row in rows if predicate(self._metadatas[row])]
+        return rows
+
+    def _documents(self, ids: List[str]) -> Dict[str, Optional[str]]:
+        """按 ID 读取原文；按 ID 而非行号查询，整理重新编号后仍然正确"""
+        documents: Dict[str, Optional[str]] = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                documents.update(self._conn.execute(
+                    f"SELECT id, document FROM rows WHERE live = 1 AND id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return documents
+
+    @property
+    def metadata(self):
+        return self._metadata
+
+    def count(self) -> int:
+        return int(np.count_nonzero(self._snapshot().live))
+
+    def get(self, ids=None, where=None, include=None, limit=None):
+        include = ["metadatas", "documents"] if include is None else include
+        with self._lock:
+            self._refresh()
+            snapshot = _Snapshot(self)
+            rows = self._select_rows(ids, where)
+        if limit is not None:
+            rows = rows[:limit]
+        record_ids = [snapshot.ids[row] for row in rows]
+        result: Dict[str, Any] = {"ids": record_ids, "metadatas": None, "documents": None, "embeddings": None}
+        if "metadatas" in include:
+            result["metadatas"] = [snapshot.metadatas[row] for row in rows]
+        if "documents" in include:
+            documents = self._documents(record_ids)
+            result["documents"] = [documents.get(record_id) for record_id in record_ids]
+        if "embeddings" in include:
+            if rows:
+                result["embeddings"] = self._decode(np.asarray(rows, dtype=np.int64), snapshot)
+            else:
+                result["embeddings"] = np.empty((0, self._dim), dtype=np.float32)
+        return result
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        include = ["metadatas", "documents", "distances"] if include is None else include
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+
+        snapshot = self._snapshot()
+        candidates = np.flatnonzero(snapshot.live)
+        if where:
+            predicate = compile_where(where)
+            candidates = np.array([row for row in candidates if predicate(snapshot.metadatas[row])], dtype=np.int64)
+        k = min(n_results, len(candidates))
+        if k <= 0:
+            rows = np.empty((len(queries), 0), dtype=np.int64)
+            distances = np.empty((len(queries), 0), dtype=np.float32)
+        else:
+            found = self._hnsw_query(queries, candidates, k, where is not None)
+            if found is None:
+                rows, distances = self._brute_force(queries, candidates, k, snapshot)
+            else:
+                rows, distances, snapshot = found
+
+        result: Dict[str, Any] = {
+            "ids": [[snapshot.ids[row] for row in query_rows] for query_rows in rows],
+            "distances": None, "metadatas": None, "documents": None, "embeddings": None,
+        }
+        if "distances" in include:
+            result["distances"] = [[float(distance) for distance in query_distances] for query_distances in distances]
+        if "metadatas" in include:
+            result["metadatas"] = [[snapshot.metadatas[row] for row in query_rows] for query_rows in rows]
+        if "documents" in include:
+            documents = self._documents(list({record_id for ids in result["ids"] for record_id in ids}))
+            result["documents"] = [[documents.get(record_id) for record_id in ids] for ids in result["ids"]]
+        return result
+
+    def _brute_force(self, queries: np.ndarray, candidates: np.ndarray, k: int, snapshot: _Snapshot):
+        """分块解码候选向量，计算平方 L2 距离并保留每个查询的 top-k"""
+        query_norms = _squared_norms(queries)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_distances = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(candidates), _SCAN_ROWS):
+            rows = candidates[start:start + _SCAN_ROWS]
+            vectors = self._decode(rows, snapshot)
+            distances = query_norms[:, None] + snapshot.sq_norms[rows][None, :] - 2.0 * (queries @ vectors.T)
+            best_distances = np.hstack([best_distances, distances])
+            best_rows = np.hstack([best_rows, np.broadcast_to(rows, distances.shape)])
+            if best_distances.shape[1] > k:
+                keep = np.argpartition(best_distances, k - 1, axis=1)[:, :k]
+                best_distances = np.take_along_axis(best_distances, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        order = np.argsort(best_distances, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.maximum(np.take_along_axis(best_distances, order, axis=1), 0)
+
+    def _hnsw_query(self, queries: np.ndarray, candidates: np.ndarray, k: int, filtered: bool):
+        """候选数不少于阈值时用 HNSW 检索，返回 (行号, 距离, 与之对应的状态)；返回 None 表示应改用暴力检索"""
+        if self._hnsw is None or len(candidates) < settings.vector_hnsw_threshold:
+            return None
+        with self._lock:
+            if self._hnsw is None:
+                return None
+            # 图与行记录在同一把锁下更新，这里取得的状态包含图中的全部标签
+            snapshot = _Snapshot(self)
+            allowed = None
+            if filtered:
+                allowed = np.zeros(len(snapshot.ids), dtype=bool)
+                allowed[candidates] = True
+            self._hnsw.set_ef(max(settings.vector_hnsw_ef_search, k))
+            try:
+                labels, distances = self._hnsw.knn_query(
+                    queries, k=k, filter=None if allowed is None else (lambda label: bool(allowed[label]))
+                )
+            except RuntimeError:
+                # 过滤条件过严或 ef 过小时可能凑不满 k 条，退回精确检索
+                return None
+        return labels.astype(np.int64), distances, snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot()
+        live = int(np.count_nonzero(snapshot.live))
+        return {
+            "name": self.name,
+            "count": live,
+            "deleted_rows": len(snapshot.live) - live,
+            "dim": self._dim,
+            "storage_dtype": snapshot.dtype,
+            "hnsw": self._hnsw is not None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._save_hnsw()
+            self._conn.close()
+
+
+class NumpyVectorBackend(VectorBackend):
+    """纯 NumPy 的向量存储后端，每个集合是 path 下的一个目录"""
+
+    name = "numpy"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        os.makedirs(path, exist_ok=True)
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._collection_path(name), "index.sqlite3"))
+
+    def get_or_create_collection(self, name, metadata=None):
+        with self._lock:
+            collection = self._collections.get(name)
+            # 集合目录可能已被其他进程删除（全量重建切换后会删除旧集合）
+            if collection is None or not self._exists(name):
+                collection = NumpyCollection(self._collection_path(name), name, metadata)
+                self._collections[name] = collection
+            return collection
+
+    def get_collection(self, name):
+        if not self._exists(name):
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def list_collection_names(self):
+        return [name for name in sorted(os.listdir(self.path)) if self._exists(name)]
+
+    def delete_collection(self, name):
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            if collection is not None:
+                collection.close()
+            if not self._exists(name):
+                raise ValueError(f"Collection {name} does not exist.")
+            shutil.rmtree(self._collection_path(name))
+
+    def get_max_batch_size(self):
+        return _MAX_BATCH_SIZE
+
+    def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.close()
+            self._collections.clear()
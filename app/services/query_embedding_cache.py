@@ -0,0 +1,121 @@
+import asyncio
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+import numpy as np
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _consume_exception(task: asyncio.Task):
+    # 所有等待者都已取消时没有人读取异常，这里读取以免事件循环输出 "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+def normalize_query(text: str) -> str:
+    """查询文本的缓存键：统一全角/半角 (NFKC) 并折叠空白，不改变大小写以免影响向量语义"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class QueryEmbeddingCache:
+    """查询向量的内存 LRU 缓存
+
+    以 (embedding_model, 规范化后的查询文本) 为键。相同文本的并发请求会合并
+    (single-flight)：第一个请求负责调用 Embedding API，其余请求等待同一个结果；
+    调用失败时结果不会被缓存，等待者收到同样的异常。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Tuple[asyncio.Task, int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _put(self, key: Tuple[str, str], vector: np.ndarray):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        vector.setflags(write=False)
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_compute(
+        self, model: str, texts: List[str],
+        compute: Callable[[List[str]], Awaitable[np.ndarray]]
+    ) -> np.ndarray:
+        """返回与 texts 顺序一致的向量矩阵，只对既未缓存也不在请求中的文本调用 compute"""
+        keys = [(model, normalize_query(text)) for text in texts]
+        resolved: Dict[Tuple[str, str], np.ndarray] = {}
+        # 进行中的请求：key -> (计算任务, 该 key 在任务结果中的行号)
+        waiting: Dict[Tuple[str, str], Tuple[asyncio.Task, int]] = {}
+        owned: Dict[Tuple[str, str], str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in resolved or key in waiting or key in owned:
+                    continue
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    resolved[key] = vector
+                elif key in self._inflight:
+                    self.coalesced += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    owned[key] = text
+            if owned:
+                # 计算放在独立任务中，发起者被取消（如客户端断开）时不会连带取消其他等待者
+                task = asyncio.ensure_future(self._compute(list(owned), list(owned.values()), compute))
+                task.add_done_callback(_consume_exception)
+                for index, key in enumerate(owned):
+                    self._inflight[key] = waiting[key] = (task, index)
+
+        for key, (task, index) in waiting.items():
+            resolved[key] = (await asyncio.shield(task))[index]
+        return np.vstack([resolved[key] for key in keys])
+
+    async def _compute(
+        self, keys: List[Tuple[str, str]], texts: List[str],
+        compute: Callable[[List[str]], Awaitable[np.ndarray]]
+    ) -> np.ndarray:
+        task = asyncio.current_task()
+        try:
+            vectors = await compute(texts)
+            for key, vector in zip(keys, vectors):
+                self._put(key, vector)
+            return vectors
+        finally:
+            # 失败的结果不缓存，之后的请求会重新调用
+            with self._lock:
+                for key in keys:
+                    if self._inflight.get(key, (None,))[0] is task:
+                        del self._inflight[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            size = len(self._entries)
+            inflight = len(self._inflight)
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "inflight": inflight,
+            # 合并到进行中请求的查询同样省掉了一次 Embedding 调用
+            "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+        }
@@ -0,0 +1,47 @@
+import re
+from typing import Any, Dict, Optional
+
+_CHINESE_NUMERALS = {"一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9, "十": 10}
+
+# "最近的 3 条笔记"、"最新笔记"、"latest 5 memos" 等明显在询问最新笔记的问法
+_LATEST_PATTERNS = [
+    re.compile(r"(最近|最新|最后|近期)[的]?\s*(?P<count>\d+|[一两二三四五六七八九十])?\s*(条|篇|个)?\s*(笔记|memo|记录|备忘)", re.IGNORECASE),
+    re.compile(r"(latest|recent|last|newest)\s+(?P<count>\d+)?\s*(memos?|notes?)", re.IGNORECASE),
+]
+# 去掉上面的短语后只剩这些客套词、疑问词和标点时，才视为单纯在问最新笔记；
+# 其余内容（如 "最近的笔记中提到K3S证书了吗"）说明问题带有主题，交给语义检索
+_FILLER_PHRASES = ["请", "帮我", "给我", "看看", "看一下", "列出", "列一下", "显示", "查看", "查一下", "找出",
+                   "我的", "我", "都有", "有哪些", "哪些", "是什么", "什么", "都", "有", "是", "了", "吗", "呢", "吧", "一下"]
+_FILLER_WORDS = {"please", "show", "list", "give", "get", "what", "are", "were", "is", "me", "my", "the", "all", "of"}
+# 中文短语按长度从长到短做一次替换（线性时间），剩余部分按词与英文词表比对
+_FILLER_PHRASE = re.compile("|".join(sorted(map(re.escape, _FILLER_PHRASES), key=len, reverse=True)))
+_WORD = re.compile(r"[^\W_]+")
+# 只检查较短的问题：单纯询问最新笔记的问题不会很长，也避免对超长输入做正则匹配
+_MAX_QUESTION_LENGTH = 100
+
+
+def _only_filler(text: str) -> bool:
+    return all(word.lower() in _FILLER_WORDS for word in _WORD.findall(_FILLER_PHRASE.sub(" ", text)))
+
+
+def _parse_count(raw: Optional[str], default: int) -> int:
+    if not raw:
+        return default
+    if raw.isdigit():
+        return max(1, int(raw))
+    return _CHINESE_NUMERALS.get(raw, default)
+
+
+def route_question(question: str, default_limit: int = 5) -> Optional[Dict[str, Any]]:
+    """基于规则的本地路由，命中明显意图时直接返回工具调用，无需请求 LLM
+
+    返回 {"name": 工具名, "arguments": 参数}；无法判断时返回 None，由调用方走语义检索
+    """
+    if len(question) > _MAX_QUESTION_LENGTH:
+        return None
+    for pattern in _LATEST_PATTERNS:
+        match = pattern.search(question)
+        if match and _only_filler(question[:match.start()] + " " + question[match.end():]):
+            limit = _parse_count(match.group("count"), default_limit)
+            return {"name": "get_latest_memos", "arguments": {"limit": limit}}
+    return None
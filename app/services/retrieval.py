@@ -0,0 +1,13 @@
+from typing import Dict, Hashable, List
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[Hashable]], k: int = 60) -> Dict[Hashable, float]:
+    """倒数排名融合 (RRF)：score(d) = Σ 1 / (k + rank_i(d))，rank 从 1 开始
+
+    只依赖各路检索结果的相对顺序，不需要把向量距离与 BM25 分数归一化到同一尺度。
+    """
+    fused: Dict[Hashable, float] = {}
+    for ranked_ids in rankings.values():
+        for rank, doc_id in enumerate(ranked_ids, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return fused
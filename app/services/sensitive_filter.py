@@ -0,0 +1,78 @@
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+def _split_rules(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class SensitiveFilter:
+    """敏感内容过滤器，同步、Webhook 和问答阶段共用同一套规则
+
+    关键词与标签在初始化时编译为一个合并的正则，每条笔记只扫描一次，
+    不再为每个标签、每条笔记重新构建正则或整体转换大小写。
+    """
+
+    def __init__(self, keywords: List[str], tags: List[str]):
+        self.keywords = keywords
+        self.tags = tags
+        # 关键词按子串匹配；标签要求后面不是单词字符，避免 "#密码" 命中 "#密码学"
+        alternatives = [re.escape(keyword) for keyword in sorted(keywords, key=len, reverse=True)]
+        alternatives += [re.escape(tag) + r"(?!\w)" for tag in sorted(tags, key=len, reverse=True)]
+        self._pattern: Optional[re.Pattern] = (
+            re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+        )
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.filtered = 0
+        self.rule_hits: Counter = Counter()
+
+    def match(self, content: str) -> Optional[str]:
+        """返回命中的规则（小写），未命中返回 None"""
+        if self._pattern is None or not content:
+            return None
+        found = self._pattern.search(content)
+        return found.group(0).lower() if found else None
+
+    def is_sensitive(self, content: str) -> bool:
+        hit = self.match(content)
+        self._record(1, [hit] if hit else [])
+        return hit is not None
+
+    def filter(self, records: Iterable[T], get_content: Callable[[T], str], source: str = "") -> List[T]:
+        """逐条检查结构化记录，返回不含敏感内容的记录"""
+        kept: List[T] = []
+        hits: List[str] = []
+        for record in records:
+            hit = self.match(get_content(record))
+            if hit is None:
+                kept.append(record)
+            else:
+                hits.append(hit)
+        self._record(len(kept) + len(hits), hits)
+        if hits:
+            print(f"{source}已过滤 {len(hits)} 条包含敏感信息的笔记")
+        return kept
+
+    def _record(self, checked: int, hits: List[str]):
+        with self._lock:
+            self.checked += checked
+            self.filtered += len(hits)
+            self.rule_hits.update(hits)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "filtered": self.filtered,
+                "rule_hits": dict(self.rule_hits),
+            }
+
+
+sensitive_filter = SensitiveFilter(_split_rules(settings.sensitive_keywords), _split_rules(settings.sensitive_tags))
@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class SyncManifest:
+    """记录已索引笔记的 (memo_id, updated_ts, content_hash)，供增量同步判断哪些笔记需要重新向量化
+
+    同时保存 Memos 数据库的行数与最大 ID，用于低成本地发现被物理删除的笔记。
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest (
+                memo_id TEXT PRIMARY KEY,
+                updated_ts INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            )
+        """)
+        # 全量重建期间的清单先写入暂存表，切换集合时再整体替换 manifest
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS manifest_staging (
+                memo_id TEXT PRIMARY KEY,
+                updated_ts INTEGER NOT NULL,
+                content_hash TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, memo_ids: List[str]) -> Dict[str, Tuple[int, str]]:
+        found: Dict[str, Tuple[int, str]] = {}
+        with self._lock:
+            for start in range(0, len(memo_ids), 500):
+                chunk = memo_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT memo_id, updated_ts, content_hash FROM manifest WHERE memo_id IN ({placeholders})",
+                    chunk
+                ).fetchall()
+                for memo_id, updated_ts, content_hash in rows:
+                    found[memo_id] = (updated_ts, content_hash)
+        return found
+
+    def upsert_many(self, rows: Iterable[Tuple[str, int, str]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO manifest (memo_id, updated_ts, content_hash) VALUES (?, ?, ?)",
+                list(rows)
+            )
+            self._conn.commit()
+
+    def delete_many(self, memo_ids: List[str]):
+        if not memo_ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM manifest WHERE memo_id = ?", [(memo_id,) for memo_id in memo_ids])
+            self._conn.commit()
+
+    def all_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT memo_id FROM manifest")]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM manifest").fetchone()[0]
+
+    def stage_many(self, rows: Iterable[Tuple[str, int, str]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO manifest_staging (memo_id, updated_ts, content_hash) VALUES (?, ?, ?)",
+                list(rows)
+            )
+            self._conn.commit()
+
+    def reset_staging(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest_staging")
+            self._conn.commit()
+
+    def promote_staging(self):
+        """用暂存表整体替换清单（单个事务内完成）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM manifest")
+            self._conn.execute("INSERT INTO manifest SELECT memo_id, updated_ts, content_hash FROM manifest_staging")
+            self._conn.execute("DELETE FROM manifest_staging")
+            self._conn.commit()
+
+    def get_meta(self, key: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else None
+
+    def set_meta(self, values: Dict[str, int]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(key, str(value)) for key, value in values.items()]
+            )
+            self._conn.commit()
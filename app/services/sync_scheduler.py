@@ -0,0 +1,109 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.concurrency import run_blocking
+from app.core.metrics import finish_trace, observe, start_trace
+from app.services.sync_service import SyncInProgressError
+
+
+class SyncScheduler:
+    """应用内的周期同步调度器
+
+    服务启动后在后台执行首次同步（无同步状态时为全量，否则为增量），
+    之后每隔 sync_interval_hours（带随机抖动）执行一次增量同步。
+    同一时间只会有一个同步任务在运行，也可以通过管理接口手动触发。
+    """
+
+    def __init__(self, sync_factory: Callable[[], Any]):
+        self._sync_factory = sync_factory
+        self._sync = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._manual_task: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.next_run_at: Optional[float] = None
+        self.runs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._task, self._manual_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = None
+        self._manual_task = None
+
+    def _next_delay(self) -> float:
+        interval = settings.sync_interval_hours * 3600
+        jitter = interval * settings.sync_jitter_ratio
+        return max(60.0, interval + random.uniform(-jitter, jitter))
+
+    async def run_once(self, full: bool = False) -> Dict[str, Any]:
+        """执行一次同步；已有同步在运行时等待其结束后再执行"""
+        async with self._lock:
+            started_at = time.time()
+            record: Dict[str, Any] = {"mode": "full" if full else "incremental", "started_at": started_at}
+            trace = start_trace("sync", mode=record["mode"])
+            try:
+                if self._sync is None:
+                    self._sync = await run_blocking(self._sync_factory)
+                job = self._sync.full_sync if full else self._sync.sync_memos
+                result = await run_blocking(job)
+                record.update(result or {})
+                record["status"] = "success"
+            except SyncInProgressError as e:
+                # 手动执行的同步脚本持有跨进程锁，本次跳过，等待下一个周期
+                print(f"跳过本次同步: {e}")
+                record["status"] = "skipped"
+                record["error"] = str(e)
+            except Exception as e:
+                print(f"定时同步失败: {e}")
+                record["status"] = "error"
+                record["error"] = str(e)
+            record["finished_at"] = time.time()
+            record["duration_seconds"] = record["finished_at"] - started_at
+            observe(f"sync.{record['mode']}", record["duration_seconds"], error=record["status"] == "error")
+            finish_trace(trace)
+            self.last_run = record
+            self.runs += 1
+            return record
+
+    def trigger(self, full: bool = False) -> bool:
+        """手动触发一次同步；已有同步在运行时返回 False"""
+        if self.running or (self._manual_task is not None and not self._manual_task.done()):
+            return False
+        self._manual_task = asyncio.create_task(self.run_once(full=full))
+        return True
+
+    async def _run(self):
+        if settings.sync_on_startup:
+            state_file = os.path.join(settings.vector_db_path, "sync_state.txt")
+            await self.run_once(full=not os.path.exists(state_file))
+        while True:
+            delay = self._next_delay()
+            self.next_run_at = time.time() + delay
+            await asyncio.sleep(delay)
+            await self.run_once(full=False)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "runs": self.runs,
+            "last_run": self.last_run,
+            "next_run_at": self.next_run_at,
+            "interval_hours": settings.sync_interval_hours,
+        }
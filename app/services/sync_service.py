@@ -0,0 +1,367 @@
+import functools
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为不加跨进程锁
+    fcntl = None
+
+from app.core.config import settings
+from app.core.metrics import span
+from app.services.vector_store import vector_store
+from app.services.keyword_index import keyword_index
+from app.services.memos_db import memos_db
+from app.services.embedding_cache import content_hash
+from app.services.sync_manifest import SyncManifest
+from app.services.sensitive_filter import sensitive_filter
+from app.services.memo_metadata import build_metadata
+
+# 向量索引的格式版本，变化时下一次同步会自动执行全量重建
+# 2: 分块 metadata 中增加 created_ts / updated_ts / visibility / 标签
+# 3: metadata 中增加 uid，Webhook 的资源名统一换算为数据库 ID
+INDEX_VERSION = 3
+
+_SYNC_LOCK_FILE = "sync.lock"
+_lock_state = threading.local()
+
+
+class SyncInProgressError(RuntimeError):
+    """另一个进程（服务内的定时同步或手动执行的脚本）正在同步"""
+
+
+@contextmanager
+def sync_lock():
+    """跨进程的同步互斥锁（vector_db_path 下的 sync.lock）
+
+    服务和 scripts/sync.py 是两个进程，同时运行会互相删除影子集合、共用同一份进度和暂存清单。
+    锁已被占用时立即抛出 SyncInProgressError，不排队等待。
+    """
+    os.makedirs(settings.vector_db_path, exist_ok=True)
+    with open(os.path.join(settings.vector_db_path, _SYNC_LOCK_FILE), "a") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise SyncInProgressError("另一个同步任务正在运行，请稍后再试") from None
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def exclusive_sync(func):
+    """在 sync_lock 内执行；同一线程内嵌套调用（增量同步转为全量同步）不重复加锁"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_lock_state, "held", False):
+            return func(*args, **kwargs)
+        with sync_lock():
+            _lock_state.held = True
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _lock_state.held = False
+    return wrapper
+
+
+# --- 辅助函数 ---
+def filter_sensitive_memos(memos: list) -> list:
+    """过滤掉包含敏感信息的笔记"""
+    return sensitive_filter.filter(memos, lambda memo: memo.content)
+
+
+def keyword_records(memos: list) -> list:
+    """将笔记转换为关键词索引记录"""
+    return [
+        (str(memo.id), memo.content, memo.created_ts, memo.updated_ts, memo.row_status, memo.visibility)
+        for memo in memos
+    ]
+
+
+
+def manifest_rows(memos: list) -> list:
+    """将笔记转换为同步清单记录"""
+    return [(str(memo.id), memo.updated_ts, content_hash(memo.content)) for memo in memos]
+
+
+def vector_metadatas(memos: list) -> list:
+    """将笔记转换为随向量存储的 metadata（时间、标签、可见性）"""
+    return [build_metadata(memo.content, memo.created_ts, memo.updated_ts, memo.visibility, memo.uid)
+            for memo in memos]
+
+
+# --- 同步逻辑 ---
+class MemosSync:
+    def __init__(self):
+        self.db = memos_db
+        
+        # 检查数据库文件是否存在
+        if not self.db.exists():
+            raise FileNotFoundError(f"数据库文件不存在于 '{self.db.path}'")
+        
+        self.sync_state_file = os.path.join(settings.vector_db_path, "sync_state.txt")
+        # sync_state.txt 保存已同步数据的 updated_ts 高水位
+        self.last_sync_time = self.load_last_sync_time()
+        self.manifest = SyncManifest(os.path.join(settings.vector_db_path, "sync_manifest.sqlite3"))
+        self.checkpoint_file = os.path.join(settings.vector_db_path, "full_sync_checkpoint.json")
+    
+    def load_last_sync_time(self) -> int:
+        if os.path.exists(self.sync_state_file):
+            with open(self.sync_state_file, 'r') as f:
+                try:
+                    return int(f.read().strip())
+                except (ValueError, TypeError):
+                    return 0
+        return 0
+    
+    def save_last_sync_time(self, timestamp: int):
+        os.makedirs(os.path.dirname(self.sync_state_file), exist_ok=True)
+        with open(self.sync_state_file, 'w') as f:
+            f.write(str(timestamp))
+    
+    def _detect_hard_deletes(self, table_stats: Dict[str, int]) -> List[str]:
+        """检测被物理删除的笔记
+
+        上次同步后数据库的行数应为：上次行数 + 新插入的行数 (id > 上次最大 id)。
+        只有实际行数少于该值时才说明有行被删除，此时才对清单中的 ID 做一次存在性比对。
+        """
+        last_count = self.manifest.get_meta("row_count")
+        last_max_id = self.manifest.get_meta("max_id")
+        if last_count is None or last_max_id is None:
+            return []
+        inserted = self.db.count_after_id(last_max_id)
+        if table_stats["row_count"] >= last_count + inserted:
+            return []
+
+        print("检测到笔记被物理删除，正在比对同步清单...")
+        manifest_ids = self.manifest.all_ids()
+        existing = {str(memo_id) for memo_id in self.db.existing_ids(
+            int(memo_id) for memo_id in manifest_ids if memo_id.isdigit()
+        )}
+        return [memo_id for memo_id in manifest_ids if memo_id.isdigit() and memo_id not in existing]
+
+    def get_changed_memos(self) -> tuple:
+        """基于 updated_ts 高水位增量读取变更，返回 (需要重新索引的笔记, 需要删除的笔记 ID, 新的高水位)
+
+        使用 >= 而不是 >，避免遗漏与上次高水位同一秒内写入的行；重复读到的行通过清单中的内容哈希去重。
+        可见性或状态变化（归档、转为公开）以及变为敏感内容的笔记都会被识别为删除。
+        """
+        rows = self.db.changed_since(self.last_sync_time)
+        table_stats = self.db.table_stats()
+        deleted_memo_ids = self._detect_hard_deletes(table_stats)
+
+        watermark = max([self.last_sync_time] + [row.updated_ts for row in rows])
+        eligible = filter_sensitive_memos([
+            row for row in rows if row.row_status == "NORMAL" and row.visibility == "PRIVATE"
+        ])
+        eligible_ids = {str(row.id) for row in eligible}
+        known = self.manifest.get_many([str(row.id) for row in rows])
+
+        changed_memos = []
+        touched = []
+        for row in eligible:
+            memo_id = str(row.id)
+            digest = content_hash(row.content)
+            previous = known.get(memo_id)
+            if previous is not None and previous[1] == digest:
+                # 内容未变（例如仅置顶），只更新清单中的时间戳
+                if previous[0] != row.updated_ts:
+                    touched.append((memo_id, row.updated_ts, digest))
+                continue
+            changed_memos.append(row)
+
+        deleted_memo_ids.extend(
+            str(row.id) for row in rows if str(row.id) not in eligible_ids and str(row.id) in known
+        )
+        if touched:
+            self.manifest.upsert_many(touched)
+        return changed_memos, list(dict.fromkeys(deleted_memo_ids)), watermark, table_stats
+
+    def bootstrap_manifest(self):
+        """升级后首次运行时，根据数据库现有内容建立同步清单（仅执行一次）"""
+        if self.manifest.count() > 0 or not self.last_sync_time:
+            return
+        print("同步清单为空，正在根据已同步的笔记建立清单...")
+        rows = filter_sensitive_memos(self.db.active_memos(updated_before=self.last_sync_time))
+        table_stats = self.db.table_stats()
+        self.manifest.upsert_many((str(row.id), row.updated_ts, content_hash(row.content)) for row in rows)
+        self.manifest.set_meta(table_stats)
+
+    def backfill_keyword_index(self):
+        """关键词索引为空但向量库已有数据时（例如刚升级），一次性补建关键词索引"""
+        if keyword_index.count() > 0 or not vector_store.get_all_ids():
+            return
+        memos = filter_sensitive_memos(self.db.active_memos())
+        print(f"关键词索引为空，正在为 {len(memos)} 条笔记补建索引...")
+        keyword_index.upsert(keyword_records(memos))
+
+    @exclusive_sync
+    def sync_memos(self) -> Dict[str, int]:
+        """执行增量同步操作，返回新增/更新与删除的笔记数量"""
+        if self.load_checkpoint():
+            # 上次全量同步未完成，先把它做完，之后的增量同步以它的高水位为起点
+            return self.full_sync()
+        if self.last_sync_time and self.manifest.get_meta("index_version") != INDEX_VERSION:
+            # 旧版本建立的索引缺少过滤所需的 metadata，重建一次（重建期间旧索引照常提供检索）
+            print("索引格式已更新，执行一次全量重建...")
+            return self.full_sync()
+        if self.last_sync_time and not vector_store.backend_matches_index():
+            print(f"向量存储后端已切换为 {vector_store.backend.name}，执行一次全量重建...")
+            return self.full_sync()
+        if self.last_sync_time and not vector_store.embedder_matches_index():
+            print(f"向量化模型或维度已切换为 {vector_store.embedding_id}，执行一次全量重建...")
+            return self.full_sync()
+
+        print(f"[{datetime.now()}] 开始增量同步笔记...")
+        
+        try:
+            self.backfill_keyword_index()
+            self.bootstrap_manifest()
+            changed_memos, deleted_memo_ids, watermark, table_stats = self.get_changed_memos()
+            
+            if not changed_memos and not deleted_memo_ids:
+                self.manifest.set_meta(table_stats)
+                print("没有需要同步的变更")
+                return {"upserted": 0, "deleted": 0}
+            
+            if deleted_memo_ids:
+                print(f"检测到 {len(deleted_memo_ids)} 条笔记被删除，正在从向量库移除...")
+                vector_store.delete_documents([str(id) for id in deleted_memo_ids])
+                keyword_index.delete([str(id) for id in deleted_memo_ids])
+                self.manifest.delete_many(deleted_memo_ids)
+            
+            if changed_memos:
+                print(f"检测到 {len(changed_memos)} 条笔记新增或更新，正在同步到向量库...")
+                documents = [memo.content for memo in changed_memos]
+                doc_ids = [str(memo.id) for memo in changed_memos]
+                vector_store.upsert_documents(documents, doc_ids, vector_metadatas(changed_memos))
+                keyword_index.upsert(keyword_records(changed_memos))
+                self.manifest.upsert_many(manifest_rows(changed_memos))
+            
+            # 表统计与高水位都在变更全部写入后才保存：中途失败时下一次同步仍能按旧统计检测到物理删除
+            self.manifest.set_meta(table_stats)
+            # 高水位取已读取行的最大 updated_ts，而不是本机时间，避免时钟偏差导致漏读
+            self.save_last_sync_time(watermark)
+            self.last_sync_time = watermark
+            
+            print(f"[{datetime.now()}] 增量同步完成")
+            return {"upserted": len(changed_memos), "deleted": len(deleted_memo_ids)}
+            
+        except Exception as e:
+            print(f"同步失败: {str(e)}")
+            raise
+    
+    def load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        """读取未完成的全量同步进度；对应的影子集合已不存在或向量化模型已切换时视为无效"""
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        try:
+            with open(self.checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+        except (ValueError, OSError):
+            return None
+        if not vector_store.has_collection(checkpoint.get("collection", "")):
+            return None
+        if checkpoint.get("embedding_model", vector_store.embedding_id) != vector_store.embedding_id:
+            return None
+        return checkpoint
+
+    def save_checkpoint(self, checkpoint: Dict[str, Any]):
+        # 先写临时文件再替换，避免进程中断时留下不完整的进度文件
+        tmp_file = self.checkpoint_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def _write_page(self, collection_name: str, prepared, memos: list, checkpoint: Dict[str, Any]):
+        """把一页笔记写入影子集合、关键词索引和暂存清单，然后记录进度"""
+        with span("sync.write_page"):
+            vector_store.write_prepared(prepared, collection_name)
+            keyword_index.upsert(keyword_records(memos))
+            self.manifest.stage_many(manifest_rows(memos))
+            self.save_checkpoint(checkpoint)
+
+    @exclusive_sync
+    def full_sync(self) -> Dict[str, int]:
+        """执行全量同步所有笔记，返回写入的笔记数量
+
+        新索引分页构建到影子集合中，完成后才原子切换，期间检索仍使用旧集合；
+        每页写入后记录进度，中断后再次执行会从上次完成的页继续。
+        """
+        print(f"[{datetime.now()}] 开始全量同步...")
+        
+        try:
+            checkpoint = self.load_checkpoint()
+            if checkpoint:
+                print(f"从上次中断处继续全量同步 (集合 {checkpoint['collection']}, 已完成至 ID {checkpoint['last_id']})")
+            else:
+                vector_store.drop_stale_collections()
+                table_stats = self.db.table_stats()
+                watermark = self.db.max_updated_ts()
+                self.manifest.reset_staging()
+                checkpoint = {
+                    "collection": vector_store.create_shadow_collection(),
+                    "last_id": 0,
+                    "upserted": 0,
+                    # 高水位与表统计取开始时的值，重建期间的变更由之后的增量同步补齐
+                    "watermark": watermark,
+                    "table_stats": table_stats,
+                    "embedding_model": vector_store.embedding_id,
+                }
+                self.save_checkpoint(checkpoint)
+            collection_name = checkpoint["collection"]
+
+            # 流水线：后台线程写入第 N 页的同时，主线程读取并向量化第 N+1 页
+            pending = None
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                # 按主键分页读取，内存占用与页大小成正比
+                for rows in self.db.iter_active_pages(checkpoint["last_id"], max(1, settings.full_sync_page_size)):
+                    memos = filter_sensitive_memos(rows)
+                    prepared = vector_store.prepare_documents(
+                        [memo.content for memo in memos],
+                        [str(memo.id) for memo in memos],
+                        vector_metadatas(memos)
+                    )
+                    if pending is not None:
+                        pending.result()
+                    checkpoint = dict(checkpoint, last_id=rows[-1].id, upserted=checkpoint["upserted"] + len(memos))
+                    pending = writer.submit(self._write_page, collection_name, prepared, memos, checkpoint)
+                    print(f"全量同步进度: 已处理至 ID {rows[-1].id}，累计 {checkpoint['upserted']} 条笔记")
+                if pending is not None:
+                    pending.result()
+
+            print("新索引构建完成，正在切换集合...")
+            vector_store.activate_collection(collection_name)
+            self.manifest.promote_staging()
+            self.manifest.set_meta({**checkpoint["table_stats"], "index_version": INDEX_VERSION})
+            # 关键词索引是原地更新的，清理已不在新索引中的笔记
+            indexed_ids = set(self.manifest.all_ids())
+            keyword_index.delete([memo_id for memo_id in keyword_index.all_ids() if memo_id not in indexed_ids])
+
+            watermark = checkpoint["watermark"]
+            self.save_last_sync_time(watermark)
+            self.last_sync_time = watermark
+            self.clear_checkpoint()
+            
+            print(f"[{datetime.now()}] 全量同步完成")
+            return {"upserted": checkpoint["upserted"], "deleted": 0}
+                
+        except Exception as e:
+            print(f"全量同步失败: {str(e)}")
+            raise
+
+    @exclusive_sync
+    def compact(self) -> Dict[str, int]:
+        """整理当前向量集合，与同步互斥，避免整理时集合被同步替换或写入"""
+        return vector_store.compact()
@@ -0,0 +1,179 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class VectorCollection(ABC):
+    """向量集合接口，方法与返回格式沿用 ChromaDB Collection 的子集
+
+    - embeddings 以 (n, dim) 的 float32 矩阵传入，由各后端自行转换为内部格式
+    - get 返回 {"ids", "metadatas", "documents", "embeddings"}，未在 include 中请求的字段为 None
+    - query 返回同样的字段，每个字段按查询分组为列表的列表，另有 "distances"（平方 L2 距离，越小越相似）
+    - where 为 ChromaDB 风格的 metadata 过滤条件（$and / $or / $eq / $in / $gte / $lte 等）
+    """
+
+    name = ""
+
+    @property
+    @abstractmethod
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: np.ndarray, documents: Optional[List[str]] = None,
+               metadatas: Optional[List[dict]] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[dict] = None,
+            include: Optional[List[str]] = None, limit: Optional[int] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[dict] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, query_embeddings: np.ndarray, n_results: int = 10, where: Optional[dict] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def compact(self) -> Dict[str, int]:
+        """回收已删除记录占用的空间，返回回收的记录数；不需要整理的后端直接返回"""
+        return {"reclaimed": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "count": self.count()}
+
+
+class VectorBackend(ABC):
+    """向量存储后端：管理一组具名集合，每个后端的数据放在 vector_db_path 下各自的目录中"""
+
+    name = ""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def warm_up(self):
+        """预先完成耗时的初始化，默认无需预热"""
+
+    @abstractmethod
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> VectorCollection:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_collection(self, name: str) -> VectorCollection:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_collection_names(self) -> List[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_collection(self, name: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_max_batch_size(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ChromaCollection(VectorCollection):
+    """ChromaDB 集合的适配层；ChromaDB 0.5 只接受 Python 列表形式的向量，转换集中在这里"""
+
+    def __init__(self, collection):
+        self._collection = collection
+        self.name = collection.name
+
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        return self._collection.metadata
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self._collection.upsert(
+            ids=ids, embeddings=np.asarray(embeddings, dtype=np.float32).tolist(),
+            documents=documents, metadatas=metadatas
+        )
+
+    def get(self, ids=None, where=None, include=None, limit=None):
+        return self._collection.get(
+            ids=ids, where=where, limit=limit,
+            include=["metadatas", "documents"] if include is None else include
+        )
+
+    def delete(self, ids=None, where=None):
+        self._collection.delete(ids=ids, where=where)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=None):
+        return self._collection.query(
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32).tolist(),
+            n_results=n_results, where=where,
+            include=["metadatas", "documents", "distances"] if include is None else include
+        )
+
+
+class ChromaVectorBackend(VectorBackend):
+    """基于 chromadb.PersistentClient 的后端（默认）"""
+
+    name = "chroma"
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        # ChromaDB 客户端在首次使用时才创建（导入 chromadb 和打开持久化目录都较慢），
+        # 服务启动时由后台预热完成，手动脚本只在真正需要时付出这部分开销
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    import chromadb
+                    from chromadb.config import Settings
+                    # 指定数据持久化路径并禁用遥测
+                    self._client = chromadb.PersistentClient(
+                        path=self.path,
+                        settings=Settings(anonymized_telemetry=False)
+                    )
+        return self._client
+
+    def warm_up(self):
+        self.client
+
+    def get_or_create_collection(self, name, metadata=None):
+        return ChromaCollection(self.client.get_or_create_collection(name=name, metadata=metadata))
+
+    def get_collection(self, name):
+        return ChromaCollection(self.client.get_collection(name=name))
+
+    def list_collection_names(self):
+        return [collection.name for collection in self.client.list_collections()]
+
+    def delete_collection(self, name):
+        self.client.delete_collection(name=name)
+
+    def get_max_batch_size(self):
+        return self.client.get_max_batch_size()
+
+
+def create_vector_backend() -> VectorBackend:
+    if settings.vector_backend == "numpy":
+        from app.services.numpy_index import NumpyVectorBackend
+        return NumpyVectorBackend(os.path.join(settings.vector_db_path, "numpy"))
+    return ChromaVectorBackend(settings.vector_db_path)
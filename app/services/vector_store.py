@@ -1,98 +1,410 @@
-import chromadb
-from chromadb.config import Settings
 import numpy as np
-from typing import List, Tuple
-import requests
+from typing import Callable, Dict, List, Optional, Tuple
+import os
+import time
 from app.core.config import settings
+from app.core.concurrency import run_blocking
+from app.core.metrics import span
+from app.services.chunking import chunk_text
+from app.services.embedding_cache import EmbeddingCache, content_hash
+from app.services.query_embedding_cache import QueryEmbeddingCache
+from app.services.embedding_backends import create_embedding_backend
+from app.services.embedding_compression import reduce_dimensions
+from app.services.vector_backends import VectorCollection, create_vector_backend
+
+
+DEFAULT_COLLECTION = "memos"
+
+
+class PreparedDocuments:
+    """已切分并完成向量化、等待写入集合的一批文档"""
+    __slots__ = ("doc_ids", "chunk_ids", "chunk_texts", "chunk_metadatas", "embeddings")
+
+    def __init__(self, doc_ids: List[str], chunk_ids: List[str], chunk_texts: List[str],
+                 chunk_metadatas: List[dict], embeddings: np.ndarray):
+        self.doc_ids = doc_ids
+        self.chunk_ids = chunk_ids
+        self.chunk_texts = chunk_texts
+        self.chunk_metadatas = chunk_metadatas
+        self.embeddings = embeddings
+
 
 class VectorStore:
     def __init__(self):
-        # 初始化 ChromaDB 客户端，并指定数据持久化路径和禁用遥测
-        self.client = chromadb.PersistentClient(
-            path=settings.vector_db_path,
-            settings=Settings(anonymized_telemetry=False)
-        )
-        # 获取或创建名为 "memos" 的集合
-        self.collection = self.client.get_or_create_collection(name="memos")
+        # 存储后端：默认 ChromaDB，也可配置为内存映射的 NumPy 矩阵（适合中小规模、希望减少依赖的部署）
+        self.backend = create_vector_backend()
+        # 当前生效的集合名保存在指针文件中，全量重建时先写入影子集合，完成后再原子切换；
+        # 每个后端各有一个指针文件，切换后端不会指向另一个后端中的集合
+        self._pointer_file = os.path.join(self.backend.path, "active_collection.txt")
+        # 最近一次全量重建所用的后端，切换后端后据此触发重建
+        self._backend_file = os.path.join(settings.vector_db_path, "active_backend.txt")
+        self._pointer_mtime: Optional[float] = None
+        self._collection_name = ""
+        self._collection = None
+        # 向量化后端：默认调用在线 Embedding API，也可配置为进程内的本地模型
+        self.embedder = create_embedding_backend()
+        self.embedding_cache = None
+        if settings.embedding_cache_enabled:
+            self.embedding_cache = EmbeddingCache(
+                os.path.join(settings.vector_db_path, "embedding_cache.sqlite3"),
+                settings.embedding_cache_max_entries,
+                settings.embedding_storage_dtype
+            )
+        # 查询向量的内存 LRU，相同问题（重试、批量请求中的重复问题）不再重复调用 Embedding API
+        self.query_cache = None
+        if settings.query_embedding_cache_size > 0:
+            self.query_cache = QueryEmbeddingCache(settings.query_embedding_cache_size)
+        # 文档变更监听器，回调参数为变更的文档 ID 列表；None 表示整个集合被重置
+        self._change_listeners: List[Callable[[Optional[List[str]]], None]] = []
+
+    @property
+    def embedding_id(self) -> str:
+        """索引中向量的标识：模型 + 截断后的维度，用作缓存键并记录在集合上"""
+        if settings.embedding_dimensions > 0:
+            return f"{self.embedder.model_id}@{settings.embedding_dimensions}"
+        return self.embedder.model_id
+
+    def warm_up(self):
+        """打开存储后端、加载当前集合和 Embedding 缓存，并完成向量化后端的初始化（本地模型在此加载）"""
+        self.backend.warm_up()
+        self.collection.count()
+        if self.embedding_cache is not None:
+            self.embedding_cache.warm_up()
+        self.embedder.warm_up()
+
+    async def aclose(self):
+        await self.embedder.aclose()
+        self.backend.close()
+
+    def _read_active_name(self) -> str:
+        if os.path.exists(self._pointer_file):
+            with open(self._pointer_file, 'r') as f:
+                name = f.read().strip()
+                if name:
+                    return name
+        return DEFAULT_COLLECTION
+
+    def _refresh_active_collection(self):
+        """指针文件变化（例如其他进程完成了全量重建）时切换到新的集合"""
+        mtime = os.path.getmtime(self._pointer_file) if os.path.exists(self._pointer_file) else None
+        if self._collection is not None and mtime == self._pointer_mtime:
+            return
+        self._pointer_mtime = mtime
+        name = self._read_active_name()
+        if name != self._collection_name or self._collection is None:
+            # 获取或创建集合，默认名为 "memos"
+            self._collection = self.backend.get_or_create_collection(name=name)
+            self._collection_name = name
+
+    @property
+    def collection(self) -> VectorCollection:
+        self._refresh_active_collection()
+        return self._collection
+
+    @property
+    def collection_name(self) -> str:
+        self._refresh_active_collection()
+        return self._collection_name
+
+    def create_shadow_collection(self) -> str:
+        """创建用于全量重建的影子集合，返回集合名"""
+        name = f"{DEFAULT_COLLECTION}-{int(time.time())}"
+        # 记录生成向量的模型，切换模型后据此判断索引需要重建
+        self.backend.get_or_create_collection(name=name, metadata={"embedding_model": self.embedding_id})
+        return name
+
+    def embedder_matches_index(self) -> bool:
+        """当前集合是否由当前的向量化模型建立；不同模型的向量不可混用（维度也可能不同）"""
+        recorded = (self.collection.metadata or {}).get("embedding_model")
+        if recorded is None:
+            # 记录模型之前建立的集合都来自在线 API，且保留完整维度
+            return self.embedder.name == "remote" and settings.embedding_dimensions <= 0
+        return recorded == self.embedding_id
+
+    def backend_matches_index(self) -> bool:
+        """当前集合是否由当前的存储后端在最近一次全量重建中建立
+
+        两个后端的数据互相独立，使用其他后端期间的增量更新不会写入这里，切换回来后需要重建。
+        记录后端之前的索引都来自 ChromaDB。
+        """
+        recorded = "chroma"
+        if os.path.exists(self._backend_file):
+            with open(self._backend_file, 'r') as f:
+                recorded = f.read().strip() or recorded
+        return recorded == self.backend.name
+
+    def has_collection(self, name: str) -> bool:
+        return name in self.backend.list_collection_names()
+
+    def drop_stale_collections(self):
+        """删除中断后遗留的影子集合"""
+        active = self.collection_name
+        for name in self.backend.list_collection_names():
+            if name.startswith(f"{DEFAULT_COLLECTION}-") and name != active:
+                self.backend.delete_collection(name)
+
+    def activate_collection(self, name: str):
+        """原子地把影子集合切换为当前集合，并删除旧集合"""
+        previous = self.collection_name
+        os.makedirs(os.path.dirname(self._pointer_file), exist_ok=True)
+        tmp_file = self._pointer_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(name)
+        os.replace(tmp_file, self._pointer_file)
+        self._refresh_active_collection()
+        with open(self._backend_file, 'w') as f:
+            f.write(self.backend.name)
+        if previous != name and self.has_collection(previous):
+            self.backend.delete_collection(previous)
+        self._notify_change(None)
+
+    def add_change_listener(self, listener: Callable[[Optional[List[str]]], None]):
+        """注册文档变更回调，用于让依赖索引内容的缓存及时失效"""
+        self._change_listeners.append(listener)
+
+    def _notify_change(self, doc_ids: Optional[List[str]]):
+        for listener in self._change_listeners:
+            try:
+                listener(doc_ids)
+            except Exception as e:
+                print(f"Change listener failed: {e}")
     
     def _get_embeddings(self, texts: List[str]) -> np.ndarray:
-        """通过外部 API 获取文本的嵌入向量"""
-        headers = {
-            'Authorization': f'Bearer {settings.embedding_api_key}',
-            'Content-Type': 'application/json'
-        }
-        payload = {
-            "model": settings.embedding_model,
-            "input": texts
-        }
-        try:
-            url = f"{settings.embedding_api_url.rstrip('/')}/v1/embeddings"
-            print(f"正在调用 Embedding API: {url}")
-            response = requests.post(url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
-            data = response.json()
-            embeddings = np.array([item['embedding'] for item in data['data']])
-            return embeddings
-        except requests.exceptions.RequestException as e:
-            print(f"Error calling embedding API: {e}")
-            raise
-        except (KeyError, IndexError) as e:
-            print(f"Failed to parse API response. Unexpected format: {e}")
-            raise
-
-    def upsert_documents(self, documents: List[str], doc_ids: List[str]):
+        """通过当前的向量化后端获取文本的嵌入向量，顺序与输入一致
+
+        文档和查询都经过这里，配置了 embedding_dimensions 时在此统一截断，保证两边维度一致。
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        with span("embedding"):
+            return reduce_dimensions(self.embedder.embed(texts), settings.embedding_dimensions)
+
+    async def _aget_embeddings(self, texts: List[str]) -> np.ndarray:
+        """_get_embeddings 的异步版本"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        with span("embedding"):
+            return reduce_dimensions(await self.embedder.aembed(texts), settings.embedding_dimensions)
+
+    def _get_document_embeddings(self, documents: List[str]) -> np.ndarray:
+        """获取文档向量，优先读取内容哈希缓存，仅对未命中的文档调用 API"""
+        if self.embedding_cache is None:
+            return self._get_embeddings(documents)
+
+        model = self.embedding_id
+        hashes = [content_hash(doc) for doc in documents]
+        cached = self.embedding_cache.get_many(model, hashes)
+
+        # 相同内容只请求一次
+        missing: dict = {}
+        for h, doc in zip(hashes, documents):
+            if h not in cached and h not in missing:
+                missing[h] = doc
+        if missing:
+            print(f"Embedding 缓存命中 {len(documents) - len(missing)}/{len(documents)}，需请求 {len(missing)} 条")
+            fresh = self._get_embeddings(list(missing.values()))
+            # 使用缓存中保存的（可能已量化的）向量，与之后命中缓存时得到的结果一致
+            fresh = self.embedding_cache.put_many(model, list(missing.keys()), fresh)
+            cached.update(zip(missing.keys(), fresh))
+        return np.vstack([cached[h] for h in hashes])
+
+    @staticmethod
+    def _chunk_id(memo_id: str, index: int) -> str:
+        return f"{memo_id}#{index}"
+
+    def _delete_memo_chunks(self, memo_ids: List[str], collection=None):
+        """删除笔记的全部分块，同时清理分块功能之前以笔记 ID 直接存储的旧记录"""
+        collection = collection or self.collection
+        collection.delete(where={"memo_id": {"$in": memo_ids}})
+        legacy_ids = collection.get(ids=memo_ids, include=[])['ids']
+        if legacy_ids:
+            collection.delete(ids=legacy_ids)
+
+    def prepare_documents(
+        self, documents: List[str], doc_ids: List[str], metadatas: Optional[List[dict]] = None
+    ) -> PreparedDocuments:
+        """切分并向量化文档，得到可以直接写入集合的分块记录
+
+        长文档会按 chunk_size_tokens 切分为多条记录，ID 为 "<doc_id>#<n>"，
+        metadata 中记录所属笔记 ID，便于整体删除和按笔记聚合检索结果；
+        metadatas 中的笔记级字段（时间、标签、可见性）会复制到该笔记的每个分块上，供 where 过滤。
+        """
+        chunk_ids: List[str] = []
+        chunk_texts: List[str] = []
+        chunk_metadatas: List[dict] = []
+        for position, (doc_id, document) in enumerate(zip(doc_ids, documents)):
+            memo_metadata = metadatas[position] if metadatas else {}
+            chunks = chunk_text(document, settings.chunk_size_tokens, settings.chunk_overlap_tokens)
+            for index, chunk in enumerate(chunks):
+                chunk_ids.append(self._chunk_id(doc_id, index))
+                chunk_texts.append(chunk)
+                chunk_metadatas.append({
+                    **memo_metadata, "memo_id": doc_id, "chunk_index": index, "chunk_count": len(chunks)
+                })
+
+        if not chunk_texts:
+            # 整页笔记都被过滤时没有需要向量化的内容
+            return PreparedDocuments([], [], [], [], np.empty((0, 0), dtype=np.float32))
+        embeddings = self._get_document_embeddings(chunk_texts)
+        return PreparedDocuments(list(doc_ids), chunk_ids, chunk_texts, chunk_metadatas, embeddings)
+
+    def write_prepared(self, prepared: PreparedDocuments, collection_name: Optional[str] = None):
+        """把 prepare_documents 的结果写入集合；未指定集合名时写入当前集合"""
+        if not prepared.doc_ids:
+            return
+        collection = self.collection if collection_name is None else self.backend.get_collection(collection_name)
+
+        # 先删除旧分块，避免笔记变短后残留多余的尾部分块
+        max_batch = self.backend.get_max_batch_size()
+        for start in range(0, len(prepared.doc_ids), max_batch):
+            self._delete_memo_chunks(prepared.doc_ids[start:start + max_batch], collection)
+
+        # 后端对单次写入条数有上限，超出时分段写入
+        for start in range(0, len(prepared.chunk_ids), max_batch):
+            end = start + max_batch
+            collection.upsert(
+                ids=prepared.chunk_ids[start:end],
+                embeddings=prepared.embeddings[start:end],
+                documents=prepared.chunk_texts[start:end],  # 存储分块原文
+                metadatas=prepared.chunk_metadatas[start:end]
+            )
+        if collection_name is None:
+            self._notify_change(prepared.doc_ids)
+
+    def upsert_documents(
+        self, documents: List[str], doc_ids: List[str],
+        metadatas: Optional[List[dict]] = None, collection_name: Optional[str] = None
+    ):
         """添加或更新文档到向量数据库"""
         if not documents:
             return
-        
-        embeddings = self._get_embeddings(documents)
-        
-        # 使用 upsert，如果 ID 已存在则更新，否则插入
-        self.collection.upsert(
-            ids=doc_ids,
-            embeddings=embeddings.tolist(),
-            documents=documents  # 存储原始文档内容
-        )
+        self.write_prepared(self.prepare_documents(documents, doc_ids, metadatas), collection_name)
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[str, str, float]]:
-        """根据查询文本搜索最相似的文档，并返回其内容和分数"""
-        if self.collection.count() == 0:
+    def _query_collection(
+        self, query_embeddings: np.ndarray, k: int, where: Optional[dict] = None
+    ) -> List[Tuple[str, str, float]]:
+        """在集合中查询分块，并按笔记聚合，返回 (笔记 ID, 最相关的分块内容, 最小距离)"""
+        return self._query_collection_many(query_embeddings, k, where)[0]
+
+    def _query_collection_many(
+        self, query_embeddings: np.ndarray, k: int, where: Optional[dict] = None
+    ) -> List[List[Tuple[str, str, float]]]:
+        """一次查询多个向量，每个查询分别按笔记聚合
+
+        查询时只取 ID、距离和 metadata，多个查询命中的相同分块只读取一次原文。
+        where 为 ChromaDB 风格的 metadata 过滤条件，在排序之前裁剪候选分块。
+        """
+        count = self.collection.count()
+        if count == 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        # 同一笔记可能命中多个分块，多取一些候选以保证聚合后仍有 k 条笔记
+        with span("vector.query"):
+            results = self.collection.query(
+                query_embeddings=query_embeddings,
+                n_results=min(count, k * settings.chunk_search_multiplier),
+                where=where,
+                include=["distances", "metadatas"]
+            )
+
+        # 每个查询保留的分块: memo_id -> [(chunk_index, chunk_id, distance)]
+        grouped_per_query: List[dict] = []
+        needed_chunks: set = set()
+        for ids, distances, metadatas in zip(results['ids'], results['distances'], results['metadatas']):
+            grouped: dict = {}
+            for chunk_id, distance, metadata in zip(ids, distances, metadatas):
+                metadata = metadata or {}
+                memo_id = metadata.get("memo_id", chunk_id)
+                chunks = grouped.setdefault(memo_id, [])
+                if len(chunks) < settings.chunk_max_per_memo:
+                    chunks.append((metadata.get("chunk_index", 0), chunk_id, float(distance)))
+                    needed_chunks.add(chunk_id)
+            grouped_per_query.append(grouped)
+
+        documents: dict = {}
+        if needed_chunks:
+            fetched = self.collection.get(ids=list(needed_chunks), include=["documents"])
+            documents = dict(zip(fetched['ids'], fetched['documents']))
+
+        all_memos = []
+        for grouped in grouped_per_query:
+            memos = []
+            for memo_id, chunks in grouped.items():
+                best_distance = min(distance for _, _, distance in chunks)
+                # 同一笔记的多个分块按原文顺序拼接
+                content = "\n...\n".join(documents.get(chunk_id, "") for _, chunk_id, _ in sorted(chunks))
+                memos.append((memo_id, content, best_distance))
+            memos.sort(key=lambda item: item[2])
+            all_memos.append(memos[:k])
+        return all_memos
+
+    async def aembed_query(self, query: str) -> np.ndarray:
+        """异步获取单条查询文本的向量，形状为 (1, dim)"""
+        return await self.aembed_queries([query])
+
+    async def asearch(
+        self, query: str, k: int = 5, query_embedding: Optional[np.ndarray] = None, where: Optional[dict] = None
+    ) -> List[Tuple[str, str, float]]:
+        """search 的异步版本：异步获取查询向量，向量查询放到线程池中执行
+
+        已经持有查询向量时可通过 query_embedding 传入，避免重复请求 Embedding API
+        """
+        # collection 属性本身可能读取指针文件、打开集合，需在线程池中求值
+        if await run_blocking(lambda: self.collection.count()) == 0:
             return []
-        
-        query_embedding = self._get_embeddings([query])
-        
-        # 在集合中查询，并要求返回文档内容和距离
-        results = self.collection.query(
-            query_embeddings=query_embedding.tolist(),
-            n_results=k,
-            include=["documents", "distances"]
-        )
-        
-        # 解析结果
-        if not results['ids'] or not results['ids'][0]:
+
+        if query_embedding is None:
+            query_embedding = await self.aembed_query(query)
+        return await run_blocking(self._query_collection, query_embedding, k, where)
+
+    async def aembed_queries(self, queries: List[str]) -> np.ndarray:
+        """批量获取多条查询文本的向量，形状为 (n, dim)
+
+        经过查询向量缓存：已缓存的直接返回，与进行中请求相同的查询等待同一个结果，
+        其余查询合并为一次 Embedding 请求。
+        """
+        if self.query_cache is None or not queries:
+            return await self._aget_embeddings(queries)
+        return await self.query_cache.get_or_compute(self.embedding_id, queries, self._aget_embeddings)
+
+    async def asearch_many(
+        self, query_embeddings: np.ndarray, k: int = 5, where: Optional[dict] = None
+    ) -> List[List[Tuple[str, str, float]]]:
+        """用一次向量查询检索多个查询向量，结果顺序与输入一致"""
+        if len(query_embeddings) == 0:
             return []
+        return await run_blocking(self._query_collection_many, query_embeddings, k, where)
 
-        ids = results['ids'][0]
-        documents = results['documents'][0]
-        distances = [float(dist) for dist in results['distances'][0]]
-        
-        return list(zip(ids, documents, distances))
-    
     def delete_documents(self, doc_ids: List[str]):
-        """从向量数据库中删除文档"""
+        """从向量数据库中删除文档的全部分块"""
         if not doc_ids:
             return
         
-        self.collection.delete(ids=doc_ids)
+        self._delete_memo_chunks(doc_ids)
+        self._notify_change(doc_ids)
 
-    def get_all_ids(self) -> List[str]:
-        """获取向量数据库中所有文档的ID"""
-        return self.collection.get(include=[])['ids']
+    def memo_ids_for_uids(self, uids: List[str]) -> Dict[str, str]:
+        """根据 metadata 中的 uid 查找已索引笔记的 ID，用于处理数据库中已不存在的笔记"""
+        if not uids:
+            return {}
+        records = self.collection.get(where={"uid": {"$in": list(uids)}}, include=["metadatas"])
+        return {metadata["uid"]: metadata["memo_id"] for metadata in records["metadatas"] if metadata}
+
+    def get_all_ids(self, collection_name: Optional[str] = None) -> List[str]:
+        """获取向量数据库中所有文档（笔记）的ID"""
+        collection = self.collection if collection_name is None else self.backend.get_collection(collection_name)
+        records = collection.get(include=["metadatas"])
+        memo_ids = {
+            (metadata or {}).get("memo_id", record_id)
+            for record_id, metadata in zip(records['ids'], records['metadatas'])
+        }
+        return list(memo_ids)
 
-    def reset_collection(self):
-        """清空并重建集合，用于全量同步"""
-        self.client.delete_collection(name="memos")
-        self.collection = self.client.get_or_create_collection(name="memos")
+    def compact(self) -> Dict[str, int]:
+        """整理当前集合，回收已删除记录占用的空间（ChromaDB 后端自行管理，无需整理）"""
+        return self.collection.compact()
 
 # 实例化 VectorStore，供应用其他部分使用
 vector_store = VectorStore()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+向量压缩的召回率 / 体积对比报告
+
+对同一批向量分别应用 Matryoshka 截断（EMBEDDING_DIMENSIONS）和存储量化
+（EMBEDDING_STORAGE_DTYPE = float16 / int8），以完整维度 float32 的精确检索结果为基准，
+输出每种配置的单条向量字节数、总体积、recall@k 和暴力检索的单条查询耗时。
+
+向量来源（三选一）:
+    --from-index      读取当前向量集合中的全部向量（使用 .env 中的配置）
+    --npy PATH        读取 numpy 保存的 (n, dim) 矩阵
+    默认              生成合成向量；各维方差按位置递减，近似 Matryoshka 模型前几维信息量更大的特点
+
+用法:
+    python benchmarks/compression_report.py --from-index --dims 512,256,128 --k 10
+    python benchmarks/compression_report.py --vectors 20000 --dim 1024 --output compression.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from app.services.embedding_compression import (  # noqa: E402
+    STORAGE_DTYPES, bytes_per_vector, dequantize, normalize_rows, quantize, reduce_dimensions
+)
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    decay = 1.0 / np.sqrt(1.0 + np.arange(dim) / 32.0)
+    centers = rng.standard_normal((clusters, dim)) * decay
+    labels = rng.integers(0, clusters, count)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((count, dim)) * decay
+    return normalize_rows(vectors.astype(np.float32))
+
+
+def index_vectors() -> np.ndarray:
+    from app.services.vector_store import vector_store
+
+    records = vector_store.collection.get(include=["embeddings"])
+    if len(records["embeddings"]) == 0:
+        raise SystemExit("当前向量集合为空，请先执行同步")
+    return normalize_rows(np.asarray(records["embeddings"], dtype=np.float32))
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, part, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(part, order, axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f).intersection(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def evaluate(corpus: np.ndarray, queries: np.ndarray, truth: np.ndarray, dims: int, dtype: str,
+             k: int) -> Dict[str, Any]:
+    reduced_corpus = reduce_dimensions(corpus, dims)
+    reduced_queries = reduce_dimensions(queries, dims)
+    codes, scales = quantize(reduced_corpus, dtype)
+    width = reduced_corpus.shape[1]
+
+    started = time.perf_counter()
+    # 与检索时一致：存储的是量化后的向量，查询向量保持 float32
+    scores = reduced_queries @ dequantize(codes, scales, dtype).T
+    found = top_k(scores, k)
+    elapsed = time.perf_counter() - started
+
+    size = bytes_per_vector(width, dtype)
+    return {
+        "dims": width,
+        "dtype": dtype,
+        "bytes_per_vector": size,
+        "total_mb": round(size * len(corpus) / 1024 / 1024, 3),
+        f"recall@{k}": round(recall(found, truth), 4),
+        "query_ms": round(elapsed / len(queries) * 1000, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量压缩的召回率 / 体积对比")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--from-index", action="store_true", help="读取当前向量集合中的向量")
+    source.add_argument("--npy", help="numpy 保存的 (n, dim) 向量矩阵")
+    parser.add_argument("--vectors", type=int, default=10000, help="合成向量数量")
+    parser.add_argument("--dim", type=int, default=1024, help="合成向量维度")
+    parser.add_argument("--clusters", type=int, default=200, help="合成向量的簇数量")
+    parser.add_argument("--queries", type=int, default=200, help="从语料中留出作为查询的向量数量")
+    parser.add_argument("--dims", default="512,256,128", help="逗号分隔的截断维度")
+    parser.add_argument("--dtypes", default=",".join(STORAGE_DTYPES), help="逗号分隔的存储格式")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    if args.from_index:
+        vectors = index_vectors()
+    elif args.npy:
+        vectors = normalize_rows(np.load(args.npy))
+    else:
+        vectors = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters, args.seed)
+
+    rng = np.random.default_rng(args.seed)
+    query_count = min(args.queries, len(vectors) // 2)
+    order = rng.permutation(len(vectors))
+    queries, corpus = vectors[order[:query_count]], vectors[order[query_count:]]
+    truth = top_k(queries @ corpus.T, args.k)
+
+    full_dim = corpus.shape[1]
+    dims_list = [full_dim] + [int(d) for d in args.dims.split(",") if d.strip() and 0 < int(d) < full_dim]
+    dtypes = [d.strip() for d in args.dtypes.split(",") if d.strip() in STORAGE_DTYPES]
+    baseline = bytes_per_vector(full_dim, "float32")
+
+    rows: List[Dict[str, Any]] = []
+    for dims in dims_list:
+        for dtype in dtypes:
+            row = evaluate(corpus, queries, truth, dims, dtype, args.k)
+            row["size_ratio"] = round(row["bytes_per_vector"] / baseline, 4)
+            rows.append(row)
+
+    print(f"语料 {len(corpus)} 条，查询 {len(queries)} 条，原始维度 {full_dim}，基准为 float32 完整维度的精确 top-{args.k}")
+    header = f"{'dims':>6} {'dtype':>8} {'bytes/vec':>10} {'total MB':>10} {'size':>7} {'recall@' + str(args.k):>10} {'ms/query':>9}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['dims']:>6} {row['dtype']:>8} {row['bytes_per_vector']:>10} {row['total_mb']:>10} "
+              f"{row['size_ratio']:>7.2%} {row[f'recall@{args.k}']:>10.4f} {row['query_ms']:>9.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"corpus": len(corpus), "queries": len(queries), "dim": full_dim, "k": args.k,
+                       "results": rows}, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
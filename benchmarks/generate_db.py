@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+生成用于基准测试的合成 Memos SQLite 数据库
+
+表结构与 Memos 的 memo 表一致（只包含本项目用到的列及必要的约束），
+内容由固定词表随机组合而成，按比例混入归档、公开、敏感和长笔记。
+
+用法:
+    python benchmarks/generate_db.py /tmp/bench/memos.db --memos 5000
+"""
+
+import argparse
+import random
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, List
+
+WORDS = [
+    "K3S", "证书", "更新", "docker", "部署", "会议", "记录", "python", "学习", "旅行", "读书", "数据库",
+    "备份", "nginx", "配置", "周报", "项目", "需求", "复盘", "健身", "菜谱", "电影", "笔记", "kubernetes",
+    "监控", "告警", "日志", "性能", "优化", "缓存", "索引", "计划", "预算", "家庭", "孩子", "英语",
+]
+SENSITIVE_WORDS = ["密码", "password", "密钥", "token"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memo (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL UNIQUE,
+    creator_id INTEGER NOT NULL DEFAULT 1,
+    created_ts BIGINT NOT NULL,
+    updated_ts BIGINT NOT NULL,
+    row_status TEXT NOT NULL DEFAULT 'NORMAL',
+    content TEXT NOT NULL DEFAULT '',
+    visibility TEXT NOT NULL DEFAULT 'PRIVATE',
+    pinned INTEGER NOT NULL DEFAULT 0,
+    payload TEXT NOT NULL DEFAULT '{}'
+)
+"""
+
+
+def random_content(rng: random.Random, long_ratio: float, sensitive_ratio: float) -> str:
+    length = rng.randint(400, 1500) if rng.random() < long_ratio else rng.randint(5, 60)
+    words = [rng.choice(WORDS) for _ in range(length)]
+    if rng.random() < sensitive_ratio:
+        words.insert(rng.randrange(len(words)), rng.choice(SENSITIVE_WORDS))
+    return " ".join(words) + f" #{rng.choice(WORDS)}"
+
+
+def generate_db(path: str, memos: int, seed: int = 42, long_ratio: float = 0.05,
+                sensitive_ratio: float = 0.02) -> Dict[str, int]:
+    """创建（覆盖）数据库并写入 memos 条笔记，返回各类笔记数量"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("DROP TABLE IF EXISTS memo")
+    conn.execute(SCHEMA)
+    now = int(time.time())
+    rows = []
+    for i in range(memos):
+        ts = now - (memos - i) * 600
+        row_status = "ARCHIVED" if rng.random() < 0.05 else "NORMAL"
+        visibility = "PUBLIC" if rng.random() < 0.1 else "PRIVATE"
+        rows.append((uuid.UUID(int=rng.getrandbits(128)).hex[:22], ts, ts, row_status,
+                     random_content(rng, long_ratio, sensitive_ratio), visibility))
+    conn.executemany(
+        "INSERT INTO memo (uid, created_ts, updated_ts, row_status, content, visibility) VALUES (?, ?, ?, ?, ?, ?)",
+        rows
+    )
+    conn.commit()
+    eligible = conn.execute(
+        "SELECT COUNT(*) FROM memo WHERE row_status = 'NORMAL' AND visibility = 'PRIVATE'"
+    ).fetchone()[0]
+    conn.close()
+    return {"memos": memos, "eligible": eligible}
+
+
+def mutate_db(path: str, updates: int, inserts: int, deletes: int, seed: int = 7) -> Dict[str, int]:
+    """模拟两次同步之间的变更：编辑、新增和物理删除笔记"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    ids = [row[0] for row in conn.execute("SELECT id FROM memo")]
+    now = int(time.time()) + 1
+    touched = rng.sample(ids, min(updates + deletes, len(ids)))
+    for memo_id in touched[:updates]:
+        conn.execute("UPDATE memo SET content = ?, updated_ts = ? WHERE id = ?",
+                     (random_content(rng, 0.05, 0.0), now, memo_id))
+    conn.executemany("DELETE FROM memo WHERE id = ?", [(memo_id,) for memo_id in touched[updates:]])
+    conn.executemany(
+        "INSERT INTO memo (uid, created_ts, updated_ts, content) VALUES (?, ?, ?, ?)",
+        [(uuid.UUID(int=rng.getrandbits(128)).hex[:22], now, now, random_content(rng, 0.05, 0.0))
+         for _ in range(inserts)]
+    )
+    conn.commit()
+    conn.close()
+    return {"updated": updates, "inserted": inserts, "deleted": len(touched[updates:])}
+
+
+def _rfc3339(ts: int) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+def webhook_events(path: str, count: int, seed: int = 11) -> List[Dict[str, Any]]:
+    """模拟 Memos 发出 Webhook 的过程：先修改数据库，再返回对应的 created / updated / deleted 事件
+
+    约六成为编辑（其中三分之一重复编辑同一笔记，用于观察队列合并），两成为新建，两成为物理删除。
+    编辑和删除只选择已被索引的笔记（未归档、私有、不含敏感词），事件中的资源名均为真实的 memos/<uid>。
+    """
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    indexed = [uid for uid, content in conn.execute(
+        "SELECT uid, content FROM memo WHERE row_status = 'NORMAL' AND visibility = 'PRIVATE' ORDER BY id"
+    ) if not any(word in content for word in SENSITIVE_WORDS)]
+    rng.shuffle(indexed)
+    creates = count // 5
+    deletes = min(count // 5, len(indexed) // 2)
+    updates = count - creates - deletes
+    deleted = indexed[:deletes]
+    edited = indexed[deletes:deletes + max(1, updates * 2 // 3)]
+    now = int(time.time()) + 1
+
+    def event(activity: str, uid: str, content: str) -> Dict[str, Any]:
+        return {"activityType": activity, "memo": {
+            "name": f"memos/{uid}", "content": content, "visibility": "PRIVATE",
+            "createTime": _rfc3339(now), "updateTime": _rfc3339(now),
+        }}
+
+    events = []
+    for i in range(updates if edited else 0):
+        uid, content = edited[i % len(edited)], random_content(rng, 0.0, 0.0)
+        conn.execute("UPDATE memo SET content = ?, updated_ts = ? WHERE uid = ?", (content, now, uid))
+        events.append(event("memos.memo.updated", uid, content))
+    for _ in range(creates):
+        uid, content = uuid.UUID(int=rng.getrandbits(128)).hex[:22], random_content(rng, 0.0, 0.0)
+        conn.execute("INSERT INTO memo (uid, created_ts, updated_ts, content) VALUES (?, ?, ?, ?)",
+                     (uid, now, now, content))
+        events.append(event("memos.memo.created", uid, content))
+    conn.executemany("DELETE FROM memo WHERE uid = ?", [(uid,) for uid in deleted])
+    events.extend(event("memos.memo.deleted", uid, "") for uid in deleted)
+    conn.commit()
+    conn.close()
+    rng.shuffle(events)
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成 Memos 数据库")
+    parser.add_argument("path")
+    parser.add_argument("--memos", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--long-ratio", type=float, default=0.05, help="长笔记（会被分块）的比例")
+    parser.add_argument("--sensitive-ratio", type=float, default=0.02, help="包含敏感词的笔记比例")
+    args = parser.parse_args()
+    print(generate_db(args.path, args.memos, args.seed, args.long_ratio, args.sensitive_ratio))
+
+
+if __name__ == "__main__":
+    main()
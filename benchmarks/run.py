@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+离线性能基准测试
+
+启动本地模拟的 Embedding / LLM 服务，生成合成 Memos 数据库，依次测量：
+- full_sync          全量同步耗时与吞吐
+- incremental_sync   无变更和有变更时的增量同步耗时
+- webhook_burst      并发 Webhook 的确认延迟以及索引队列清空所需时间
+- ask_<mode>         并发 /api/ask 的吞吐、首 token 延迟 (TTFT) 和总延迟
+
+结果以 JSON 写入 --output，便于对比不同提交之间的性能变化。
+
+用法:
+    python benchmarks/run.py --memos 2000 --ask-requests 100 --ask-concurrency 8 --output bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_db import WORDS, generate_db, mutate_db, webhook_events  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 4)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 4),
+    }
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务未能在 {timeout}s 内就绪: {url}")
+
+
+def start_process(args: List[str], env: Dict[str, str], ready_url: str, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    process = subprocess.Popen(args, cwd=ROOT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_for(ready_url)
+    except Exception:
+        process.terminate()
+        raise
+    return process
+
+
+def stub_stats(stub_url: str) -> Dict[str, int]:
+    return httpx.get(f"{stub_url}/stats", timeout=5.0).json()
+
+
+def stats_delta(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, int]:
+    return {key: after[key] - before.get(key, 0) for key in after}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def random_question(rng: random.Random) -> str:
+    return f"关于 {rng.choice(WORDS)} 和 {rng.choice(WORDS)} 我记录过什么？"
+
+
+# --- 同步相关 ---
+def bench_sync(stub_url: str, db_path: str, args) -> Dict[str, Any]:
+    # 在设置好环境变量之后再导入，保证配置指向临时目录和模拟服务
+    sys.path.insert(0, ROOT_DIR)
+    from app.services.sync_service import MemosSync
+
+    results: Dict[str, Any] = {}
+
+    before = stub_stats(stub_url)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    counts = MemosSync().full_sync()
+    elapsed = time.perf_counter() - started
+    results["full_sync"] = {
+        "seconds": round(elapsed, 3),
+        "memos_per_second": round(counts["upserted"] / elapsed, 1) if elapsed else None,
+        "result": counts,
+        "max_rss_growth_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before,
+        "stub": stats_delta(before, stub_stats(stub_url)),
+    }
+
+    before = stub_stats(stub_url)
+    started = time.perf_counter()
+    counts = MemosSync().sync_memos()
+    noop = {"seconds": round(time.perf_counter() - started, 3), "result": counts,
+            "stub": stats_delta(before, stub_stats(stub_url))}
+
+    # updated_ts 精度为秒，等待一秒避免变更与上次高水位落在同一秒
+    time.sleep(1.1)
+    mutation = mutate_db(db_path, args.changes, args.changes, max(1, args.changes // 5))
+    before = stub_stats(stub_url)
+    started = time.perf_counter()
+    counts = MemosSync().sync_memos()
+    results["incremental_sync"] = {
+        "noop": noop,
+        "changed": {"seconds": round(time.perf_counter() - started, 3), "mutation": mutation,
+                    "result": counts, "stub": stats_delta(before, stub_stats(stub_url))},
+    }
+    return results
+
+
+# --- HTTP 负载 ---
+async def bench_webhooks(app_url: str, events: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=60.0) as client:
+        before = (await client.get("/api/index/queue")).json()
+
+        async def send(payload: Dict[str, Any]):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/v1/webhook/memos", json=payload)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(payload) for payload in events))
+        acked = time.perf_counter() - started
+
+        # 等待后台 worker 清空队列
+        while True:
+            stats = (await client.get("/api/index/queue")).json()
+            if stats["depth"] == 0:
+                break
+            await asyncio.sleep(0.05)
+        drained = time.perf_counter() - started
+
+    skipped = stats["skipped"] - before["skipped"]
+    if skipped:
+        # 被跳过的事件没有写入索引，测得的耗时不代表真实的索引开销
+        raise RuntimeError(f"索引 worker 跳过了 {skipped} 条 Webhook 事件，基准结果无效")
+
+    activities: Dict[str, int] = {}
+    for payload in events:
+        activities[payload["activityType"]] = activities.get(payload["activityType"], 0) + 1
+    return {
+        "events": len(events),
+        "activities": activities,
+        "errors": errors,
+        "ack_latency_seconds": percentiles(latencies),
+        "ack_all_seconds": round(acked, 3),
+        "drain_seconds": round(drained, 3),
+        "queue": stats,
+    }
+
+
+async def bench_ask(app_url: str, mode: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    rng = random.Random(2)
+    questions = [random_question(rng) for _ in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    ttfts: List[float] = []
+    totals: List[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=120.0) as client:
+        async def ask(question: str):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                first: Optional[float] = None
+                try:
+                    async with client.stream("POST", "/api/ask", json={"question": question, "mode": mode}) as response:
+                        async for chunk in response.aiter_text():
+                            if chunk and first is None:
+                                first = time.perf_counter() - started
+                        if response.status_code != 200:
+                            errors += 1
+                            return
+                except httpx.HTTPError:
+                    errors += 1
+                    return
+                totals.append(time.perf_counter() - started)
+                if first is not None:
+                    ttfts.append(first)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(ask(q) for q in questions))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(len(totals) / elapsed, 2) if elapsed else None,
+        "ttft_seconds": percentiles(ttfts),
+        "latency_seconds": percentiles(totals),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memos AI 离线性能基准测试")
+    parser.add_argument("--memos", type=int, default=1000, help="合成数据库中的笔记数量")
+    parser.add_argument("--changes", type=int, default=50, help="增量同步前编辑和新增的笔记数量")
+    parser.add_argument("--webhooks", type=int, default=200, help="Webhook 突发事件数量")
+    parser.add_argument("--webhook-concurrency", type=int, default=32)
+    parser.add_argument("--ask-requests", type=int, default=50)
+    parser.add_argument("--ask-concurrency", type=int, default=8)
+    parser.add_argument("--modes", default="fast,accurate", help="逗号分隔的回答模式")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟 Chat 接口延迟（秒）")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="模拟 Embedding 接口延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="模拟流式输出速率")
+    parser.add_argument("--stream-tokens", type=int, default=40)
+    parser.add_argument("--answer-cache", action="store_true", help="开启回答缓存（默认关闭以测量完整链路）")
+    parser.add_argument("--workdir", help="临时文件目录，默认自动创建并在结束后删除")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="memos-ai-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    db_path = os.path.join(workdir, "memos.db")
+    vector_path = os.path.join(workdir, "vector_db")
+    shutil.rmtree(vector_path, ignore_errors=True)
+
+    stub_port, app_port = free_port(), free_port()
+    stub_url, app_url = f"http://127.0.0.1:{stub_port}", f"http://127.0.0.1:{app_port}"
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="bench", OPENAI_BASE_URL=f"{stub_url}/v1", LLM_MODEL="bench-llm",
+        EMBEDDING_API_URL=stub_url, EMBEDDING_API_KEY="bench", EMBEDDING_MODEL="bench-embedding",
+        MEMOS_DB_PATH=db_path, VECTOR_DB_PATH=vector_path, MEMOS_WEBHOOK_SECRET="",
+        SYNC_ON_STARTUP="false", ANSWER_CACHE_ENABLED="true" if args.answer_cache else "false",
+        ANONYMIZED_TELEMETRY="false",
+    )
+    os.environ.update(env)
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+    }
+    processes: List[subprocess.Popen] = []
+    try:
+        print(f"生成 {args.memos} 条笔记的合成数据库: {db_path}")
+        results["dataset"] = generate_db(db_path, args.memos)
+
+        processes.append(start_process([
+            sys.executable, os.path.join(BENCH_DIR, "stub_server.py"), "--port", str(stub_port),
+            "--latency", str(args.latency), "--embedding-latency", str(args.embedding_latency),
+            "--stream-tokens", str(args.stream_tokens), "--tokens-per-second", str(args.tokens_per_second),
+        ], env, f"{stub_url}/stats", os.path.join(workdir, "stub.log")))
+
+        print("测量同步性能...")
+        results["workloads"] = bench_sync(stub_url, db_path, args)
+
+        processes.append(start_process([
+            sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+            "--log-level", "warning",
+        ], env, f"{app_url}/api/health", os.path.join(workdir, "app.log")))
+
+        print("测量 Webhook 突发...")
+        # 事件对应合成数据库中真实的笔记，数据库先按事件修改，与 Memos 的行为一致
+        events = webhook_events(db_path, args.webhooks)
+        results["workloads"]["webhook_burst"] = asyncio.run(
+            bench_webhooks(app_url, events, args.webhook_concurrency)
+        )
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            print(f"测量 /api/ask ({mode})...")
+            before = stub_stats(stub_url)
+            results["workloads"][f"ask_{mode}"] = asyncio.run(
+                bench_ask(app_url, mode, args.ask_requests, args.ask_concurrency)
+            )
+            results["workloads"][f"ask_{mode}"]["stub"] = stats_delta(before, stub_stats(stub_url))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    output = args.output
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps(results["workloads"], ensure_ascii=False, indent=2))
+    print(f"结果已写入 {output}")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
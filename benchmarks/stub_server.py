@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+本地模拟的 OpenAI 兼容 Embedding / Chat 服务，仅依赖标准库
+
+用于在不调用付费 API 的情况下测量同步与问答性能：
+- POST /v1/embeddings          按词袋哈希生成确定性的向量，含相同词的文本向量相近
+- POST /v1/chat/completions    支持工具调用、JSON 输出、普通回答与流式回答
+- GET  /stats                  返回各接口的请求计数
+
+用法:
+    python benchmarks/stub_server.py --port 18080 --latency 0.05 --stream-tokens 40 --tokens-per-second 50
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TOKEN_PATTERN = re.compile(r"[一-鿿]|[A-Za-z0-9_#]+")
+
+
+def embed_text(text: str, dim: int) -> list:
+    """词袋哈希向量：每个词映射为一个伪随机向量，求和后归一化"""
+    vector = [0.0] * dim
+    for token in _TOKEN_PATTERN.findall(text.lower()) or [text]:
+        digest = hashlib.shake_128(token.encode("utf-8")).digest(dim)
+        for i, byte in enumerate(digest):
+            vector[i] += (byte - 127.5) / 127.5
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class StubState:
+    def __init__(self, args):
+        self.latency = args.latency
+        self.embedding_latency = args.embedding_latency if args.embedding_latency is not None else args.latency
+        self.dim = args.dim
+        self.stream_tokens = args.stream_tokens
+        self.tokens_per_second = args.tokens_per_second
+        self.lock = threading.Lock()
+        self.counts = {"embedding_requests": 0, "embedding_inputs": 0, "chat_requests": 0, "chat_stream_requests": 0}
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.counts[key] += value
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: StubState = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, obj, status: int = 200):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.state.lock:
+                return self._send_json(dict(self.state.counts))
+        self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.endswith("/embeddings"):
+            return self._embeddings(body)
+        if self.path.endswith("/chat/completions"):
+            return self._chat(body)
+        self._send_json({"error": "not found"}, 404)
+
+    def _embeddings(self, body):
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self.state.count(embedding_requests=1, embedding_inputs=len(inputs))
+        time.sleep(self.state.embedding_latency)
+        data = [{"object": "embedding", "index": i, "embedding": embed_text(text, self.state.dim)}
+                for i, text in enumerate(inputs)]
+        tokens = sum(len(_TOKEN_PATTERN.findall(text)) for text in inputs)
+        self._send_json({"object": "list", "data": data, "model": body.get("model"),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+    def _chat(self, body):
+        messages = body.get("messages") or []
+        question = messages[-1]["content"] if messages else ""
+        prompt_tokens = sum(len(_TOKEN_PATTERN.findall(m.get("content") or "")) for m in messages)
+        base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model")}
+        if body.get("stream"):
+            self.state.count(chat_stream_requests=1)
+            return self._stream(body, base, prompt_tokens)
+
+        self.state.count(chat_requests=1)
+        time.sleep(self.state.latency)
+        if body.get("tools"):
+            arguments = json.dumps({"query": question, "limit": 5}, ensure_ascii=False)
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": "call_stub", "type": "function",
+                "function": {"name": "search_memos", "arguments": arguments},
+            }]}
+        elif body.get("response_format"):
+            keywords = list(dict.fromkeys(_TOKEN_PATTERN.findall(question)))[:5]
+            message = {"role": "assistant", "content": json.dumps({"keywords": keywords}, ensure_ascii=False)}
+        else:
+            message = {"role": "assistant", "content": "是"}
+        self._send_json(dict(base, object="chat.completion",
+                             choices=[{"index": 0, "message": message, "finish_reason": "stop"}],
+                             usage={"prompt_tokens": prompt_tokens, "completion_tokens": 1,
+                                    "total_tokens": prompt_tokens + 1}))
+
+    def _stream(self, body, base, prompt_tokens):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(payload: bytes):
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        def event(obj):
+            write(f"data: {json.dumps(obj, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        # latency 模拟首 token 延迟，之后按 tokens_per_second 匀速输出
+        time.sleep(self.state.latency)
+        interval = 1.0 / self.state.tokens_per_second if self.state.tokens_per_second > 0 else 0.0
+        for i in range(self.state.stream_tokens):
+            event(dict(base, object="chat.completion.chunk",
+                       choices=[{"index": 0, "delta": {"content": f"词{i} "}, "finish_reason": None}]))
+            if interval:
+                time.sleep(interval)
+        event(dict(base, object="chat.completion.chunk",
+                   choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event(dict(base, object="chat.completion.chunk", choices=[],
+                       usage={"prompt_tokens": prompt_tokens, "completion_tokens": self.state.stream_tokens,
+                              "total_tokens": prompt_tokens + self.state.stream_tokens}))
+        write(b"data: [DONE]\n\n")
+        write(b"")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.05, help="Chat 接口延迟（流式为首 token 延迟），秒")
+    parser.add_argument("--embedding-latency", type=float, default=None, help="Embedding 接口延迟，默认同 --latency")
+    parser.add_argument("--dim", type=int, default=256, help="向量维度")
+    parser.add_argument("--stream-tokens", type=int, default=40, help="流式回答输出的 token 数")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="流式输出速率，0 表示不限速")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    StubHandler.state = StubState(args)
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub server listening on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
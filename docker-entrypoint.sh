@@ -3,21 +3,10 @@
 # 如果任何命令失败，立即退出
 set -e
 
-# 定义向量数据库路径
-VECTOR_DB_PATH="/app/vector_db"
-SYNC_STATE_FILE="$VECTOR_DB_PATH/sync_state.txt"
-
-# 检查同步状态文件是否存在，以判断是否为首次初始化
-if [ ! -f "$SYNC_STATE_FILE" ]; then
-    echo "同步状态文件不存在，判断为首次初始化，开始执行全量同步..."
-    python scripts/sync.py --full-sync
-else
-    echo "发现同步状态文件，开始执行增量同步..."
-    python scripts/sync.py
-fi
-
-echo "同步流程执行完毕。"
+# 同步由应用内置的定时任务负责：服务启动后立即在后台执行首次同步
+# （无同步状态时为全量同步，否则为增量同步），之后按 SYNC_INTERVAL_HOURS 周期执行。
+# 如需手动同步，可执行 python scripts/sync.py [--full-sync]
 
 # 执行 Dockerfile 中 CMD 指定的命令 (即启动主应用)
 echo "启动 Memos AI 服务..."
-exec "$@"
\ No newline at end of file
+exec "$@"
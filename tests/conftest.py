@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# 配置在导入 app 时读取，这里先填好测试用的环境变量，数据文件放在临时目录
+_TEST_DIR = tempfile.mkdtemp(prefix="memos-ai-tests-")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("EMBEDDING_MODEL", "test-embedding")
+os.environ.setdefault("EMBEDDING_API_URL", "http://127.0.0.1:9")
+os.environ.setdefault("EMBEDDING_API_KEY", "test")
+os.environ.setdefault("VECTOR_DB_PATH", os.path.join(_TEST_DIR, "vector_db"))
+os.environ.setdefault("MEMOS_DB_PATH", os.path.join(_TEST_DIR, "memos.db"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,18 @@
+import pytest
+
+from app.services.embedding_backends import EmbeddingBackend, RemoteEmbeddingBackend
+
+
+def test_backend_missing_a_method_fails_at_creation():
+    class IncompleteBackend(EmbeddingBackend):
+        name = "incomplete"
+
+        def embed(self, texts):
+            raise AssertionError
+
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteBackend()
+
+
+def test_remote_backend_implements_the_interface():
+    assert RemoteEmbeddingBackend().model_id == "test-embedding"
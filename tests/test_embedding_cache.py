@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_cache import EmbeddingCache
+
+
+@pytest.mark.parametrize("storage_dtype", ["float32", "float16", "int8"])
+def test_put_many_returns_what_a_cache_hit_returns(tmp_path, storage_dtype):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=100, storage_dtype=storage_dtype)
+    vectors = np.random.default_rng(0).standard_normal((3, 16)).astype(np.float32)
+
+    stored = cache.put_many("model", ["a", "b", "c"], vectors)
+    hits = cache.get_many("model", ["a", "b", "c"])
+
+    assert stored.dtype == np.float32
+    for row, h in zip(stored, ["a", "b", "c"]):
+        np.testing.assert_array_equal(row, hits[h])
+    if storage_dtype == "float32":
+        np.testing.assert_array_equal(stored, vectors)
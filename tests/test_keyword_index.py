@@ -0,0 +1,48 @@
+from app.services.keyword_index import KeywordIndex
+
+
+def _record(memo_id, content, created_ts=100):
+    return (memo_id, content, created_ts, created_ts, "NORMAL", "PRIVATE")
+
+
+def test_two_character_chinese_terms_are_matched_through_the_index(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keyword.sqlite3"))
+    index.upsert([_record("1", "更新了服务器证书"), _record("2", "周末去爬山"), _record("3", "部署 k3s 集群")])
+
+    assert [hit["memo_id"] for hit in index.search(["证书"])] == ["1"]
+    assert [hit["memo_id"] for hit in index.search(["部署"])] == ["3"]
+
+
+def test_upsert_replaces_and_delete_removes_by_memo_id(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keyword.sqlite3"))
+    index.upsert([_record("1", "旧的证书笔记"), _record("2", "其他内容")])
+    index.upsert([_record("1", "改为部署笔记")])
+
+    assert index.count() == 2
+    assert index.search(["证书"]) == []
+    assert [hit["memo_id"] for hit in index.search(["部署"])] == ["1"]
+
+    index.delete(["1"])
+    assert sorted(index.all_ids()) == ["2"]
+    assert index.search(["部署"]) == []
+
+
+def test_hits_carry_the_stored_status_and_only_active_private_memos_match(tmp_path):
+    index = KeywordIndex(str(tmp_path / "keyword.sqlite3"))
+    index.upsert([
+        _record("1", "部署证书"),
+        ("2", "部署证书", 100, 100, "ARCHIVED", "PRIVATE"),
+        ("3", "部署证书", 100, 100, "NORMAL", "PUBLIC"),
+    ])
+
+    hits = index.search(["部署证书", "证书"])
+    assert [(hit["memo_id"], hit["row_status"], hit["visibility"]) for hit in hits] == [("1", "NORMAL", "PRIVATE")]
+
+
+def test_database_is_opened_on_first_use(tmp_path):
+    path = tmp_path / "nested" / "keyword.sqlite3"
+    index = KeywordIndex(str(path))
+    assert not path.parent.exists()
+
+    assert index.count() == 0
+    assert path.exists()
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from app.services.query_router import route_question
+
+
+@pytest.mark.parametrize("question, limit", [
+    ("最新笔记", 5),
+    ("最近的 3 条笔记", 3),
+    ("给我看看最近的两条笔记吧", 2),
+    ("show me my latest 4 notes", 4),
+])
+def test_plain_latest_questions_route_to_latest_memos(question, limit):
+    assert route_question(question) == {"name": "get_latest_memos", "arguments": {"limit": limit}}
+
+
+@pytest.mark.parametrize("question", [
+    "最近的笔记中提到K3S证书了吗",
+    "最新记录里关于docker的部分怎么说",
+    "latest notes about docker",
+])
+def test_latest_questions_with_a_topic_fall_through_to_search(question):
+    assert route_question(question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "最新笔记" + "都有" * 40 + "x",
+    "最新笔记" + "都有" * 5000 + "x",
+    "最近的" + " " * 5000 + "笔记x",
+])
+def test_near_miss_questions_are_rejected_quickly(question):
+    started = time.perf_counter()
+    assert route_question(question) is None
+    assert time.perf_counter() - started < 0.1
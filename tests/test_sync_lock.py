@@ -0,0 +1,25 @@
+import pytest
+
+from app.services.sync_service import SyncInProgressError, exclusive_sync, sync_lock
+
+
+def test_second_sync_is_refused_while_the_lock_is_held():
+    with sync_lock():
+        with pytest.raises(SyncInProgressError):
+            with sync_lock():
+                pass
+
+    with sync_lock():
+        pass
+
+
+def test_nested_sync_in_the_same_thread_does_not_deadlock():
+    @exclusive_sync
+    def full_sync():
+        return "full"
+
+    @exclusive_sync
+    def sync_memos():
+        return full_sync()
+
+    assert sync_memos() == "full"
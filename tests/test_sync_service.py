@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+from app.core.config import settings
+from app.services import sync_service
+from app.services.keyword_index import KeywordIndex
+from app.services.memos_db import MemosDatabase
+from app.services.sync_service import INDEX_VERSION, MemosSync
+from app.services.vector_store import vector_store
+
+SCHEMA = """
+CREATE TABLE memo (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    uid TEXT NOT NULL UNIQUE,
+    created_ts BIGINT NOT NULL,
+    updated_ts BIGINT NOT NULL,
+    row_status TEXT NOT NULL DEFAULT 'NORMAL',
+    content TEXT NOT NULL DEFAULT '',
+    visibility TEXT NOT NULL DEFAULT 'PRIVATE'
+)
+"""
+
+
+class VectorWrites:
+    """记录向量库的写入，fail_on 指定的操作抛出异常"""
+
+    def __init__(self):
+        self.deleted = []
+        self.upserted = []
+        self.fail_on = None
+
+    def upsert_documents(self, documents, doc_ids, metadatas=None):
+        if self.fail_on == "upsert_documents":
+            raise RuntimeError("embedding service unavailable")
+        self.upserted.extend(doc_ids)
+
+    def delete_documents(self, doc_ids):
+        if self.fail_on == "delete_documents":
+            raise RuntimeError("vector store unavailable")
+        self.deleted.extend(doc_ids)
+
+
+@pytest.fixture
+def memos_path(tmp_path):
+    path = tmp_path / "memos.db"
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.executemany(
+        "INSERT INTO memo (uid, created_ts, updated_ts, content) VALUES (?, ?, ?, ?)",
+        [("a", 100, 100, "部署 k3s 集群"), ("b", 200, 200, "更新服务器证书"), ("c", 300, 300, "周末去爬山")]
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def writes(monkeypatch, tmp_path, memos_path):
+    monkeypatch.setattr(settings, "vector_db_path", str(tmp_path / "vector_db"))
+    monkeypatch.setattr(sync_service, "memos_db", MemosDatabase(str(memos_path)))
+    monkeypatch.setattr(sync_service, "keyword_index", KeywordIndex(str(tmp_path / "keyword.sqlite3")))
+    recorder = VectorWrites()
+    monkeypatch.setattr(vector_store, "upsert_documents", recorder.upsert_documents)
+    monkeypatch.setattr(vector_store, "delete_documents", recorder.delete_documents)
+    monkeypatch.setattr(vector_store, "backend_matches_index", lambda: True)
+    monkeypatch.setattr(vector_store, "embedder_matches_index", lambda: True)
+    monkeypatch.setattr(vector_store, "get_all_ids", lambda collection_name=None: recorder.upserted)
+    return recorder
+
+
+@pytest.mark.parametrize("failing_step", ["upsert_documents", "delete_documents"])
+def test_hard_delete_is_detected_again_after_a_failed_sync(writes, memos_path, failing_step):
+    sync = MemosSync()
+    assert sync.sync_memos() == {"upserted": 3, "deleted": 0}
+    sync.manifest.set_meta({"index_version": INDEX_VERSION})
+
+    # 物理删除一条笔记，同时编辑另一条，让本次同步既有删除也有写入
+    conn = sqlite3.connect(memos_path)
+    conn.execute("DELETE FROM memo WHERE id = 2")
+    conn.execute("UPDATE memo SET content = '周末去爬山，路线记录', updated_ts = 400 WHERE id = 3")
+    conn.commit()
+    conn.close()
+
+    writes.fail_on = failing_step
+    with pytest.raises(RuntimeError):
+        sync.sync_memos()
+
+    writes.fail_on = None
+    sync.sync_memos()
+
+    assert "2" in writes.deleted
+    assert "2" not in sync.manifest.all_ids()
+    assert "2" not in sync_service.keyword_index.all_ids()
+    assert writes.upserted.count("3") == 2
+    assert sync.manifest.get_meta("row_count") == 2
@@ -0,0 +1,22 @@
+import pytest
+
+from app.services.numpy_index import NumpyVectorBackend
+from app.services.vector_backends import ChromaVectorBackend, VectorBackend
+
+
+def test_backend_missing_a_method_fails_at_creation(tmp_path):
+    class IncompleteBackend(VectorBackend):
+        def get_or_create_collection(self, name, metadata=None):
+            raise AssertionError
+
+    with pytest.raises(TypeError, match="abstract"):
+        IncompleteBackend(str(tmp_path))
+
+
+@pytest.mark.parametrize("backend_class", [ChromaVectorBackend, NumpyVectorBackend])
+def test_shipped_backends_implement_the_interface(tmp_path, backend_class):
+    backend = backend_class(str(tmp_path / backend_class.name))
+    collection = backend.get_or_create_collection("memos", metadata={"embedding_model": "test"})
+    assert collection.count() == 0
+    assert backend.list_collection_names() == ["memos"]
+    backend.close()